@@ -1,14 +1,64 @@
+import json
+import os
+import queue
+import time
 from .. import chat_blueprint
-from flask import jsonify, request, session, redirect, url_for, render_template
+from flask import (
+    Response,
+    jsonify,
+    make_response,
+    request,
+    session,
+    redirect,
+    url_for,
+    render_template,
+    stream_with_context,
+)
 from models import db
 from models.models import User, Chat, Message, AssistantMessage
 from .helpers import (
     retrieve_or_create_chat,
-    create_user_message,
-    generate_and_store_assistant_message,
-    maybe_generate_second_assistant_message,
+    start_turn,
+    schedule_missing_critic_scores,
+    wait_for_chat_update,
+    get_chat_sessions_page,
+    get_chat_sessions_etag,
+    SESSIONS_PAGE_SIZE,
+)
+from .llm_processing import (
+    get_processing_state,
+    subscribe_processing_state,
+    unsubscribe_processing_state,
 )
-from .llm_processing import get_processing_state, init_processing_state
+from .llm_cache import get_cache_stats
+from .processing_state import new_processing_state
+
+# Seconds between keep-alive comments and the maximum lifetime of a processing stream.
+# An open stream holds its thread: with sync gunicorn workers keep STREAM_MAX_DURATION short, the
+# browser reconnects after STREAM_RETRY_MS and gets a fresh snapshot, so a turn can outlive many
+# streams. With threaded or gevent workers it can be raised to cover a whole turn.
+STREAM_KEEPALIVE_INTERVAL = 15
+STREAM_MAX_DURATION = float(os.getenv("STREAM_MAX_DURATION", "45"))
+STREAM_RETRY_MS = int(os.getenv("STREAM_RETRY_MS", "1000"))
+# Longest a critic score request may wait for a score to change. A waiting request holds its
+# thread: keep it short with sync gunicorn workers (0 turns the long-poll into a plain poll),
+# the default suits threaded or gevent workers.
+SCORE_WAIT_MAX = float(os.getenv("SCORE_WAIT_MAX", "25"))
+
+
+def not_modified(etag):
+    """Return a 304 response if the client already has the representation tagged etag."""
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+        return with_etag(response, etag)
+    return None
+
+
+def with_etag(response, etag):
+    """Tag a response and make clients revalidate it before reusing it."""
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
 
 
 # ==================================================================================================#
@@ -77,11 +127,10 @@ def get_processing_status(chat_id):
     if not user:
         return jsonify({"error": "User not found"}), 404
     
-    # Get the processing state
+    # Get a snapshot of the processing state, unknown chats are not added to the store
     state = get_processing_state(chat_id)
     if not state:
-        # Initialize a new processing state
-        state = init_processing_state(chat_id)
+        state = new_processing_state()
         state.update({
             "status": "not_started",
             "error": "Processing has not been started for this chat"
@@ -90,10 +139,73 @@ def get_processing_status(chat_id):
     return jsonify(state), 200
 
 
+@chat_blueprint.route("/chat/processing/<string:chat_id>/stream", methods=["GET"])
+def stream_processing_status(chat_id):
+    """
+    Stream processing updates for a chat as Server-Sent Events.
+
+    The first event is a snapshot of the current processing state, every following
+    event carries only the fields changed by a stage transition. The stream closes
+    once processing completes or errors out, or after STREAM_MAX_DURATION seconds;
+    the browser then reconnects and starts again from a snapshot.
+
+    Args:
+        chat_id (str): The ID of the chat being processed.
+
+    Returns:
+        Response: A text/event-stream response.
+    """
+    if "username" not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    user = User.query.filter_by(name=session["username"]).first()
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    subscriber = subscribe_processing_state(chat_id)
+
+    def generate():
+        deadline = time.monotonic() + STREAM_MAX_DURATION
+        try:
+            yield f"retry: {STREAM_RETRY_MS}\n\n"
+            while time.monotonic() < deadline:
+                try:
+                    remaining = deadline - time.monotonic()
+                    event = subscriber.get(timeout=max(0, min(STREAM_KEEPALIVE_INTERVAL, remaining)))
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+
+                yield f"data: {json.dumps(event)}\n\n"
+                if event.get("completed") or event.get("status") == "error":
+                    break
+        finally:
+            unsubscribe_processing_state(chat_id, subscriber)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@chat_blueprint.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    """
+    Report hit/miss counters and the saved provider latency of the pipeline caches.
+    """
+    if "username" not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    return jsonify(get_cache_stats()), 200
+
+
 @chat_blueprint.route("/sessions")
 def get_sessions():
     """
-    Retrieve and render chat sessions for the authenticated user.
+    Render the first page of chat sessions of the authenticated user, newest first.
+    Pass ?scope=all to list the sessions of every user (the previous demo behaviour).
+    Further pages are loaded by sessions.js from /sessions/page.
     """
     if "username" not in session:
         return jsonify({"error": "Unauthorized"}), 401
@@ -101,19 +213,67 @@ def get_sessions():
     if not user:
         return jsonify({"error": "User not found"}), 404
 
-    # For demonstration, we are ignoring ownership of sessions.
-    # If you'd like to only show the user's sessions, do:
-    # chat_sessions = user.get_chats()
+    scope = request.args.get("scope", "mine")
+    etag = "page-" + get_chat_sessions_etag(user, all_users=scope == "all")
+    cached = not_modified(etag)
+    if cached:
+        return cached
 
-    chat_sessions = Chat.query.all()
-    chat_sessions = chat_sessions[::-1]  # Reverse the order
-    return render_template("chat-sessions.html", sessions=chat_sessions)
+    chat_sessions, next_cursor, _ = get_chat_sessions_page(
+        user, all_users=scope == "all"
+    )
+    response = make_response(
+        render_template(
+            "chat-sessions.html",
+            sessions=chat_sessions,
+            next_cursor=next_cursor,
+            scope=scope,
+        )
+    )
+    return with_etag(response, etag)
+
+
+@chat_blueprint.route("/sessions/page")
+def get_sessions_page():
+    """
+    Return one page of chat sessions as JSON.
+    Query parameters: cursor (the next_cursor of the previous page), limit, and scope=all.
+    """
+    if "username" not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    user = User.query.filter_by(name=session["username"]).first()
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    cursor = request.args.get("cursor")
+    limit = request.args.get("limit", SESSIONS_PAGE_SIZE, type=int)
+    all_users = request.args.get("scope") == "all"
+    etag = get_chat_sessions_etag(user, cursor, limit, all_users)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    chat_sessions, next_cursor, error = get_chat_sessions_page(
+        user, cursor=cursor, limit=limit, all_users=all_users
+    )
+    if error:
+        return jsonify({"error": error}), 400
+    response = jsonify(
+        {
+            "sessions": [chat.summary() for chat in chat_sessions],
+            "next_cursor": next_cursor,
+        }
+    )
+    return with_etag(response, etag)
 
 
 @chat_blueprint.route("/chat/<string:chat_id>")
 def chat_session(chat_id):
     """
     Handle a chat session by retrieving the chat data for the given chat_id.
+    Pass ?since=<seq> (the seq of a previous response) to only get the messages
+    created or changed since then. Responses carry an ETag derived from the chat
+    version, and If-None-Match is answered with 304 without loading the history.
     """
     print(f"[DEBUG] Chat ID: {chat_id}")
     if "username" not in session:
@@ -127,31 +287,76 @@ def chat_session(chat_id):
     chat = db.session.get(Chat, chat_id)
     if not chat:
         return jsonify({"error": "Chat not found"}), 404
-    return jsonify(chat.dump()), 200
+    since = request.args.get("since", type=int)
+    etag = f"chat-{chat.id}-v{chat.version}-s{since}"
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    return with_etag(jsonify(chat.dump(since=since)), etag)
 
 
-@chat_blueprint.route("/chat/score/<string:chat_id>", methods=["POST"])
-def score_chat(chat_id):
+@chat_blueprint.route("/chat/score/<string:chat_id>", methods=["GET"])
+def get_chat_scores(chat_id):
     """
-    Scores a chat by retrieving its critic scores.
+    Return the critic scores of a chat. This endpoint never writes.
+
+    Query parameters:
+        since (int): Only return the scores changed after this seq (the seq of a previous response).
+        wait (float): With since, wait up to this many seconds (at most SCORE_WAIT_MAX) for a
+                      score to change before answering, while outputs are still waiting for one.
+
+    Returns:
+        JSON: scores, pending (outputs without a score), updating (outputs being scored) and seq.
     """
     if "username" not in session:
         return jsonify({"error": "Unauthorized"}), 401
     user = User.query.filter_by(name=session["username"]).first()
     if not user:
-        print("[DEBUG] User not found")
         return jsonify({"error": "User not found"}), 404
 
     chat = db.session.get(Chat, chat_id)
     if not chat:
-        print("[DEBUG] Chat not found")
         return jsonify({"error": "Chat not found"}), 404
-    print(f"[DEBUG] Chat ID: {chat_id}")
-    scores = chat.get_critic_scores()
-    print(f"[DEBUG] Scores: {scores}")
-    # Update the scores before exiting
-    chat.update_missing_critic_scores()
-    return jsonify({"scores": scores}), 200
+
+    since = request.args.get("since", type=int)
+    wait = min(max(request.args.get("wait", 0, type=float), 0), SCORE_WAIT_MAX)
+    summary = chat.get_score_summary(since=since)
+    if since is not None and wait and not summary["scores"] and summary["pending"]:
+        seq = wait_for_chat_update(chat_id, since, wait)
+        if seq is None:
+            return jsonify({"error": "Chat not found"}), 404
+        if seq > since:
+            chat = db.session.get(Chat, chat_id)
+            summary = chat.get_score_summary(since=since)
+    return jsonify(summary), 200
+
+
+@chat_blueprint.route("/chat/score/<string:chat_id>", methods=["POST"])
+def score_chat(chat_id):
+    """
+    Schedule the critic backfill of the outputs of a chat that have no score.
+    Idempotent: outputs that are already scored or being scored are never scheduled again.
+    Finished turns schedule their own backfill; clients call this once when they open a chat,
+    so that outputs left unscored (e.g. by a restart) get scored too.
+
+    The response used to carry the scores themselves and still does: the summary of
+    GET /chat/score/<chat_id> plus the number of outputs this call scheduled. Scores that are
+    not written yet are delivered by the GET long-poll.
+
+    Returns:
+        JSON: scheduled, scores, pending, updating and seq.
+    """
+    if "username" not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    user = User.query.filter_by(name=session["username"]).first()
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    if not db.session.get(Chat, chat_id):
+        return jsonify({"error": "Chat not found"}), 404
+    scheduled = schedule_missing_critic_scores(chat_id)
+    chat = db.session.get(Chat, chat_id)
+    return jsonify({"scheduled": scheduled, **chat.get_score_summary()}), 200
 
 
 @chat_blueprint.route(
@@ -203,10 +408,10 @@ def chat():
     Handles chat interactions by performing a series of operations:
     1. Authenticates the user
     2. Retrieves an existing chat or creates a new one
-    3. Creates a new user message
-    4. Initiates asynchronous processing for assistant response
-    5. Optionally initiates a second assistant response
-    6. Returns the message data
+    3. Creates the turn (user message and assistant placeholders) in one transaction
+    4. Initiates asynchronous processing for the assistant response,
+       and for the second assistant response if it is enabled
+    5. Returns the message data
     """
     print("[DEBUG] Chat route accessed")
     # 1) User authentication
@@ -227,29 +432,8 @@ def chat():
     if not user_input:
         return jsonify({"error": "No message provided"}), 400
 
-    # 4) Create a user message
-    message = create_user_message(chat, user_input)
-
-    # 5) Generate the first assistant response (now asynchronous)
-    generate_and_store_assistant_message(
-        chat,
-        message,
-        base_prompt_path="./prompts/actor.md",
-        search_prompt_path="./prompts/search_simulator.md",
-    )
-
-    # 6) If second assistant is enabled, generate a second assistant response (also asynchronous)
-    if chat.allow_second_assistant:
-        maybe_generate_second_assistant_message(
-            chat,
-            message,
-            base_prompt_path="./prompts/actor.md",
-            search_prompt_path="./prompts/search_simulator.md",
-        )
-
-    # 7) Dump message data
-    data = message.dump()
-    data["chat_id"] = chat.id
+    # 4) Create the turn and generate the assistant responses (asynchronous, one pipeline for both outputs)
+    data = start_turn(chat, user_input)
 
     print(data)
     return jsonify(data), 200
@@ -0,0 +1,53 @@
+import os
+import time
+
+# ==================================================================================================#
+#                                          ⛔NOTE⛔                                                 #
+# Latency budget of a chat turn.                                                                    #
+# Every turn gets a deadline TURN_DEADLINE seconds after it is scheduled, and every stage of the    #
+# pipeline runs with its own timeout, capped by what is left of the turn's budget. Optional stages  #
+# only start if the budget still covers them and the stages that must follow them, so a slow turn   #
+# first drops regeneration, then the critic, then the search, and still answers in time.            #
+# ==================================================================================================#
+
+TURN_DEADLINE = float(os.getenv("TURN_DEADLINE", "240"))
+# Worst-case seconds of every stage, also used to decide whether an optional stage still fits
+STAGE_TIMEOUTS = {
+    "ner": float(os.getenv("NER_TIMEOUT", "20")),
+    "search_call": float(os.getenv("SEARCH_CALL_TIMEOUT", "15")),
+    "search": float(os.getenv("SEARCH_TIMEOUT", "30")),
+    "actor": float(os.getenv("ACTOR_TIMEOUT", "60")),
+    "critic": float(os.getenv("CRITIC_TIMEOUT", "45")),
+    "regeneration": float(os.getenv("REGENERATION_TIMEOUT", "60")),
+}
+# Timeout of a single provider request, for callers outside the pipeline as well
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "120"))
+
+
+class TurnDeadline:
+    """
+    The deadline of one chat turn, shared by every stage and output of the turn.
+    Attributes:
+        budget (float): Seconds the turn was given.
+        expires_at (float): time.monotonic() at which the budget runs out.
+    Methods:
+        remaining():
+            Seconds left, never negative.
+        allows(*stages):
+            Whether the remaining budget covers the timeouts of all given stages.
+        timeout(*stages):
+            Timeout for running the given stages: the sum of their timeouts capped by the remaining budget.
+    """
+
+    def __init__(self, budget=None):
+        self.budget = TURN_DEADLINE if budget is None else budget
+        self.expires_at = time.monotonic() + self.budget
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def allows(self, *stages):
+        return self.remaining() >= sum(STAGE_TIMEOUTS[stage] for stage in stages)
+
+    def timeout(self, *stages):
+        return min(sum(STAGE_TIMEOUTS[stage] for stage in stages), self.remaining())
@@ -1,12 +1,26 @@
 import re
 from openai import OpenAI
-from models.models import AssistantMessage, Chat, Message, UserMessage, db
+from models.models import (
+    AssistantMessage,
+    Chat,
+    Message,
+    UserMessage,
+    db,
+    generate_short_uuid,
+    CHAT_COMMITTED,
+)
 from together import Together
 from datetime import datetime
+from flask import current_app
 import json
+import base64
+import binascii
+import hashlib
 import threading
 import time
+from sqlalchemy import and_, func, or_, select, type_coerce
 from . import llm_processing
+from .workers import get_worker_pool, WorkerPoolFull
 
 ##############################################
 # Helper Functions
@@ -14,6 +28,12 @@ from . import llm_processing
 
 client = OpenAI()
 
+# Page size of the session list, and the largest page a client may ask for
+SESSIONS_PAGE_SIZE = 50
+SESSIONS_MAX_PAGE_SIZE = 200
+# Seconds between two checks for chat changes committed by another worker process
+CHAT_POLL_INTERVAL = 1.0
+
 
 def retrieve_or_create_chat(user, chat_id=None):
     """
@@ -21,8 +41,8 @@ def retrieve_or_create_chat(user, chat_id=None):
 
     This function checks if a chat ID is provided. If it is, the function fetches the chat from the database,
     verifying that the specified chat exists and is owned by the given user. If the chat does not exist or does not belong
-    to the user, an appropriate error message is returned. When no chat ID is provided, a new chat instance is created for the user,
-    added to the database, and committed to generate its ID.
+    to the user, an appropriate error message is returned. When no chat ID is provided, a new chat instance is created for the user
+    with a client-generated ID and added to the session. It is committed together with its first turn (see start_turn).
 
     Parameters:
         user: The user instance who owns the chat.
@@ -42,26 +62,140 @@ def retrieve_or_create_chat(user, chat_id=None):
             return None, "Unauthorized chat access"
         return chat, None
     else:
-        chat = Chat(user_id=user.id)
+        chat = Chat(
+            id=generate_short_uuid(),
+            user_id=user.id,
+            allow_second_assistant=False,
+            preferences_seq=0,
+            seq=0,
+        )
         db.session.add(chat)
-        db.session.commit()  # Commit to generate chat.id
         return chat, None
 
 
-def create_user_message(chat, user_input):
+def encode_sessions_cursor(timestamp, chat_id):
+    """Encode the (timestamp, id) of the last chat of a page as an opaque cursor."""
+    payload = json.dumps([timestamp, chat_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+
+def decode_sessions_cursor(cursor):
+    """Decode a cursor made by encode_sessions_cursor. Returns None if it is invalid."""
+    try:
+        timestamp, chat_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (binascii.Error, UnicodeError, ValueError, TypeError):
+        return None
+    if not isinstance(timestamp, str) or not isinstance(chat_id, str):
+        return None
+    return timestamp, chat_id
+
+
+def get_chat_sessions_page(user, cursor=None, limit=SESSIONS_PAGE_SIZE, all_users=False):
     """
-    Create a new Message and a corresponding UserMessage in the database.
+    Return one page of chats, newest first, using keyset pagination on (timestamp, id).
+
+    Only the chats of user are listed unless all_users is set. The page after a cursor
+    starts right after the chat the cursor was made from, so pages stay stable while new
+    chats are created and the query never has to skip rows (it walks ix_chats_user_id_timestamp).
+
+    Parameters:
+        user: The user whose chats are listed.
+        cursor (str, optional): The next_cursor of the previous page.
+        limit (int, optional): Page size, capped at SESSIONS_MAX_PAGE_SIZE.
+        all_users (bool, optional): List the chats of every user.
+
+    Returns:
+        tuple:
+            - list of Chat objects of this page.
+            - The cursor of the next page, or None if this is the last page.
+            - An error message if the cursor is invalid, otherwise None.
     """
-    # Create a new parent message record
-    message = Message(chat_id=chat.id)
-    db.session.add(message)
-    db.session.commit()  # commits to generate the message.id
+    limit = max(1, min(limit, SESSIONS_MAX_PAGE_SIZE))
+    # Compare timestamps as stored: SQLite keeps them as text, and rows written by
+    # db.func.now() have no fractional seconds while bound datetimes always do
+    stored_timestamp = type_coerce(Chat.timestamp, db.String)
 
-    # Create the user message
-    user_msg = UserMessage(message_id=message.id, content=user_input)
-    db.session.add(user_msg)
-    db.session.commit()
+    query = db.session.query(Chat, stored_timestamp)
+    if not all_users:
+        query = query.filter(Chat.user_id == user.id)
+    if cursor:
+        position = decode_sessions_cursor(cursor)
+        if position is None:
+            return [], None, "Invalid cursor"
+        timestamp, chat_id = position
+        query = query.filter(
+            or_(
+                stored_timestamp < timestamp,
+                and_(stored_timestamp == timestamp, Chat.id < chat_id),
+            )
+        )
+
+    rows = query.order_by(Chat.timestamp.desc(), Chat.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_chat, last_timestamp = rows[-1]
+        next_cursor = encode_sessions_cursor(str(last_timestamp), last_chat.id)
+    return [chat for chat, _ in rows], next_cursor, None
 
+
+def get_chat_sessions_etag(user, cursor=None, limit=SESSIONS_PAGE_SIZE, all_users=False):
+    """
+    ETag of a page of the session list, computed without loading the chats.
+    Creating a chat changes the count and every write to a chat bumps its version, so the
+    (count, sum of versions) of the listed chats changes whenever any page could change.
+    """
+    query = db.session.query(func.count(Chat.id), func.coalesce(func.sum(Chat.version), 0))
+    if not all_users:
+        query = query.filter(Chat.user_id == user.id)
+    count, versions = query.one()
+    key = json.dumps([None if all_users else user.id, cursor, limit, count, versions])
+    return "sessions-" + hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def create_turn(chat, user_input):
+    """
+    Add the rows of a new turn to the session without flushing them.
+
+    The Message, its UserMessage and the placeholder AssistantMessage of every output get
+    client-generated ids and explicit values, and the relationships are set in memory, so
+    message.dump() works before the commit without loading anything back.
+
+    Parameters:
+        chat: The chat the turn belongs to.
+        user_input (str): The text of the user message.
+
+    Returns:
+        Message: The pending message of the turn.
+    """
+    message = Message(
+        id=generate_short_uuid(),
+        chat_id=chat.id,
+        timestamp=datetime.utcnow(),  # Same clock as the db.func.now() default (UTC)
+        preferred_assistant=1,
+    )
+    message.user_message = UserMessage(
+        id=generate_short_uuid(), message_id=message.id, content=user_input
+    )
+    message.assistant_message = store_assistant_message(
+        message_id=message.id,
+        content="[Processing your request...]",
+        output_number=1,
+        commit=False,
+    )
+    message.assistant_message2 = None
+    if chat.allow_second_assistant:
+        message.assistant_message2 = store_assistant_message(
+            message_id=message.id,
+            content="[Processing your request for second assistant...]",
+            output_number=2,
+            commit=False,
+        )
+    # In flight until persist_assistant_result writes the result: never claimed by the critic backfill
+    message.assistant_message.is_updating = True
+    if message.assistant_message2:
+        message.assistant_message2.is_updating = True
+    db.session.add(message)
     return message
 
 
@@ -73,7 +207,8 @@ def store_assistant_message(
     thinking=None,
     critic_score=None,
     regenerated_content=None,
-    regenerated_critic=None
+    regenerated_critic=None,
+    commit=True
 ):
     """
     Stores an assistant message in the database with enhanced information.
@@ -87,6 +222,7 @@ def store_assistant_message(
         critic_score (dict, optional): The evaluation scores from the critic.
         regenerated_content (str, optional): Regenerated response if original had low score.
         regenerated_critic (dict, optional): Critic evaluation of the regenerated response.
+        commit (bool, optional): Commit right away. Pass False to commit with the rest of a turn.
     
     Returns:
         AssistantMessage: The assistant message object that was stored in the database.
@@ -101,6 +237,7 @@ def store_assistant_message(
             
     # Create the assistant message
     assistant_msg = AssistantMessage(
+        id=generate_short_uuid(),
         message_id=message_id,
         content=content,
         search_output=json.dumps(search_output) if search_output else None,
@@ -108,11 +245,13 @@ def store_assistant_message(
         thinking=thinking,
         critic_score=critic_score_json,
         regenerated_content=regenerated_content,
-        regenerated_critic=json.dumps(regenerated_critic) if regenerated_critic else None
+        regenerated_critic=json.dumps(regenerated_critic) if regenerated_critic else None,
+        is_updating=False
     )
     
     db.session.add(assistant_msg)
-    db.session.commit()
+    if commit:
+        db.session.commit()
     return assistant_msg
 
 
@@ -128,152 +267,132 @@ def process_conversation_history(conversation_history):
             processed_history.append({"role": role, "content": content})
     return processed_history
 
-def generate_and_store_assistant_message(
-    chat, message, base_prompt_path, search_prompt_path
-):
+def count_covered_entries(messages, preferences_seq):
+    """
+    Count the entries of the processed conversation history that the stored preferences
+    cover: those of every message before preferences_seq and the user message of that one.
+    The entries are built exactly like the history sent to the pipeline, so the count is an
+    index into that very list however the stored messages changed since the extraction.
     """
-    Starts asynchronous generation of an assistant response.
+    covered = []
+    for msg in messages:
+        if not msg.seq or msg.seq > preferences_seq:
+            break
+        if msg.user_message:
+            covered.append(msg.user_message.jsonify())
+        preferred = msg.get_preferred_assistant_message()
+        if preferred and msg.seq < preferences_seq:
+            covered.append(preferred.jsonify())
+    return len(process_conversation_history(covered))
+
+def start_turn(chat, user_input):
+    """
+    Create a turn and start asynchronous generation of its assistant responses.
+    
+    The chat (if new), the Message, the UserMessage and the placeholder of every output
+    are inserted in a single commit. Everything the pipeline needs is read before the
+    commit and the returned dump is built from the objects in memory, so the turn costs
+    one write transaction and no reloads.
     
-    This function initiates the asynchronous processing of generating an assistant response
-    based on the current conversation. It sets up the necessary parameters and starts a
-    background thread to handle the actual processing.
+    The pipeline is scheduled on the shared event loop. When the chat allows a second
+    assistant, the same pipeline also produces output 2: NER and search run once and the
+    pipeline only forks at the actor stage. Progress stays in the processing state store
+    and each output hands its final state to persist_assistant_result once it is done.
     
     Parameters:
         chat: An object representing the active chat session.
-        message: An object representing the current message context.
-        base_prompt_path: No longer used directly; kept for compatibility.
-        search_prompt_path: No longer used directly; kept for compatibility.
+        user_input (str): The text of the user message.
     
     Returns:
-        None
+        dict: The dump of the new message.
     """
-    # Get conversation history
-    conversation_history = chat.get_conversation_history()
+    # Read the history before adding the new rows so that nothing is flushed early
+    with db.session.no_autoflush:  # A new chat is still pending and has no history
+        messages = chat.get_messages()
+    conversation_history = chat.get_conversation_history(messages)
+    conversation_history.append({"role": "user", "content": user_input})
     processed_history = process_conversation_history(conversation_history)
+    chat_id = chat.id
+    second_chat_id = f"{chat_id}_second" if chat.allow_second_assistant else None
+    previous_preferences = chat.get_preferences()
+    processed_count = count_covered_entries(messages, chat.preferences_seq or 0)
     
-    # Create a placeholder assistant message that will be updated when processing completes
-    store_assistant_message(
-        message_id=message.id,
-        content="[Processing your request...]",
-        search_output=None,
-        output_number=1
-    )
-    
-    # Get the Flask app for passing to the background thread
-    from flask import current_app
-    app = current_app._get_current_object()
+    message = create_turn(chat, user_input)
+    db.session.flush()  # Assigns the sequence numbers, still in the same transaction
+    data = message.dump()
+    db.session.commit()
     
-    # Start a background thread to handle processing
-    # Pass the app object to the thread
-    threading.Thread(
-        target=process_assistant_message,
-        args=(app, chat.id, message.id, 1, processed_history)
-    ).start()
+    # Schedule the pipeline for every output of this turn once its rows exist
+    llm_processing.start_processing(
+        chat_id=chat_id,
+        conversation_history=processed_history,
+        enable_search=True,
+        evaluate_response=True,
+        regenerate_response=True,
+        second_chat_id=second_chat_id,
+        previous_preferences=previous_preferences,
+        processed_count=processed_count,
+        on_complete=make_result_callback(chat_id, data["id"], outputs=2 if second_chat_id else 1)
+    )
+    return data
 
 
-def process_assistant_message(app, chat_id, message_id, output_number, conversation_history):
+def make_result_callback(chat_id, message_id, outputs=1):
     """
-    Process an assistant message in a background thread with proper app context.
-    
-    This function runs in a separate thread and handles the entire processing pipeline
-    for generating an assistant response, including:
-    - Starting the processing thread
-    - Monitoring the processing state
-    - Updating the message when processing completes
-    
-    Parameters:
-        app: The Flask application object
-        chat_id: The ID of the chat being processed
-        message_id: The ID of the message to update
-        output_number: The output number (1 for primary, 2 for secondary)
-        conversation_history: The processed conversation history
+    Build the on_complete callback of a turn.
+    The callback is called from the pipeline with the final state of one output and
+    queues its persistence on the single-threaded db worker pool, so results are
+    written in one transaction per output and never compete with each other for the
+    SQLite writer lock. If the pool stays full, the result is written by the calling
+    thread instead of being dropped. Once all outputs of the turn are persisted, outputs
+    the critic could not score are scheduled for a backfill, exactly once per turn.
     """
-    # Use the app context for all operations
-    with app.app_context():
-        try:
-            # Start asynchronous processing
-            llm_processing.start_processing_thread(
-                chat_id=chat_id,
-                conversation_history=conversation_history,
-                enable_search=True,
-                evaluate_response=True,
-                regenerate_response=True
-            )
-            
-            # Monitor the processing state directly here
-            monitor_processing_state_with_context(chat_id, message_id, output_number)
-        except Exception as e:
-            print(f"[ERROR] Error in process_assistant_message: {e}")
-            # Try to update message with error
-            try:
-                assistant_msg = AssistantMessage.query.filter_by(
-                    message_id=message_id, 
-                    output_number=output_number
-                ).first()
-                
-                if assistant_msg:
-                    assistant_msg.content = f"[Error processing message: {str(e)}]"
-                    db.session.commit()
-            except Exception as inner_e:
-                print(f"[ERROR] Failed to update error message: {inner_e}")
+    app = current_app._get_current_object()
+    lock = threading.Lock()
+    remaining = outputs
 
+    def persist(output_number, state):
+        nonlocal remaining
+        persist_assistant_result(chat_id, message_id, output_number, state)
+        with lock:
+            remaining -= 1
+            last = remaining == 0
+        # Never earlier: the backfill would claim outputs whose results are not written yet
+        if last:
+            schedule_missing_critic_scores(chat_id)
 
-def maybe_generate_second_assistant_message(
-    chat, message, base_prompt_path, search_prompt_path
-):
-    """
-    Starts asynchronous generation of a second assistant response.
-    
-    Similar to generate_and_store_assistant_message but for the second assistant.
-    Uses a different seed value to ensure variation.
-    
-    Parameters:
-        chat: An object representing the chat.
-        message: The message object associated with this interaction.
-        base_prompt_path: No longer used directly; kept for compatibility.
-        search_prompt_path: No longer used directly; kept for compatibility.
-    """
-    # Get conversation history
-    conversation_history = chat.get_conversation_history()
-    processed_history = process_conversation_history(conversation_history)
-    
-    # Create a placeholder assistant message that will be updated when processing completes
-    store_assistant_message(
-        message_id=message.id,
-        content="[Processing your request for second assistant...]",
-        search_output=None,
-        output_number=2
-    )
-    
-    # Get the Flask app for passing to the background thread
-    from flask import current_app
-    app = current_app._get_current_object()
-    
-    # Start a background thread to handle processing
-    # Pass the app object to the thread
-    threading.Thread(
-        target=process_assistant_message,
-        args=(app, f"{chat.id}_second", message.id, 2, processed_history)
-    ).start()
+    def on_complete(state_chat_id, state):
+        output_number = 2 if state_chat_id.endswith("_second") else 1
+        try:
+            get_worker_pool("db").submit(app, persist, output_number, state)
+        except WorkerPoolFull as e:
+            # Never drop a result, the placeholder would stay is_updating forever.
+            # on_complete runs in a thread of its own, so writing here never blocks the pipeline loop
+            print(f"[ERROR] Writing assistant result of {state_chat_id} in place: {e}")
+            with app.app_context():
+                try:
+                    persist(output_number, state)
+                finally:
+                    db.session.remove()
 
+    return on_complete
 
-def monitor_processing_state_with_context(chat_id, message_id, output_number, check_interval=1, max_retries=300):
+
+def persist_assistant_result(chat_id, message_id, output_number, state):
     """
-    Monitor the processing state and update the message when processing completes.
-    This version runs within an app context already.
+    Write the final processing state of one output to its assistant message.
+    
+    For the primary output, the extracted preferences are stored on the chat as well so
+    that the next turn only has to extract preferences from the new messages.
+    Everything is committed in a single transaction.
     
     Parameters:
-        chat_id: The ID of the chat being processed.
+        chat_id: The ID of the chat the message belongs to.
         message_id: The ID of the message to update.
         output_number: The output number (1 for primary, 2 for secondary).
-        check_interval: How often to check the processing state (in seconds).
-        max_retries: Maximum number of retries before giving up.
+        state: The final processing state of the output, or None if it expired.
     """
-    retries = 0
-    
-    # Function to update the assistant message based on the current state
-    def update_message_from_state():
-        # Get the current message
+    try:
         assistant_msg = AssistantMessage.query.filter_by(
             message_id=message_id, 
             output_number=output_number
@@ -282,122 +401,111 @@ def monitor_processing_state_with_context(chat_id, message_id, output_number, ch
         if not assistant_msg:
             print(f"[ERROR] Assistant message not found: {message_id}, output_number: {output_number}")
             return
-            
-        # Update with message
-        state = llm_processing.get_processing_state(chat_id)
+        
+        assistant_msg.is_updating = False
         if not state:
             assistant_msg.content = "[Processing state not found]"
             db.session.commit()
             return
+        
+        # Keep the extracted preferences so that the next turn only processes new messages,
+        # unless a later turn that finished first has already stored newer ones
+        if output_number == 1 and state.get("ner_result"):
+            chat = db.session.get(Chat, chat_id)
+            message = db.session.get(Message, message_id)
+            if chat and message and message.seq and message.seq > (chat.preferences_seq or 0):
+                chat.preferences = json.dumps(state["ner_result"], ensure_ascii=False)
+                chat.preferences_seq = message.seq
+        
+        if state["status"] == "error" or state["error"]:
+            error_msg = state["error"] or "Unknown error"
+            assistant_msg.content = f"[Error: {error_msg}]"
+        elif state["final_response"]:
+            assistant_msg.content = state["final_response"]
             
-        if state["completed"] or state["status"] == "error":
-            # Final update
-            if state["status"] == "error" or state["error"]:
-                error_msg = state["error"] or "Unknown error"
-                assistant_msg.content = f"[Error: {error_msg}]"
-            elif state["final_response"]:
-                assistant_msg.content = state["final_response"]
+            # Update thinking
+            if state.get("assistant_response") and state["assistant_response"].get("thinking"):
+                assistant_msg.thinking = state["assistant_response"]["thinking"]
                 
-                # Update thinking
-                if state.get("assistant_response") and state["assistant_response"].get("thinking"):
-                    assistant_msg.thinking = state["assistant_response"]["thinking"]
-                    
-                # Update search output
-                if state.get("search_result"):
-                    assistant_msg.search_output = json.dumps(state["search_result"])
-                    
-                # Update critic score
-                if state.get("critic_result"):
-                    assistant_msg.critic_score = json.dumps(state["critic_result"])
-                    
-                # Update regenerated content if available
-                if state.get("regenerated_response"):
-                    assistant_msg.regenerated_content = state["regenerated_response"]
-                    
-                # Update regenerated critic if available
-                if state.get("regenerated_critic"):
-                    assistant_msg.regenerated_critic = json.dumps(state["regenerated_critic"])
-            else:
-                assistant_msg.content = "[No response generated]"
-        else:
-            # Progress update
-            step = state.get("step", "processing")
-            progress = state.get("progress", 0)
-            
-            progress_messages = {
-                "starting": "Initializing...",
-                "extracting_ner": "Analyzing conversation to understand preferences...",
-                "ner_completed": "Preferences extracted...",
-                "processing_search_call": "Determining if search is needed...",
-                "search_call_completed": "Search requirements determined...",
-                "simulating_search": "Searching for hotels matching your criteria...",
-                "search_completed": "Search complete...",
-                "search_not_needed": "No search needed at this time...",
-                "generating_assistant_response": "Generating response...",
-                "assistant_response_generated": "Response generated...",
-                "evaluating_response": "Evaluating response quality...",
-                "critique_completed": "Response evaluation complete...",
-                "regenerating_response": "Improving response based on feedback...",
-                "regeneration_completed": "Response improved...",
-                "regeneration_skipped": "Response meets quality standards..."
-            }
-            
-            if step in progress_messages:
-                progress_text = progress_messages[step]
-            else:
-                progress_text = f"Processing ({step})..."
+            # Update search output
+            if state.get("search_result"):
+                assistant_msg.search_output = json.dumps(state["search_result"])
                 
-            assistant_msg.content = f"[{progress_text} {progress}%]"
-            
+            # Update critic score
+            if state.get("critic_result"):
+                assistant_msg.critic_score = json.dumps(state["critic_result"])
+                
+            # Update regenerated content if available
+            if state.get("regenerated_response"):
+                assistant_msg.regenerated_content = state["regenerated_response"]
+                
+            # Update regenerated critic if available
+            if state.get("regenerated_critic"):
+                assistant_msg.regenerated_critic = json.dumps(state["regenerated_critic"])
+        else:
+            assistant_msg.content = "[No response generated]"
+        
         db.session.commit()
-
-    # Capture initial state
-    try:
-        update_message_from_state()
+        
     except Exception as e:
-        print(f"[ERROR] Failed to update message initially: {e}")
-    
-    # Main monitoring loop
-    while retries < max_retries:
-        # Get the current processing state
-        state = llm_processing.get_processing_state(chat_id)
-        if not state:
-            print(f"[ERROR] Processing state not found for chat {chat_id}")
-            break
-            
-        # If processing completed or errored out, update the message and exit
-        if state["completed"] or state["status"] == "error":
-            try:
-                update_message_from_state()
-            except Exception as e:
-                print(f"[ERROR] Failed to update message at completion: {e}")
-            break
-            
-        # If still processing, update the message with progress information
-        try:
-            update_message_from_state()
-        except Exception as e:
-            print(f"[ERROR] Failed to update progress message: {e}")
-            
-        # Wait before next check
-        time.sleep(check_interval)
-        retries += 1
-    
-    # If we hit max retries, update the message with an error
-    if retries >= max_retries:
-        error_msg = f"Processing timed out after {max_retries * check_interval} seconds"
+        db.session.rollback()
+        print(f"[ERROR] Failed to persist assistant message: {e}")
+        # Try to update with error message
         try:
-            # Update the message with the error
             assistant_msg = AssistantMessage.query.filter_by(
                 message_id=message_id, 
                 output_number=output_number
             ).first()
-            
             if assistant_msg:
-                assistant_msg.content = f"[Error: {error_msg}]"
+                assistant_msg.content = f"[Error processing message: {str(e)}]"
+                assistant_msg.is_updating = False
                 db.session.commit()
-        except Exception as e:
-            print(f"[ERROR] Failed to update message on timeout: {e}")
+        except Exception as inner_e:
+            print(f"[ERROR] Failed to update error message: {inner_e}")
+
+def schedule_missing_critic_scores(chat_id):
+    """
+    Schedule the critic backfill of a chat. Safe to call any number of times, outputs
+    that are already scored or being scored are never scheduled again.
+
+    Returns:
+        int: Number of outputs scheduled.
+    """
+    try:
+        chat = db.session.get(Chat, chat_id)
+        if not chat:
+            return 0
+        scheduled = chat.update_missing_critic_scores()
+        if scheduled:
+            print(f"[INFO] Scheduled {scheduled} critic scores for chat {chat_id}")
+        return scheduled
+    except Exception as e:
+        db.session.rollback()
+        print(f"[ERROR] Failed to schedule critic scores for chat {chat_id}: {e}")
+        return 0
+
+
+def wait_for_chat_update(chat_id, since, timeout):
+    """
+    Wait until the seq of a chat grows past since, for at most timeout seconds.
+
+    Commits of this process wake the waiter up immediately, commits of other worker
+    processes are noticed every CHAT_POLL_INTERVAL seconds. The database connection
+    is released while waiting, so waiting requests never hold on to the pool.
+
+    Returns:
+        int: The current seq of the chat, or None if the chat does not exist.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        seq = db.session.scalar(select(Chat.seq).where(Chat.id == chat_id))
+        db.session.rollback()
+        remaining = deadline - time.monotonic()
+        if seq is None or seq > since or remaining <= 0:
+            return seq
+        with CHAT_COMMITTED:
+            CHAT_COMMITTED.wait(min(CHAT_POLL_INTERVAL, remaining))
+
 
 def get_total_score_from_critic(critic_result):
     """
@@ -437,267 +545,3 @@ def get_total_score_from_critic(critic_result):
         print(f"[ERROR] Failed to extract total score: {e}")
         return None
 
-def monitor_processing_state(chat_id, message_id, output_number, check_interval=1, max_retries=300):
-    """
-    Monitor the processing state and update the message when processing completes.
-    
-    Parameters:
-        chat_id: The ID of the chat being processed.
-        message_id: The ID of the message to update.
-        output_number: The output number (1 for primary, 2 for secondary).
-        check_interval: How often to check the processing state (in seconds).
-        max_retries: Maximum number of retries before giving up.
-    """
-    retries = 0
-    
-    # Import Flask app at the top level
-    from flask import current_app
-    # Get the app object once before starting the loop
-    app = current_app._get_current_object()
-    
-    # Define a function that runs with app context
-    def update_with_app_context():
-        with app.app_context():
-            # Get the current message
-            assistant_msg = AssistantMessage.query.filter_by(
-                message_id=message_id, 
-                output_number=output_number
-            ).first()
-            
-            if not assistant_msg:
-                print(f"[ERROR] Assistant message not found: {message_id}, output_number: {output_number}")
-                return
-                
-            # Update with message
-            state = llm_processing.get_processing_state(chat_id)
-            if not state:
-                assistant_msg.content = "[Processing state not found]"
-                db.session.commit()
-                return
-                
-            if state["completed"] or state["status"] == "error":
-                # Final update
-                if state["status"] == "error" or state["error"]:
-                    error_msg = state["error"] or "Unknown error"
-                    assistant_msg.content = f"[Error: {error_msg}]"
-                elif state["final_response"]:
-                    assistant_msg.content = state["final_response"]
-                    
-                    # Update thinking
-                    if state.get("assistant_response") and state["assistant_response"].get("thinking"):
-                        assistant_msg.thinking = state["assistant_response"]["thinking"]
-                        
-                    # Update search output
-                    if state.get("search_result"):
-                        assistant_msg.search_output = json.dumps(state["search_result"])
-                        
-                    # Update critic score
-                    if state.get("critic_result"):
-                        assistant_msg.critic_score = json.dumps(state["critic_result"])
-                        
-                    # Update regenerated content if available
-                    if state.get("regenerated_response"):
-                        assistant_msg.regenerated_content = state["regenerated_response"]
-                        
-                    # Update regenerated critic if available
-                    if state.get("regenerated_critic"):
-                        assistant_msg.regenerated_critic = json.dumps(state["regenerated_critic"])
-                else:
-                    assistant_msg.content = "[No response generated]"
-            else:
-                # Progress update
-                step = state.get("step", "processing")
-                progress = state.get("progress", 0)
-                
-                progress_messages = {
-                    "starting": "Initializing...",
-                    "extracting_ner": "Analyzing conversation to understand preferences...",
-                    "ner_completed": "Preferences extracted...",
-                    "processing_search_call": "Determining if search is needed...",
-                    "search_call_completed": "Search requirements determined...",
-                    "simulating_search": "Searching for hotels matching your criteria...",
-                    "search_completed": "Search complete...",
-                    "search_not_needed": "No search needed at this time...",
-                    "generating_assistant_response": "Generating response...",
-                    "assistant_response_generated": "Response generated...",
-                    "evaluating_response": "Evaluating response quality...",
-                    "critique_completed": "Response evaluation complete...",
-                    "regenerating_response": "Improving response based on feedback...",
-                    "regeneration_completed": "Response improved...",
-                    "regeneration_skipped": "Response meets quality standards..."
-                }
-                
-                if step in progress_messages:
-                    progress_text = progress_messages[step]
-                else:
-                    progress_text = f"Processing ({step})..."
-                    
-                assistant_msg.content = f"[{progress_text} {progress}%]"
-                
-            db.session.commit()
-    
-    # Capture initial state before starting the loop
-    try:
-        # Run the initial update within the app context
-        with app.app_context():
-            update_with_app_context()
-    except Exception as e:
-        print(f"[ERROR] Failed to update message initially: {e}")
-    
-    # Main monitoring loop
-    while retries < max_retries:
-        # Get the current processing state
-        state = llm_processing.get_processing_state(chat_id)
-        if not state:
-            print(f"[ERROR] Processing state not found for chat {chat_id}")
-            break
-            
-        # If processing completed or errored out, update the message and exit
-        if state["completed"] or state["status"] == "error":
-            try:
-                # Run update with app context
-                with app.app_context():
-                    update_with_app_context()
-            except Exception as e:
-                print(f"[ERROR] Failed to update message at completion: {e}")
-            break
-            
-        # If still processing, update the message with progress information
-        try:
-            # Run update with app context
-            with app.app_context():
-                update_with_app_context()
-        except Exception as e:
-            print(f"[ERROR] Failed to update progress message: {e}")
-            
-        # Wait before next check
-        time.sleep(check_interval)
-        retries += 1
-    
-    # If we hit max retries, update the message with an error
-    if retries >= max_retries:
-        error_msg = f"Processing timed out after {max_retries * check_interval} seconds"
-        try:
-            # Update the message with the error
-            with app.app_context():
-                assistant_msg = AssistantMessage.query.filter_by(
-                    message_id=message_id, 
-                    output_number=output_number
-                ).first()
-                
-                if assistant_msg:
-                    assistant_msg.content = f"[Error: {error_msg}]"
-                    db.session.commit()
-        except Exception as e:
-            print(f"[ERROR] Failed to update message on timeout: {e}")
-
-def update_assistant_progress_message(state, message_id, output_number):
-    """
-    Update the assistant message with progress information.
-    """
-    try:
-        # Get the current message
-        assistant_msg = AssistantMessage.query.filter_by(
-            message_id=message_id, 
-            output_number=output_number
-        ).first()
-        
-        if assistant_msg:
-            # Build a progress message based on the current step
-            step = state.get("step", "processing")
-            progress = state.get("progress", 0)
-            
-            progress_messages = {
-                "starting": "Initializing...",
-                "extracting_ner": "Analyzing conversation to understand preferences...",
-                "ner_completed": "Preferences extracted...",
-                "processing_search_call": "Determining if search is needed...",
-                "search_call_completed": "Search requirements determined...",
-                "simulating_search": "Searching for hotels matching your criteria...",
-                "search_completed": "Search complete...",
-                "search_not_needed": "No search needed at this time...",
-                "generating_assistant_response": "Generating response...",
-                "assistant_response_generated": "Response generated...",
-                "evaluating_response": "Evaluating response quality...",
-                "critique_completed": "Response evaluation complete...",
-                "regenerating_response": "Improving response based on feedback...",
-                "regeneration_completed": "Response improved...",
-                "regeneration_skipped": "Response meets quality standards..."
-            }
-            
-            if step in progress_messages:
-                progress_text = progress_messages[step]
-            else:
-                progress_text = f"Processing ({step})..."
-                
-            assistant_msg.content = f"[{progress_text} {progress}%]"
-            db.session.commit()
-            
-    except Exception as e:
-        print(f"[ERROR] Failed to update progress message: {e}")
-
-
-def update_assistant_message_from_state(state, message_id, output_number):
-    """
-    Update the assistant message with the final results from processing.
-    """
-    try:
-        # Get the current message
-        assistant_msg = AssistantMessage.query.filter_by(
-            message_id=message_id, 
-            output_number=output_number
-        ).first()
-        
-        if not assistant_msg:
-            print(f"[ERROR] Assistant message not found: {message_id}, output_number: {output_number}")
-            return
-            
-        # If there was an error, update with error message
-        if state["status"] == "error" or state["error"]:
-            error_msg = state["error"] or "Unknown error"
-            assistant_msg.content = f"[Error: {error_msg}]"
-            db.session.commit()
-            return
-            
-        # Get final response
-        final_response = state["final_response"]
-        if not final_response:
-            assistant_msg.content = "[Error: No response generated]"
-            db.session.commit()
-            return
-            
-        # Update message content
-        assistant_msg.content = final_response
-        
-        # Update thinking
-        if state["assistant_response"] and "thinking" in state["assistant_response"]:
-            assistant_msg.thinking = state["assistant_response"]["thinking"]
-            
-        # Update search output
-        if state["search_result"]:
-            assistant_msg.search_output = json.dumps(state["search_result"])
-            
-        # Update critic score
-        if state["critic_result"]:
-            assistant_msg.critic_score = json.dumps(state["critic_result"])
-            
-        # Update regenerated content if available
-        if state["regenerated_response"]:
-            assistant_msg.regenerated_content = state["regenerated_response"]
-            
-        # Update regenerated critic if available
-        if state["regenerated_critic"]:
-            assistant_msg.regenerated_critic = json.dumps(state["regenerated_critic"])
-            
-        # Commit changes
-        db.session.commit()
-        
-    except Exception as e:
-        print(f"[ERROR] Failed to update assistant message: {e}")
-        # Try to update with error message
-        try:
-            if assistant_msg:
-                assistant_msg.content = f"[Error updating message: {str(e)}]"
-                db.session.commit()
-        except:
-            pass
\ No newline at end of file
@@ -0,0 +1,271 @@
+import os
+import json
+import time
+import queue
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from .prompt_registry import get_prompt_template
+
+# ==================================================================================================#
+#                                          ⛔NOTE⛔                                                 #
+# Content-addressed caches for deterministic pipeline work.                                        #
+# Entries are keyed by a SHA-256 of everything that determines the result, kept in an in-memory    #
+# LRU with a TTL and, if a database path is configured, persisted to SQLite so they survive        #
+# restarts. Values must be JSON serializable.                                                      #
+# ==================================================================================================#
+
+
+def make_cache_key(*parts):
+    """Hash any JSON serializable parts into a stable cache key."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    A thread-safe LRU cache with TTL and optional SQLite persistence.
+    The lock only guards the in-memory LRU. SQLite is never accessed while holding it:
+    lookups that miss memory read SQLite outside the lock (in a thread with get_async, so
+    the pipeline loop never waits on the file), and writes are persisted by a writer thread.
+    Attributes:
+        name (str): Name of the cache, also used as the SQLite table name.
+        max_entries (int): Maximum number of entries kept in memory.
+        ttl (float): Seconds an entry stays valid.
+        db_path (str, optional): SQLite file used to persist entries. None keeps the cache in memory only.
+        hits (int), misses (int): Lookup counters.
+        saved_seconds (float): Sum of the original latency of every hit.
+    Methods:
+        get(key):
+            Returns the cached value or None, checking memory first and SQLite second.
+        get_async(key):
+            Same as get(), for coroutines: the SQLite lookup runs in a thread.
+        set(key, value, latency=0.0):
+            Stores a value together with the latency it took to produce it. Persistence is queued.
+        flush():
+            Waits until every queued write is persisted.
+        stats():
+            Returns the counters as a dictionary.
+    """
+
+    def __init__(self, name, max_entries=1024, ttl=3600, db_path=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self.entries = OrderedDict()  # key -> (created_at, latency, value)
+        self.lock = threading.Lock()
+        self.writes = queue.Queue()
+        self.writer = None
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        if self.db_path:
+            self._init_db()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _init_db(self):
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {self.name} "
+                    "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, latency REAL NOT NULL)"
+                )
+        except sqlite3.Error as e:
+            print(f"[CACHE][ERROR] Disabling persistence for {self.name}: {e}")
+            self.db_path = None
+
+    def _load(self, key):
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    f"SELECT value, created_at, latency FROM {self.name} WHERE key = ?",
+                    (key,),
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"[CACHE][ERROR] Failed to read {self.name}: {e}")
+            return None
+        if row is None:
+            return None
+        return row[1], row[2], json.loads(row[0])
+
+    def _store(self, key, entry):
+        created_at, latency, value = entry
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {self.name} (key, value, created_at, latency) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), created_at, latency),
+                )
+                conn.execute(
+                    f"DELETE FROM {self.name} WHERE created_at < ?", (time.time() - self.ttl,)
+                )
+        except sqlite3.Error as e:
+            print(f"[CACHE][ERROR] Failed to write {self.name}: {e}")
+
+    def _run_writer(self):
+        while True:
+            key, entry = self.writes.get()
+            try:
+                self._store(key, entry)
+            finally:
+                self.writes.task_done()
+
+    def _remember(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _get_memory(self, key, now):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and now - entry[0] > self.ttl:
+                self.entries.pop(key, None)
+                entry = None
+            return entry
+
+    def _finish_get(self, key, entry, now, loaded):
+        with self.lock:
+            if entry is not None and now - entry[0] > self.ttl:
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            if loaded:
+                self._remember(key, entry)
+            else:
+                self.entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry[1]
+            return entry[2]
+
+    def get(self, key):
+        now = time.time()
+        entry = self._get_memory(key, now)
+        loaded = entry is None and bool(self.db_path)
+        if loaded:
+            entry = self._load(key)
+        return self._finish_get(key, entry, now, loaded)
+
+    async def get_async(self, key):
+        now = time.time()
+        entry = self._get_memory(key, now)
+        loaded = entry is None and bool(self.db_path)
+        if loaded:
+            entry = await asyncio.to_thread(self._load, key)
+        return self._finish_get(key, entry, now, loaded)
+
+    def set(self, key, value, latency=0.0):
+        entry = (time.time(), latency, value)
+        with self.lock:
+            self._remember(key, entry)
+            if not self.db_path:
+                return
+            self.writes.put((key, entry))
+            if self.writer is None:
+                self.writer = threading.Thread(target=self._run_writer, daemon=True)
+                self.writer.start()
+
+    def flush(self):
+        self.writes.join()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "saved_seconds": round(self.saved_seconds, 2),
+                "persistent": bool(self.db_path),
+                "pending_writes": self.writes.unfinished_tasks,
+            }
+
+
+LLM_RESPONSE_CACHE = ResponseCache(
+    "llm_responses",
+    max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024")),
+    ttl=float(os.getenv("LLM_CACHE_TTL", "3600")),
+    db_path=os.getenv("LLM_CACHE_DB") or None,
+)
+
+# Search records keyed on the canonical search_func(...) argument
+SEARCH_RECORD_CACHE = ResponseCache(
+    "search_records",
+    max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "512")),
+    ttl=float(os.getenv("SEARCH_CACHE_TTL", "1800")),
+    db_path=os.getenv("LLM_CACHE_DB") or None,
+)
+
+
+# Parsed critic JSON keyed on make_critic_cache_key(...). Every critic prompt variant has its own
+# key space, so a critique is only reused by a call that would have sent the very same prompt.
+CRITIC_RESULT_CACHE = ResponseCache(
+    "critic_results",
+    max_entries=int(os.getenv("CRITIC_CACHE_MAX_ENTRIES", "2048")),
+    ttl=float(os.getenv("CRITIC_CACHE_TTL", "86400")),
+    db_path=os.getenv("LLM_CACHE_DB") or None,
+)
+
+
+# Prompt files every critic variant is built from: their versions are part of the key
+CRITIC_CACHE_VARIANTS = {
+    "single": ("critic.md", "actor.md"),  # critique_response in the chat pipeline
+    "simulation": ("critic.md", "actor.md"),  # simulation.critic.get_score, different rendering and temperature
+    "pairwise": ("critic.md", "critic_pairwise.md", "actor.md"),  # critique_pair, both critiques under one key
+}
+
+
+def make_critic_cache_key(conversation_history, response, search_record=None, variant="single", context=None):
+    """
+    Key of a critic result: the prompt variant, hashes of the conversation prefix, the candidate
+    response and the search results shown with it, plus the versions of the variant's prompts.
+    Only role and content of non-empty messages count, and search_record may be the record or
+    its stored JSON. context holds anything else the variant's prompt or call depends on
+    (e.g. its temperature); it must be JSON serializable.
+    """
+    prefix = [
+        {"role": msg.get("role", ""), "content": msg.get("content", "")}
+        for msg in conversation_history
+        if msg.get("role") and msg.get("content")
+    ]
+    if isinstance(response, dict):
+        response = response.get("content", "")
+    if isinstance(search_record, str):
+        try:
+            search_record = json.loads(search_record)
+        except ValueError:
+            search_record = None
+    search_results = ""
+    if isinstance(search_record, dict) and search_record.get("show_results_to_actor", False):
+        search_results = search_record.get("results", "")
+
+    versions = []
+    for file_name in CRITIC_CACHE_VARIANTS[variant]:
+        template = get_prompt_template(file_name)
+        versions.append(template.version if template is not None else None)
+    return make_cache_key(
+        "critic",
+        variant,
+        versions,
+        make_cache_key(prefix),
+        make_cache_key(response),
+        make_cache_key(search_results),
+        make_cache_key(context),
+    )
+
+
+def get_cache_stats():
+    """Return the counters of every cache of the chat pipeline."""
+    return {
+        "llm_responses": LLM_RESPONSE_CACHE.stats(),
+        "search_records": SEARCH_RECORD_CACHE.stats(),
+        "critic_results": CRITIC_RESULT_CACHE.stats(),
+    }
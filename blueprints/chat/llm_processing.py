@@ -1,24 +1,54 @@
 import os
 import time
+import asyncio
 import re
 import json
 import threading
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 
-from openai import OpenAI
-from together import Together
-from anthropic import Anthropic
+from openai import AsyncOpenAI
+from together import AsyncTogether
+from anthropic import AsyncAnthropic
 import groq
 
+from .prompt_registry import (
+    get_prompt_template,
+    get_actor_instructions,
+    strip_critic_search_block,
+    to_pairwise_critic,
+)
+from .llm_cache import (
+    CRITIC_RESULT_CACHE,
+    LLM_RESPONSE_CACHE,
+    SEARCH_RECORD_CACHE,
+    make_cache_key,
+    make_critic_cache_key,
+)
+from .search_preferences import canonicalize_search_query, build_search_call
+from .deadlines import TurnDeadline, LLM_REQUEST_TIMEOUT
+from .processing_state import PROCESSING_STATE_STORE
+
 # Ensure logs directory exists
 os.makedirs("logs", exist_ok=True)
 
 # Global state tracking
-PROCESSING_STATES = {}
 LLM_CLIENTS = {}
 API_KEYS = {}
 
+# Event loop shared by every chat pipeline, started lazily in a daemon thread
+PIPELINE_LOOP = None
+PIPELINE_LOOP_LOCK = threading.Lock()
+MAX_CONCURRENT_PIPELINES = int(os.getenv("MAX_CONCURRENT_PIPELINES", "200"))
+
+# "local" builds the search call from the preferences, "llm" asks search_call.md
+SEARCH_CALL_MODE = os.getenv("SEARCH_CALL_MODE", "local")
+# Number of actor candidates generated and critiqued concurrently per output; 1 keeps actor -> critic -> regenerate
+BEST_OF_N_CANDIDATES = max(1, int(os.getenv("BEST_OF_N_CANDIDATES", "1")))
+# "single" critiques every output on its own, "pairwise" critiques output 1 and output 2 in one call
+CRITIC_MODE = os.getenv("CRITIC_MODE", "single")
+PIPELINE_SEMAPHORE = None
+
 def log_error(error_message, chat_id=None):
     """Log errors to error log file."""
     timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
@@ -51,17 +81,6 @@ def log_processed_prompt(prompt_name, processed_prompt, chat_id=None):
         log_entry += f" PROCESSED {prompt_name}:\n{truncated_prompt}\n\n"
         f.write(log_entry)
 
-def read_prompt_template(file_path):
-    """Read a prompt template from file."""
-    try:
-        path = os.path.join("prompts", file_path)
-        with open(path, 'r', encoding="utf-8") as f:
-            return f.read()
-    except Exception as e:
-        error_msg = f"Error reading prompt template {file_path}: {str(e)}"
-        log_error(error_msg)
-        return None
-
 def extract_thinking(response):
     """
     Extract <think>...</think> tags from response.
@@ -110,7 +129,10 @@ def extract_function_calls(response):
     return clean_response, function_calls
 
 def get_client(provider_type):
-    """Get or initialize the appropriate LLM client"""
+    """
+    Get or initialize the appropriate async LLM client.
+    Clients are created on the pipeline event loop and reused by every chat.
+    """
     if provider_type in LLM_CLIENTS:
         return LLM_CLIENTS[provider_type]
     
@@ -120,67 +142,97 @@ def get_client(provider_type):
             if 'openai' not in API_KEYS:
                 with open("openai.key", "r", encoding="utf-8") as f:
                     API_KEYS['openai'] = f.read().strip()
-            LLM_CLIENTS['openai'] = OpenAI(api_key=API_KEYS['openai'])
+            LLM_CLIENTS['openai'] = AsyncOpenAI(api_key=API_KEYS['openai'], timeout=LLM_REQUEST_TIMEOUT)
             
         elif provider_type == 'together':
             if 'together' not in API_KEYS:
                 with open("together.key", "r", encoding="utf-8") as f:
                     API_KEYS['together'] = f.read().strip()
-            LLM_CLIENTS['together'] = Together(api_key=API_KEYS['together'])
+            LLM_CLIENTS['together'] = AsyncTogether(api_key=API_KEYS['together'], timeout=LLM_REQUEST_TIMEOUT)
             
         elif provider_type == 'claude':
             if 'claude' not in API_KEYS:
                 with open("claude.key", "r", encoding="utf-8") as f:
                     API_KEYS['claude'] = f.read().strip()
-            LLM_CLIENTS['claude'] = Anthropic(api_key=API_KEYS['claude'])
+            LLM_CLIENTS['claude'] = AsyncAnthropic(api_key=API_KEYS['claude'], timeout=LLM_REQUEST_TIMEOUT)
             
         elif provider_type == 'groq':
             if 'groq' not in API_KEYS:
                 with open("groq.key", "r", encoding="utf-8") as f:
                     API_KEYS['groq'] = f.read().strip()
-            LLM_CLIENTS['groq'] = groq.Client(api_key=API_KEYS['groq'])
+            LLM_CLIENTS['groq'] = groq.AsyncClient(api_key=API_KEYS['groq'], timeout=LLM_REQUEST_TIMEOUT)
         
         return LLM_CLIENTS[provider_type]
     except Exception as e:
         log_error(f"Error initializing {provider_type} client: {str(e)}")
         return None
 
-def get_openai_completion(prompt, model="o3-mini", chat_id=None):
-    """Use OpenAI for responses."""
+async def get_openai_completion(prompt, model="o3-mini", chat_id=None, cache=False):
+    """
+    Use OpenAI for responses.
+    With cache=True an identical (model, prompt) request is answered from LLM_RESPONSE_CACHE.
+    """
     try:
         log_processed_prompt(f"OpenAI_{model}", prompt, chat_id)
         
+        cache_key = make_cache_key("openai", model, {}, prompt) if cache else None
+        if cache_key:
+            cached = await LLM_RESPONSE_CACHE.get_async(cache_key)
+            if cached is not None:
+                log_debug(f"LLM cache hit for OpenAI {model}", chat_id)
+                return cached
+        
         client = get_client('openai')
         if not client:
             return None
 
-        completion = client.chat.completions.create(
+        started = time.monotonic()
+        completion = await client.chat.completions.create(
             model=model,
             messages=[{"role": "user", "content": prompt}]
         )
-        return completion.choices[0].message.content if completion.choices else None
+        content = completion.choices[0].message.content if completion.choices else None
+        
+        if cache_key and content:
+            LLM_RESPONSE_CACHE.set(cache_key, content, time.monotonic() - started)
+        return content
 
     except Exception as e:
         error_msg = f"Error in get_openai_completion for model {model}: {str(e)}"
         log_error(error_msg, chat_id)
         return None
 
-def get_together_completion(prompt, include_thinking=False, chat_id=None):
-    """Use Together AI DeepSeek-R1 for responses."""
+async def get_together_completion(prompt, include_thinking=False, chat_id=None, cache=False):
+    """
+    Use Together AI DeepSeek-R1 for responses.
+    With cache=True an identical prompt is answered from LLM_RESPONSE_CACHE.
+    """
     try:
         log_processed_prompt("Together_DeepSeek-R1", prompt, chat_id)
         
-        client = get_client('together')
-        if not client:
-            return None
+        model = "deepseek-ai/DeepSeek-R1"
+        params = {"temperature": 0.6}
+        cache_key = make_cache_key("together", model, params, prompt) if cache else None
+        final_text = await LLM_RESPONSE_CACHE.get_async(cache_key) if cache_key else None
+        
+        if final_text is not None:
+            log_debug(f"LLM cache hit for Together {model}", chat_id)
+        else:
+            client = get_client('together')
+            if not client:
+                return None
+                
+            started = time.monotonic()
+            completion = await client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                stream=False,
+                **params
+            )
+            final_text = completion.choices[0].message.content if completion.choices else ""
             
-        completion = client.chat.completions.create(
-            model="deepseek-ai/DeepSeek-R1",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.6,
-            stream=False
-        )
-        final_text = completion.choices[0].message.content if completion.choices else ""
+            if cache_key and final_text and final_text.strip():
+                LLM_RESPONSE_CACHE.set(cache_key, final_text, time.monotonic() - started)
         
         if include_thinking:
             return final_text if final_text.strip() else None
@@ -195,43 +247,92 @@ def get_together_completion(prompt, include_thinking=False, chat_id=None):
 
 # Initialize and track processing state for a chat session
 def init_processing_state(chat_id):
-    """Initialize the processing state for a new chat."""
-    PROCESSING_STATES[chat_id] = {
-        "status": "initializing",
-        "step": "starting",
-        "progress": 0,
-        "ner_result": None,
-        "search_call_result": None,
-        "search_result": None,
-        "assistant_response": None,
-        "critic_result": None,
-        "regenerated_response": None,
-        "regenerated_critic": None,
-        "final_response": None,
-        "completed": False,
-        "error": None
-    }
-    return PROCESSING_STATES[chat_id]
+    """Initialize the processing state for a new chat and return a snapshot of it."""
+    return PROCESSING_STATE_STORE.init(chat_id)
 
 def get_processing_state(chat_id):
-    """Retrieve the current processing state for a chat."""
-    if chat_id not in PROCESSING_STATES:
-        return None
-    return PROCESSING_STATES[chat_id]
+    """Retrieve a snapshot of the current processing state for a chat, or None."""
+    return PROCESSING_STATE_STORE.get(chat_id)
 
 def update_processing_state(chat_id, **kwargs):
-    """Update the processing state with new values."""
-    if chat_id not in PROCESSING_STATES:
-        init_processing_state(chat_id)
-    
-    for key, value in kwargs.items():
-        PROCESSING_STATES[chat_id][key] = value
-    
-    return PROCESSING_STATES[chat_id]
+    """Update the processing state with new values and return a snapshot of it."""
+    return PROCESSING_STATE_STORE.update(chat_id, **kwargs)
+
+def subscribe_processing_state(chat_id):
+    """
+    Subscribe to processing events for a chat.
+    Returns a queue that first receives a snapshot of the current state (if any)
+    and then one delta per stage transition.
+    """
+    return PROCESSING_STATE_STORE.subscribe(chat_id)
 
-def extract_ner_from_conversation(conversation_history, chat_id=None):
+def unsubscribe_processing_state(chat_id, subscriber):
+    """Remove a subscriber queue returned by subscribe_processing_state."""
+    PROCESSING_STATE_STORE.unsubscribe(chat_id, subscriber)
+
+# Phrases in a new user message that invalidate the preferences extracted so far
+NER_RESET_PATTERN = re.compile(
+    r"\b(start over|start again|from scratch|reset|forget (?:it|that|everything|all)|new search|something else entirely)\b",
+    re.IGNORECASE
+)
+
+def needs_full_ner(conversation_history, previous_preferences=None, processed_count=0):
+    """
+    Decide whether preferences must be extracted from the whole conversation.
+    Incremental extraction is only possible when earlier preferences exist, the
+    conversation has grown since they were extracted and no new user message asks
+    to start over.
+    """
+    if not previous_preferences or processed_count <= 0 or processed_count >= len(conversation_history):
+        return True
+    return any(
+        msg["role"] == "user" and NER_RESET_PATTERN.search(msg["content"])
+        for msg in conversation_history[processed_count:]
+    )
+
+def merge_preferences(previous_preferences, changes):
+    """
+    Merge the changes of an incremental NER pass into the previous preferences.
+    Nested dictionaries are merged key by key, None withdraws a preference and any
+    other value replaces the previous one.
+    """
+    merged = dict(previous_preferences)
+    for key, value in changes.items():
+        if value is None:
+            merged.pop(key, None)
+        elif isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_preferences(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+def parse_preferences_dict(ner_response):
+    """
+    Parse the Python dictionary returned by a NER prompt.
+    Returns (preferences_dict, error_message).
+    """
+    dict_match = re.search(r'```python\s*({[\s\S]*?})\s*```', ner_response)
+    if not dict_match:
+        # Try direct extraction if no code block
+        dict_match = re.search(r'({[\s\S]*?})', ner_response)
+        if not dict_match:
+            return None, "No valid preferences dictionary found"
+    try:
+        preferences_dict = eval(dict_match.group(1))
+    except Exception as e:
+        return None, f"Error parsing preferences: {str(e)}"
+    if not isinstance(preferences_dict, dict):
+        return None, "Extracted preferences are not a dictionary"
+    return preferences_dict, None
+
+async def extract_ner_from_conversation(conversation_history, chat_id=None, previous_preferences=None, processed_count=0):
     """
     Extract named entities (hotel preferences) from the conversation using NER prompt.
+    
+    When previous_preferences were extracted from the first processed_count messages,
+    only the newer messages are sent (ner_incremental.md) and the changes are merged
+    into the previous preferences. A reset request in the new messages, or missing
+    previous preferences, falls back to a full extraction with ner.md.
     Returns a dictionary of extracted preferences.
     """
     update_processing_state(chat_id, status="processing", step="extracting_ner", progress=10)
@@ -243,82 +344,71 @@ def extract_ner_from_conversation(conversation_history, chat_id=None):
             for msg in conversation_history
         ]
         
-        ner_template = read_prompt_template("ner.md")
+        incremental = not needs_full_ner(simple_conversation, previous_preferences, processed_count)
+        template_name = "ner_incremental.md" if incremental else "ner.md"
+        ner_template = get_prompt_template(template_name)
         if not ner_template:
-            log_error("Failed to read ner.md template", chat_id)
+            log_error(f"Failed to read {template_name} template", chat_id)
             update_processing_state(chat_id, error="Failed to read NER template")
             return {}
-            
-        ner_prompt = ner_template.replace("{conv}", json.dumps(simple_conversation, ensure_ascii=False, indent=2))
-        ner_response = get_openai_completion(ner_prompt, model="o3-mini", chat_id=chat_id)
+        
+        if incremental:
+            log_debug(f"Incremental NER over {len(simple_conversation) - processed_count} new messages", chat_id)
+            ner_prompt = ner_template.render(
+                preferences=json.dumps(previous_preferences, ensure_ascii=False, indent=2),
+                conv=json.dumps(simple_conversation[processed_count:], ensure_ascii=False, indent=2)
+            )
+        else:
+            ner_prompt = ner_template.render(conv=json.dumps(simple_conversation, ensure_ascii=False, indent=2))
+        ner_response = await get_openai_completion(ner_prompt, model="o3-mini", chat_id=chat_id, cache=True)
         
         if not ner_response:
             log_error("No NER response generated", chat_id)
             update_processing_state(chat_id, error="No NER response generated")
             return {}
-            
-        dict_pattern = r'```python\s*({[\s\S]*?})\s*```'
-        dict_match = re.search(dict_pattern, ner_response)
         
         update_processing_state(chat_id, step="ner_completed", progress=20)
         
-        if dict_match:
-            try:
-                preferences_dict = eval(dict_match.group(1))
-                log_debug(f"Extracted preferences: {json.dumps(preferences_dict, ensure_ascii=False)}", chat_id)
-                update_processing_state(chat_id, ner_result=preferences_dict)
-                return preferences_dict
-            except Exception as e:
-                log_error(f"Error parsing extracted preferences: {str(e)}", chat_id)
-                update_processing_state(chat_id, error=f"Error parsing preferences: {str(e)}")
-                return {}
-        else:
-            # Try direct extraction if no code block
-            dict_pattern = r'({[\s\S]*?})'
-            dict_match = re.search(dict_pattern, ner_response)
-            if dict_match:
-                try:
-                    preferences_dict = eval(dict_match.group(1))
-                    log_debug(f"Extracted preferences (direct): {json.dumps(preferences_dict, ensure_ascii=False)}", chat_id)
-                    update_processing_state(chat_id, ner_result=preferences_dict)
-                    return preferences_dict
-                except Exception as e:
-                    log_error(f"Error with direct parsing: {str(e)}", chat_id)
-                    update_processing_state(chat_id, error=f"Error with direct parsing: {str(e)}")
-                    return {}
-            else:
-                log_error("No valid preferences dictionary found in NER response", chat_id)
-                update_processing_state(chat_id, error="No valid preferences dictionary found")
-                return {}
+        preferences_dict, parse_error = parse_preferences_dict(ner_response)
+        if parse_error:
+            log_error(parse_error, chat_id)
+            update_processing_state(chat_id, error=parse_error)
+            return {}
+        
+        if incremental:
+            preferences_dict = merge_preferences(previous_preferences, preferences_dict)
+        
+        log_debug(f"Extracted preferences: {json.dumps(preferences_dict, ensure_ascii=False)}", chat_id)
+        update_processing_state(chat_id, ner_result=preferences_dict)
+        return preferences_dict
     except Exception as e:
         error_msg = f"Error in NER extraction: {str(e)}"
         log_error(error_msg, chat_id)
         update_processing_state(chat_id, error=error_msg)
         return {}
 
-def process_search_call(extracted_preferences, chat_id=None):
+async def process_search_call(extracted_preferences, chat_id=None):
     """
     Determine if a search should be triggered based on extracted preferences.
     Returns a string with the <function> search_func(...) call or "" if no search.
+    
+    In the default "local" SEARCH_CALL_MODE the call is built without a model
+    round trip; the search_call.md prompt is only used in "llm" mode or if the
+    local builder fails.
     """
     update_processing_state(chat_id, status="processing", step="processing_search_call", progress=30)
     
+    search_call_response = None
+    if SEARCH_CALL_MODE == "local":
+        try:
+            search_call_response = build_search_call(extracted_preferences)
+        except Exception as e:
+            log_error(f"Local search call builder failed, falling back to LLM: {str(e)}", chat_id)
+    
     try:
-        search_call_template = read_prompt_template("search_call.md")
-        if not search_call_template:
-            log_error("Failed to read search_call.md template", chat_id)
-            update_processing_state(chat_id, error="Failed to read search call template")
-            return ""
-        
-        search_call_prompt = search_call_template.replace(
-            "{preferences}",
-            json.dumps(extracted_preferences, ensure_ascii=False, indent=2)
-        )
-        
-        search_call_response = get_openai_completion(search_call_prompt, model="o3-mini", chat_id=chat_id)
+        if search_call_response is None:
+            search_call_response = await request_search_call(extracted_preferences, chat_id)
         if not search_call_response:
-            log_error("No search call response generated", chat_id)
-            update_processing_state(chat_id, error="No search call response generated")
             return ""
         
         search_call_response = search_call_response.strip()
@@ -338,10 +428,36 @@ def process_search_call(extracted_preferences, chat_id=None):
         update_processing_state(chat_id, error=error_msg)
         return ""
 
-def process_search_simulation(search_call, chat_id=None):
+async def request_search_call(extracted_preferences, chat_id=None):
+    """
+    Ask the search_call.md prompt for the search call.
+    Returns the raw model response, or None if it could not be generated.
+    """
+    search_call_template = get_prompt_template("search_call.md")
+    if not search_call_template:
+        log_error("Failed to read search_call.md template", chat_id)
+        update_processing_state(chat_id, error="Failed to read search call template")
+        return None
+    
+    search_call_prompt = search_call_template.render(
+        preferences=json.dumps(extracted_preferences, ensure_ascii=False, indent=2)
+    )
+    
+    search_call_response = await get_openai_completion(search_call_prompt, model="o3-mini", chat_id=chat_id, cache=True)
+    if not search_call_response:
+        log_error("No search call response generated", chat_id)
+        update_processing_state(chat_id, error="No search call response generated")
+        return None
+    return search_call_response
+
+async def process_search_simulation(search_call, chat_id=None):
     """
     Process the function calls in response_after_thinking, simulate search, 
     and return the search record (or None).
+    
+    Search records are cached on the canonical form of the search_func(...)
+    argument, so a turn whose preferences did not change (or were only reordered
+    or reformatted) skips the search simulator call.
     """
     update_processing_state(chat_id, status="processing", step="simulating_search", progress=50)
     
@@ -362,14 +478,32 @@ def process_search_simulation(search_call, chat_id=None):
         log_debug(f"Found {len(function_calls)} function calls to process", chat_id)
         function_call_content = function_calls[0]
         
-        search_template = read_prompt_template("search_simulator.md")
+        cache_key = make_cache_key("search", canonicalize_search_query(function_call_content))
+        cached_record = await SEARCH_RECORD_CACHE.get_async(cache_key)
+        if cached_record is not None:
+            log_debug("Search cache hit - skipping search simulation", chat_id)
+            search_record = {
+                "timestamp": datetime.now().strftime("%Y-%m-%d_%H-%M-%S"),
+                "parameters": function_call_content,
+                **cached_record
+            }
+            update_processing_state(
+                chat_id,
+                step="search_completed",
+                progress=60,
+                search_result=search_record
+            )
+            return search_record
+        
+        search_started = time.monotonic()
+        search_template = get_prompt_template("search_simulator.md")
         if not search_template:
             log_error("Failed to read search_simulator.md template", chat_id)
             update_processing_state(chat_id, error="Failed to read search simulator template")
             return None
         
-        search_prompt = search_template.replace("{search_query}", function_call_content.strip())
-        search_response = get_openai_completion(search_prompt, chat_id=chat_id)
+        search_prompt = search_template.render(search_query=function_call_content.strip())
+        search_response = await get_openai_completion(search_prompt, chat_id=chat_id)
         
         if not search_response:
             log_error("No search result received for query", chat_id)
@@ -420,6 +554,12 @@ def process_search_simulation(search_call, chat_id=None):
             "show_results_to_actor": num_matches <= threshold
         }
         
+        SEARCH_RECORD_CACHE.set(
+            cache_key,
+            {key: search_record[key] for key in ("results", "num_matches", "show_results_to_actor")},
+            time.monotonic() - search_started
+        )
+        
         update_processing_state(
             chat_id, 
             step="search_completed", 
@@ -435,76 +575,82 @@ def process_search_simulation(search_call, chat_id=None):
         update_processing_state(chat_id, error=error_msg)
         return None
     
-def generate_assistant_response(conversation_history, search_record=None, chat_id=None):
+async def generate_actor_candidate(conversation_history, search_record=None, chat_id=None):
+    """
+    Generate one assistant response based on conversation and search.
+    Does not touch the processing state, so several candidates can be generated concurrently.
+    Returns the thinking, the response after thinking and the final response, or None.
+    """
+    # Create a simpler conversation (role + content only) for the prompt
+    simple_conversation = [
+        {"role": msg["role"], "content": msg["content"]}
+        for msg in conversation_history
+    ]
+    
+    # Build the agent prompt
+    agent_template = get_prompt_template("actor.md")
+    if not agent_template:
+        log_error("Failed to read actor.md template", chat_id)
+        return None
+    
+    # Get search results text and match count if available
+    search_text = ""
+    num_matches = ""
+    
+    if search_record:
+        # Only provide search results and count if show_results_to_actor is True
+        if search_record.get("show_results_to_actor", False):
+            search_text = search_record.get("results", "")
+            
+            # Only provide the count when showing results
+            if "num_matches" in search_record:
+                num_matches = str(search_record["num_matches"])
+        # If not showing results, don't provide the count either
+    
+    # Build the final prompt
+    agent_prompt = agent_template.render(
+        conv=json.dumps(simple_conversation, ensure_ascii=False, indent=2),
+        search=search_text,
+        num_matches=num_matches
+    )
+    
+    # Generate assistant response
+    assistant_response = await get_together_completion(agent_prompt, include_thinking=True, chat_id=chat_id)
+    
+    if not assistant_response:
+        log_error("No assistant response generated", chat_id)
+        return None
+    
+    # Extract thinking and clean final response
+    thinking, response_after_thinking = extract_thinking(assistant_response)
+    final_response, _ = extract_function_calls(response_after_thinking)
+    if not final_response.strip():
+        final_response = response_after_thinking
+    
+    return {
+        "thinking": thinking,
+        "response_after_thinking": response_after_thinking,
+        "final_response": final_response
+    }
+
+async def generate_assistant_response(conversation_history, search_record=None, chat_id=None):
     """Generate the assistant response based on conversation and search."""
     update_processing_state(chat_id, status="processing", step="generating_assistant_response", progress=70)
     
     try:
-        # Create a simpler conversation (role + content only) for the prompt
-        simple_conversation = [
-            {"role": msg["role"], "content": msg["content"]}
-            for msg in conversation_history
-        ]
-        
-        # Build the agent prompt
-        agent_template = read_prompt_template("actor.md")
-        if not agent_template:
-            log_error("Failed to read actor.md template", chat_id)
-            update_processing_state(chat_id, error="Failed to read actor template")
-            return None
-        
-        # Get search results text and match count if available
-        search_text = ""
-        num_matches = ""
-        
-        if search_record:
-            # Only provide search results and count if show_results_to_actor is True
-            if search_record.get("show_results_to_actor", False):
-                search_text = search_record.get("results", "")
-                
-                # Only provide the count when showing results
-                if "num_matches" in search_record:
-                    num_matches = str(search_record["num_matches"])
-            # If not showing results, don't provide the count either
-        
-        # Build the final prompt
-        agent_prompt = (
-            agent_template
-            .replace("{conv}", json.dumps(simple_conversation, ensure_ascii=False, indent=2))
-            .replace("{search}", search_text)
-            .replace("{num_matches}", num_matches)
-        )
-        
-        # Generate assistant response
-        assistant_response = get_together_completion(agent_prompt, include_thinking=True, chat_id=chat_id)
-        
-        if not assistant_response:
-            log_error("No assistant response generated", chat_id)
+        assistant_result = await generate_actor_candidate(conversation_history, search_record, chat_id)
+        if not assistant_result:
             update_processing_state(chat_id, error="No assistant response generated")
             return None
-        
-        # Extract thinking and clean final response
-        thinking, response_after_thinking = extract_thinking(assistant_response)
-        final_response, _ = extract_function_calls(response_after_thinking)
-        if not final_response.strip():
-            final_response = response_after_thinking
             
         update_processing_state(
             chat_id,
             step="assistant_response_generated",
             progress=80,
-            assistant_response={
-                "thinking": thinking,
-                "response_after_thinking": response_after_thinking,
-                "final_response": final_response
-            }
+            assistant_response=assistant_result
         )
         
-        return {
-            "thinking": thinking,
-            "response_after_thinking": response_after_thinking,
-            "final_response": final_response
-        }
+        return assistant_result
         
     except Exception as e:
         error_msg = f"Error generating assistant response: {str(e)}"
@@ -512,7 +658,137 @@ def generate_assistant_response(conversation_history, search_record=None, chat_i
         update_processing_state(chat_id, error=error_msg)
         return None
     
-def get_critic_evaluation(conversation_history, assistant_response, search_record=None, chat_id=None):
+async def critique_response(conversation_history, assistant_response, search_record=None, chat_id=None):
+    """
+    Critique one assistant response using critic.md.
+    Does not touch the processing state, so several responses can be critiqued concurrently.
+    The same (conversation, response, search) triple is only sent to the critic once,
+    later evaluations are answered from CRITIC_RESULT_CACHE.
+    Returns the parsed critique JSON.
+    Raises:
+        ValueError: If the critic prompt cannot be built or the critic returns no valid JSON.
+    """
+    cache_key = make_critic_cache_key(conversation_history, assistant_response, search_record)
+    cached_critique = await CRITIC_RESULT_CACHE.get_async(cache_key)
+    if cached_critique is not None:
+        log_debug("Critique served from cache", chat_id)
+        return cached_critique
+    
+    # Create a simplified conversation for the prompt
+    simple_conversation = [
+        {"role": msg["role"], "content": msg["content"]} 
+        for msg in conversation_history
+    ]
+    
+    critic_template = get_prompt_template("critic.md")
+    if not critic_template:
+        raise ValueError("Failed to read critic template")
+    
+    # Add search results if available and shown to assistant
+    search_history = ""
+    if search_record and search_record.get("show_results_to_actor", False):
+        search_history = search_record.get("results", "")
+    else:
+        critic_template = critic_template.derive("without_search", strip_critic_search_block)
+    
+    # Create critic prompt
+    critic_prompt = critic_template.render(
+        original_prompt=get_actor_instructions(),
+        conversation=json.dumps(simple_conversation, ensure_ascii=False, indent=2),
+        last_response=assistant_response,
+        search_history=search_history
+    )
+    
+    # Get critic response
+    critic_started = time.monotonic()
+    critic_response = await get_together_completion(critic_prompt, chat_id=chat_id)
+    if not critic_response:
+        raise ValueError("No critic response generated")
+    
+    # Try to find JSON in the critique response
+    json_pattern = r'(\{[\s\S]*\})'
+    json_match = re.search(json_pattern, critic_response)
+    if not json_match:
+        raise ValueError("No valid JSON found in critic response")
+    try:
+        critique_json = json.loads(json_match.group(1))
+    except Exception as e:
+        raise ValueError(f"Error parsing critique JSON: {str(e)}")
+    
+    log_debug(f"Parsed critique: {json.dumps(critique_json, ensure_ascii=False)}", chat_id)
+    CRITIC_RESULT_CACHE.set(cache_key, critique_json, time.monotonic() - critic_started)
+    return critique_json
+
+async def critique_pair(conversation_history, first_response, second_response, search_record=None, chat_id=None):
+    """
+    Critique two responses to the same conversation in a single critic call.
+    Both are scored against the same rubric in the same context, so their scores are
+    directly comparable. The scores are relative to the other response, so the pair is cached
+    under a key of its own (the first response, with the second in the key context) and never
+    under the keys of single critiques.
+    Returns (first_critique, second_critique).
+    Raises:
+        ValueError: If the critic prompt cannot be built or the critic returns no valid pair.
+    """
+    cache_key = make_critic_cache_key(
+        conversation_history,
+        first_response,
+        search_record,
+        variant="pairwise",
+        context={"second_response": second_response},
+    )
+    cached_critiques = await CRITIC_RESULT_CACHE.get_async(cache_key)
+    if cached_critiques is not None:
+        log_debug("Pairwise critique served from cache", chat_id)
+        return tuple(cached_critiques)
+    
+    simple_conversation = [
+        {"role": msg["role"], "content": msg["content"]} 
+        for msg in conversation_history
+    ]
+    
+    critic_template = get_prompt_template("critic.md")
+    pairwise_template = get_prompt_template("critic_pairwise.md")
+    if not critic_template or not pairwise_template:
+        raise ValueError("Failed to read pairwise critic template")
+    
+    search_history = ""
+    if search_record and search_record.get("show_results_to_actor", False):
+        search_history = search_record.get("results", "")
+    else:
+        critic_template = critic_template.derive("without_search", strip_critic_search_block)
+    critic_template = critic_template.derive("pairwise", to_pairwise_critic)
+    
+    critic_prompt = critic_template.render(
+        original_prompt=get_actor_instructions(),
+        conversation=json.dumps(simple_conversation, ensure_ascii=False, indent=2),
+        first_response=first_response,
+        second_response=second_response,
+        search_history=search_history
+    ) + "\n\n" + pairwise_template.text
+    
+    critic_started = time.monotonic()
+    critic_response = await get_together_completion(critic_prompt, chat_id=chat_id)
+    if not critic_response:
+        raise ValueError("No pairwise critic response generated")
+    
+    json_match = re.search(r'(\{[\s\S]*\})', critic_response)
+    if not json_match:
+        raise ValueError("No valid JSON found in pairwise critic response")
+    try:
+        pair_json = json.loads(json_match.group(1))
+    except Exception as e:
+        raise ValueError(f"Error parsing pairwise critique JSON: {str(e)}")
+    
+    critiques = (pair_json.get("output_1"), pair_json.get("output_2"))
+    if not all(isinstance(critique, dict) for critique in critiques):
+        raise ValueError("Pairwise critique does not evaluate both outputs")
+    
+    log_debug(f"Parsed pairwise critique: {json.dumps(pair_json, ensure_ascii=False)}", chat_id)
+    CRITIC_RESULT_CACHE.set(cache_key, list(critiques), time.monotonic() - critic_started)
+    return critiques
+
+async def get_critic_evaluation(conversation_history, assistant_response, search_record=None, chat_id=None):
     """
     Get a critique of the assistant's response using critic.md.
     Returns a JSON object with score and reason.
@@ -520,76 +796,111 @@ def get_critic_evaluation(conversation_history, assistant_response, search_recor
     update_processing_state(chat_id, status="processing", step="evaluating_response", progress=85)
     
     try:
-        # Create a simplified conversation for the prompt
-        simple_conversation = [
-            {"role": msg["role"], "content": msg["content"]} 
-            for msg in conversation_history
-        ]
-        
-        critic_template = read_prompt_template("critic.md")
-        if not critic_template:
-            log_error("Failed to read critic.md template", chat_id)
-            update_processing_state(chat_id, error="Failed to read critic template")
-            return None
-        
-        # Get original prompt template
-        original_prompt = read_prompt_template("actor.md")
-        if original_prompt:
-            # Remove placeholders
-            original_prompt = original_prompt.replace("{conv}", "").replace("{search}", "").replace("{num_matches}", "").strip()
-        else:
-            original_prompt = "Default Actor Prompt"
-        
-        # Create critic prompt
-        critic_prompt = critic_template.replace("{original_prompt}", original_prompt)
-        critic_prompt = critic_prompt.replace("{conversation}", json.dumps(simple_conversation, ensure_ascii=False, indent=2))
-        critic_prompt = critic_prompt.replace("{last_response}", assistant_response)
-        
-        # Add search results if available and shown to assistant
-        if search_record and search_record.get("show_results_to_actor", False):
-            critic_prompt = critic_prompt.replace("{search_history}", search_record.get("results", ""))
-        else:
-            critic_prompt = critic_prompt.replace("<last_search_output>\n{search_history}\n</last_search_output>", "")
-        
-        # Get critic response
-        critic_response = get_together_completion(critic_prompt, chat_id=chat_id)
-        if not critic_response:
-            log_error("No critic response generated", chat_id)
-            update_processing_state(chat_id, error="No critic response generated")
-            return None
-        
-        # Try to find JSON in the critique response
-        json_pattern = r'(\{[\s\S]*\})'
-        json_match = re.search(json_pattern, critic_response)
-        if json_match:
-            try:
-                critique_json = json.loads(json_match.group(1))
-                log_debug(f"Parsed critique: {json.dumps(critique_json, ensure_ascii=False)}", chat_id)
-                
-                update_processing_state(
-                    chat_id,
-                    step="critique_completed",
-                    progress=90,
-                    critic_result=critique_json
-                )
-                
-                return critique_json
-            except Exception as e:
-                log_error(f"Error parsing critique JSON: {str(e)}", chat_id)
-                update_processing_state(chat_id, error=f"Error parsing critique JSON: {str(e)}")
-                return None
-        else:
-            log_error("No valid JSON found in critic response", chat_id)
-            update_processing_state(chat_id, error="No valid JSON found in critic response")
-            return None
-
+        critique_json = await critique_response(conversation_history, assistant_response, search_record, chat_id)
+        update_processing_state(
+            chat_id,
+            step="critique_completed",
+            progress=90,
+            critic_result=critique_json
+        )
+        return critique_json
+    
+    except ValueError as e:
+        log_error(str(e), chat_id)
+        update_processing_state(chat_id, error=str(e))
+        return None
     except Exception as e:
         error_msg = f"Error in critique evaluation: {str(e)}"
         log_error(error_msg, chat_id)
         update_processing_state(chat_id, error=error_msg)
         return None
 
-def regenerate_low_score_response(conversation_history, assistant_response, critique, search_record=None, chat_id=None):
+async def get_pairwise_evaluation(pairwise, output_index, assistant_response, chat_id=None):
+    """
+    Get the critique of one output of a PairwiseCritique.
+    Records the same progress and result in the processing state as get_critic_evaluation.
+    """
+    update_processing_state(chat_id, status="processing", step="evaluating_response", progress=85)
+    
+    try:
+        critique_json = await pairwise.evaluate(output_index, assistant_response)
+        if critique_json is None:
+            raise ValueError("No pairwise critique generated")
+        update_processing_state(
+            chat_id,
+            step="critique_completed",
+            progress=90,
+            critic_result=critique_json
+        )
+        return critique_json
+    
+    except ValueError as e:
+        log_error(str(e), chat_id)
+        update_processing_state(chat_id, error=str(e))
+        return None
+    except Exception as e:
+        error_msg = f"Error in pairwise critique evaluation: {str(e)}"
+        log_error(error_msg, chat_id)
+        update_processing_state(chat_id, error=error_msg)
+        return None
+
+async def generate_best_of_n(conversation_history, search_record=None, chat_id=None, candidates=2):
+    """
+    Generate several actor candidates concurrently, critique them concurrently and keep the best.
+    Replaces actor -> critic -> regenerate -> critic with two rounds of concurrent calls.
+    The scores of all candidates are recorded in the processing state.
+    Returns (assistant_result, critique) of the best candidate, or (None, None) if none was generated.
+    """
+    update_processing_state(chat_id, status="processing", step="generating_candidates", progress=70)
+    
+    results = await asyncio.gather(*(
+        generate_actor_candidate(conversation_history, search_record, chat_id)
+        for _ in range(candidates)
+    ), return_exceptions=True)
+    results = [result for result in results if isinstance(result, dict)]
+    if not results:
+        update_processing_state(chat_id, error="No assistant response generated")
+        return None, None
+    
+    update_processing_state(
+        chat_id,
+        step="evaluating_candidates",
+        progress=80,
+        assistant_response=results[0]
+    )
+    
+    critiques = await asyncio.gather(*(
+        critique_response(conversation_history, result["final_response"], search_record, chat_id)
+        for result in results
+    ), return_exceptions=True)
+    
+    scored = []
+    for result, critique in zip(results, critiques):
+        if isinstance(critique, Exception):
+            log_error(f"Error critiquing candidate: {str(critique)}", chat_id)
+            critique = None
+        score = critique.get("total_score") if critique else None
+        scored.append((result, critique, score if isinstance(score, (int, float)) else None))
+    
+    # The first candidate with the highest score wins, unscored candidates only if nothing was scored
+    best_result, best_critique, best_score = max(
+        scored, key=lambda item: item[2] if item[2] is not None else float("-inf")
+    )
+    log_debug(f"Best of {len(scored)} candidates scored {best_score}", chat_id)
+    update_processing_state(
+        chat_id,
+        step="critique_completed",
+        progress=90,
+        assistant_response=best_result,
+        critic_result=best_critique,
+        candidates=[
+            {"final_response": result["final_response"], "total_score": score}
+            for result, _, score in scored
+        ]
+    )
+    return best_result, best_critique
+
+async def regenerate_low_score_response(conversation_history, assistant_response, critique, search_record=None, chat_id=None):
     """
     Regenerate a response if the score is low.
     """
@@ -641,30 +952,29 @@ def regenerate_low_score_response(conversation_history, assistant_response, crit
             search_history_str = search_record.get("results", "")
         
         # Read the response updater template
-        regen_template = read_prompt_template("critic_regen.md")
+        regen_template = get_prompt_template("critic_regen.md")
         if not regen_template:
             log_error("Could not read critic_regen.md template", chat_id)
             update_processing_state(chat_id, error="Could not read regeneration template")
             return None
         
         # Build the regeneration prompt
-        regen_prompt = (
-            regen_template
-            .replace("{conversation_context}", conversation_context_str)
-            .replace("{last_response}", assistant_response)
-            .replace("{critic_reason}", critic_reason_str)
-            .replace("{search_history}", search_history_str)
+        regen_prompt = regen_template.render(
+            conversation_context=conversation_context_str,
+            last_response=assistant_response,
+            critic_reason=critic_reason_str,
+            search_history=search_history_str
         )
         
         # Generate improved response
-        regenerated_response = get_together_completion(regen_prompt, chat_id=chat_id)
+        regenerated_response = await get_together_completion(regen_prompt, chat_id=chat_id)
         if not regenerated_response:
             log_error("Regeneration call returned None or empty", chat_id)
             update_processing_state(chat_id, error="Regeneration call returned empty")
             return None
         
         # Re-evaluate the regenerated response
-        regenerated_critique = get_critic_evaluation(
+        regenerated_critique = await get_critic_evaluation(
             conversation_history,
             regenerated_response,
             search_record,
@@ -690,33 +1000,223 @@ def regenerate_low_score_response(conversation_history, assistant_response, crit
         update_processing_state(chat_id, error=error_msg)
         return None
 
-def process_chat_async(chat_id, conversation_history, enable_search=True, evaluate_response=True, regenerate_response=True):
+# Fields produced by the shared NER/search stages that every output of a turn reuses
+SHARED_STATE_FIELDS = ("status", "step", "progress", "ner_result", "search_call_result", "search_result", "error", "degraded")
+
+def record_degradation(chat_id, stage, reason, deadline):
     """
-    Process a chat asynchronously, updating the state as it progresses.
-    This function will be run in a separate thread.
+    Record in the processing state that a stage was skipped ("budget") or cut off ("timeout").
     """
-    # Import Flask's current_app to get the application context
-    from flask import current_app
-    app = current_app._get_current_object()
+    state = get_processing_state(chat_id) or {}
+    degraded = list(state.get("degraded") or [])
+    degraded.append({"stage": stage, "reason": reason, "remaining": round(deadline.remaining(), 1)})
+    log_debug(f"Degraded {stage} ({reason}), {deadline.remaining():.1f}s of the turn budget left", chat_id)
+    update_processing_state(chat_id, degraded=degraded)
+
+async def run_stage(chat_id, deadline, stages, coro, default=None):
+    """
+    Await coro with the timeout of the given stages, capped by the turn deadline.
+    A stage that times out is cancelled, recorded as degraded and yields default.
+    """
+    stages = (stages,) if isinstance(stages, str) else stages
+    timeout = deadline.timeout(*stages)
+    if timeout <= 0:
+        coro.close()
+        record_degradation(chat_id, stages[0], "budget", deadline)
+        return default
+    try:
+        return await asyncio.wait_for(coro, timeout)
+    except asyncio.TimeoutError:
+        log_error(f"Stage {stages[0]} timed out after {timeout:.1f}s", chat_id)
+        record_degradation(chat_id, stages[0], "timeout", deadline)
+        return default
+
+class PairwiseCritique:
+    """
+    Joins the two outputs of a turn at the critic stage.
+    Each output hands in its response with evaluate(); once both are in, a single
+    critique_pair call scores them and each output gets its own critique back.
+    An output that fails before the critic stage withdraws, and the other one is
+    then critiqued on its own.
+    Attributes:
+        conversation_history (list): The conversation both outputs answer.
+        search_record (dict, optional): The search record shared by both outputs.
+        chat_id (str): The chat id used for logging.
+    Methods:
+        evaluate(output_index, response):
+            Waits for the other output and returns the critique of this one.
+        withdraw(output_index):
+            Marks an output as not taking part, safe to call more than once.
+    """
+
+    def __init__(self, conversation_history, search_record=None, chat_id=None):
+        self.conversation_history = conversation_history
+        self.search_record = search_record
+        self.chat_id = chat_id
+        loop = asyncio.get_running_loop()
+        self.responses = [loop.create_future(), loop.create_future()]
+        self.task = None
+
+    def withdraw(self, output_index):
+        if not self.responses[output_index].done():
+            self.responses[output_index].set_result(None)
+
+    async def evaluate(self, output_index, response):
+        if not self.responses[output_index].done():
+            self.responses[output_index].set_result(response)
+        if self.task is None:
+            self.task = asyncio.ensure_future(self._critique())
+        return (await asyncio.shield(self.task))[output_index]
+
+    async def _critique(self):
+        responses = await asyncio.gather(*self.responses)
+        if None not in responses:
+            return await critique_pair(
+                self.conversation_history, responses[0], responses[1], self.search_record, self.chat_id
+            )
+        critiques = [None, None]
+        for output_index, response in enumerate(responses):
+            if response is not None:
+                critiques[output_index] = await critique_response(
+                    self.conversation_history, response, self.search_record, self.chat_id
+                )
+        return critiques
+
+async def notify_completion(chat_id, on_complete=None):
+    """
+    Hand the final processing state of one output to on_complete(chat_id, state).
+    The callback runs in a thread so that database work never blocks the event loop.
+    """
+    if on_complete is None:
+        return
+    try:
+        await asyncio.to_thread(on_complete, chat_id, get_processing_state(chat_id))
+    except Exception as e:
+        log_error(f"Error in completion callback: {str(e)}", chat_id)
+
+def share_processing_state(source_chat_id, target_chat_ids):
+    """Copy the shared stage results of one processing state to the other outputs of the turn."""
+    source = get_processing_state(source_chat_id)
+    if not source:
+        return
+    shared = {key: source[key] for key in SHARED_STATE_FIELDS}
+    for target_chat_id in target_chat_ids:
+        update_processing_state(target_chat_id, **shared)
+
+async def process_chat_async(chat_id, conversation_history, enable_search=True, evaluate_response=True, regenerate_response=True, second_chat_id=None, previous_preferences=None, processed_count=0, on_complete=None, deadline=None):
+    """
+    Process a chat asynchronously, updating the state as it progresses.
+    Every stage is awaited on the shared pipeline event loop, so a turn that is
+    waiting on a provider never holds a thread.
     
+    NER and search run once per turn. When second_chat_id is given the pipeline
+    forks at the actor stage and both outputs generate and critique their
+    responses concurrently from the same search record.
+    
+    previous_preferences and processed_count describe the preferences extracted
+    in earlier turns, which lets the NER stage only look at the new messages.
+    
+    on_complete(chat_id, state) is called once per output with its final state,
+    which is how the result reaches the database.
+    
+    Every stage runs against the turn's deadline (a TurnDeadline, one is started if
+    none is given). The search stages only run while the budget still leaves room
+    for the actor; otherwise the turn is answered without search.
+    """
+    output_chat_ids = [chat_id] + ([second_chat_id] if second_chat_id else [])
+    if deadline is None:
+        deadline = TurnDeadline()
     try:
-        init_processing_state(chat_id)
         log_debug(f"Starting async processing for chat {chat_id}", chat_id)
         
+        # Recorded for every output, no shared stage runs after this to copy it to the second one
+        if enable_search and not deadline.allows("ner", "search_call", "search", "actor"):
+            for output_chat_id in output_chat_ids:
+                record_degradation(output_chat_id, "search", "budget", deadline)
+            enable_search = False
+        
         # STEP 1: NER Extraction
         extracted_preferences = {}
         if enable_search:
-            extracted_preferences = extract_ner_from_conversation(conversation_history, chat_id)
+            extracted_preferences = await run_stage(
+                chat_id, deadline, "ner",
+                extract_ner_from_conversation(conversation_history, chat_id, previous_preferences, processed_count),
+                default={}
+            )
+            share_processing_state(chat_id, output_chat_ids[1:])
         
         # STEP 2: Search Determination
         search_record = None
         if enable_search and extracted_preferences:
-            search_call = process_search_call(extracted_preferences, chat_id)
-            if search_call:
-                search_record = process_search_simulation(search_call, chat_id)
+            search_call = await run_stage(
+                chat_id, deadline, "search_call", process_search_call(extracted_preferences, chat_id)
+            )
+            if search_call and not deadline.allows("search", "actor"):
+                record_degradation(chat_id, "search", "budget", deadline)
+            elif search_call:
+                search_record = await run_stage(
+                    chat_id, deadline, "search", process_search_simulation(search_call, chat_id)
+                )
+            share_processing_state(chat_id, output_chat_ids[1:])
         
-        # STEP 3: Generate Assistant Response
-        assistant_result = generate_assistant_response(conversation_history, search_record, chat_id)
+    except Exception as e:
+        error_msg = f"Error in process_chat_async: {str(e)}"
+        log_error(error_msg, chat_id)
+        for output_chat_id in output_chat_ids:
+            update_processing_state(
+                output_chat_id,
+                status="error",
+                error=error_msg,
+                completed=True
+            )
+        await asyncio.gather(*(
+            notify_completion(output_chat_id, on_complete) for output_chat_id in output_chat_ids
+        ))
+        return
+    
+    # Both outputs share one critic call in pairwise mode, best-of-N critiques its own candidates
+    pairwise = None
+    if CRITIC_MODE == "pairwise" and second_chat_id and evaluate_response and BEST_OF_N_CANDIDATES <= 1:
+        pairwise = PairwiseCritique(conversation_history, search_record, chat_id)
+    
+    # STEPS 3-6 run once per output
+    await asyncio.gather(*(
+        respond_and_evaluate(
+            output_chat_id, conversation_history, search_record, evaluate_response, regenerate_response, on_complete,
+            pairwise=pairwise, output_index=output_index, deadline=deadline
+        )
+        for output_index, output_chat_id in enumerate(output_chat_ids)
+    ))
+
+async def respond_and_evaluate(chat_id, conversation_history, search_record=None, evaluate_response=True, regenerate_response=True, on_complete=None, pairwise=None, output_index=0, deadline=None):
+    """
+    Generate, critique and optionally regenerate the response of one output.
+    The final result is recorded in the processing state of chat_id and handed
+    to on_complete as soon as this output is done. With a PairwiseCritique, the
+    response is critiqued together with the other output of the turn and is never
+    regenerated, so the scores of both outputs come from the same critique.
+    
+    Every stage runs against the turn's deadline. Regeneration and then the critic
+    are skipped when the remaining budget no longer covers them.
+    """
+    if deadline is None:
+        deadline = TurnDeadline()
+    try:
+        # STEPS 3-5 in best-of-N mode: concurrent candidates and critiques instead of regeneration
+        best_of_n = evaluate_response and BEST_OF_N_CANDIDATES > 1 and deadline.allows("actor", "critic")
+        if best_of_n:
+            assistant_result, critique = await run_stage(
+                chat_id, deadline, ("actor", "critic"),
+                generate_best_of_n(conversation_history, search_record, chat_id, BEST_OF_N_CANDIDATES),
+                default=(None, None)
+            )
+        else:
+            # STEP 3: Generate Assistant Response
+            assistant_result = await run_stage(
+                chat_id, deadline, "actor",
+                generate_assistant_response(conversation_history, search_record, chat_id)
+            )
+            critique = None
         if not assistant_result:
             update_processing_state(
                 chat_id,
@@ -729,35 +1229,41 @@ def process_chat_async(chat_id, conversation_history, enable_search=True, evalua
         final_response = assistant_result["final_response"]
         
         # STEP 4: Evaluate Response
-        critique = None
-        if evaluate_response:
-            critique = get_critic_evaluation(
-                conversation_history, 
-                final_response, 
-                search_record, 
-                chat_id
+        if evaluate_response and not best_of_n and not deadline.allows("critic"):
+            record_degradation(chat_id, "critic", "budget", deadline)
+        elif pairwise is not None:
+            critique = await run_stage(
+                chat_id, deadline, "critic",
+                get_pairwise_evaluation(pairwise, output_index, final_response, chat_id)
+            )
+        elif evaluate_response and not best_of_n:
+            critique = await run_stage(
+                chat_id, deadline, "critic",
+                get_critic_evaluation(conversation_history, final_response, search_record, chat_id)
             )
         
         # STEP 5: Regenerate Low-Score Response
+        # Not in pairwise mode: a regenerated response would be scored by the single critic,
+        # and that score is not comparable with the pairwise scores of both outputs
         regeneration_result = None
-        if regenerate_response and critique and critique.get("total_score", 10) <= 8.5:
-            regeneration_result = regenerate_low_score_response(
-                conversation_history,
-                final_response,
-                critique,
-                search_record,
-                chat_id
-            )
+        if regenerate_response and pairwise is None and not best_of_n and critique and critique.get("total_score", 10) <= 8.5:
+            if not deadline.allows("regeneration", "critic"):
+                record_degradation(chat_id, "regeneration", "budget", deadline)
+            else:
+                regeneration_result = await run_stage(
+                    chat_id, deadline, ("regeneration", "critic"),
+                    regenerate_low_score_response(conversation_history, final_response, critique, search_record, chat_id)
+                )
+        
+        # Use regenerated response if it has a better score
+        if regeneration_result and regeneration_result.get("regenerated_critique"):
+            regen_critique = regeneration_result["regenerated_critique"]
+            regen_score = regen_critique.get("total_score")
+            original_score = critique.get("total_score")
             
-            # Use regenerated response if it has a better score
-            if regeneration_result and regeneration_result.get("regenerated_critique"):
-                regen_critique = regeneration_result["regenerated_critique"]
-                regen_score = regen_critique.get("total_score")
-                original_score = critique.get("total_score")
-                
-                if regen_score and original_score and regen_score > original_score:
-                    log_debug(f"Using regenerated response with improved score: {original_score} -> {regen_score}", chat_id)
-                    final_response = regeneration_result["regenerated_response"]
+            if regen_score and original_score and regen_score > original_score:
+                log_debug(f"Using regenerated response with improved score: {original_score} -> {regen_score}", chat_id)
+                final_response = regeneration_result["regenerated_response"]
         
         # STEP 6: Update final state
         update_processing_state(
@@ -772,7 +1278,7 @@ def process_chat_async(chat_id, conversation_history, enable_search=True, evalua
         log_debug(f"Completed async processing for chat {chat_id}", chat_id)
         
     except Exception as e:
-        error_msg = f"Error in process_chat_async: {str(e)}"
+        error_msg = f"Error in respond_and_evaluate: {str(e)}"
         log_error(error_msg, chat_id)
         update_processing_state(
             chat_id,
@@ -780,29 +1286,75 @@ def process_chat_async(chat_id, conversation_history, enable_search=True, evalua
             error=error_msg,
             completed=True
         )
+    finally:
+        # Never leave the other output waiting for a response that will not come
+        if pairwise is not None:
+            pairwise.withdraw(output_index)
+        await notify_completion(chat_id, on_complete)
+
+def get_pipeline_loop():
+    """
+    Return the event loop that drives every chat pipeline.
+    The loop is created on first use and runs forever in a daemon thread.
+    """
+    global PIPELINE_LOOP, PIPELINE_SEMAPHORE
+    with PIPELINE_LOOP_LOCK:
+        if PIPELINE_LOOP is None:
+            PIPELINE_LOOP = asyncio.new_event_loop()
+            PIPELINE_SEMAPHORE = asyncio.Semaphore(MAX_CONCURRENT_PIPELINES)
+            threading.Thread(
+                target=PIPELINE_LOOP.run_forever,
+                name="chat-pipeline-loop",
+                daemon=True
+            ).start()
+        return PIPELINE_LOOP
+
+async def run_pipeline(chat_id, conversation_history, **options):
+    """Run process_chat_async once a pipeline slot is free. Waiting for a slot counts against the turn deadline."""
+    async with PIPELINE_SEMAPHORE:
+        await process_chat_async(chat_id, conversation_history, **options)
 
-def start_processing_thread(chat_id, conversation_history, enable_search=True, evaluate_response=True, regenerate_response=True):
+def start_processing(chat_id, conversation_history, enable_search=True, evaluate_response=True, regenerate_response=True, second_chat_id=None, previous_preferences=None, processed_count=0, on_complete=None):
     """
-    Start a new thread to process the chat asynchronously.
-    Returns the initial processing state.
+    Schedule the chat pipeline on the shared event loop.
+    Pass second_chat_id to also produce the second assistant output from the same
+    NER and search stages, and previous_preferences/processed_count to extract
+    preferences from the new messages only. on_complete(chat_id, state) receives
+    the final state of every output. The turn's deadline starts now.
+    Returns the initial processing state without waiting for the pipeline.
     """
-    # Initialize the processing state
+    # Initialize the processing states before returning so that clients never
+    # observe the state of the previous turn
     state = init_processing_state(chat_id)
+    if second_chat_id:
+        init_processing_state(second_chat_id)
     
-    # Import the Flask app
-    from flask import current_app
-    app = current_app._get_current_object()
-    
-    # Define a wrapper function that manages the application context
-    def process_with_app_context():
-        with app.app_context():
-            process_chat_async(chat_id, conversation_history, enable_search, evaluate_response, regenerate_response)
-    
-    # Start processing in a separate thread with app context
-    thread = threading.Thread(
-        target=process_with_app_context
+    # process_chat_async records its own errors in the processing state
+    asyncio.run_coroutine_threadsafe(
+        run_pipeline(
+            chat_id,
+            conversation_history,
+            enable_search=enable_search,
+            evaluate_response=evaluate_response,
+            regenerate_response=regenerate_response,
+            second_chat_id=second_chat_id,
+            previous_preferences=previous_preferences,
+            processed_count=processed_count,
+            on_complete=on_complete,
+            deadline=TurnDeadline()
+        ),
+        get_pipeline_loop()
     )
-    thread.daemon = True
-    thread.start()
     
-    return state
\ No newline at end of file
+    return state
+
+def critique_pair_sync(conversation_history, first_response, second_response, search_record=None):
+    """
+    Run critique_pair on the pipeline event loop and wait for it.
+    For worker threads such as the critic backfill; must not be called from the loop itself.
+    """
+    future = asyncio.run_coroutine_threadsafe(
+        critique_pair(conversation_history, first_response, second_response, search_record),
+        get_pipeline_loop()
+    )
+    return future.result()
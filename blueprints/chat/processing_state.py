@@ -0,0 +1,449 @@
+import os
+import json
+import time
+import queue
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+# ==================================================================================================#
+#                                          ⛔NOTE⛔                                                 #
+# Processing state of the chat pipeline, one entry per processed output                             #
+# (<chat_id> for the primary and <chat_id>_second for the second assistant).                        #
+# Readers only ever get snapshots (copies) of an entry, so serializing a state never races with     #
+# the pipeline updating it. Entries of completed turns expire after a TTL and the number of         #
+# entries is capped, so the store does not grow for the life of the process.                        #
+#                                                                                                   #
+# PROCESSING_STATE_BACKEND selects where states live:                                               #
+#   "memory" - in this process only (default, fine for a single worker)                             #
+#   "sqlite" - in a SQLite WAL table shared by every worker process on the machine                  #
+# Any other backend (e.g. a Redis-compatible store) only has to implement StateStore.               #
+# ==================================================================================================#
+
+# Seconds between two sweeps of expired states
+SWEEP_INTERVAL = 30
+# Seconds between two checks for updates made by another process
+POLL_INTERVAL = 0.25
+# Fields sent with every delta so that a client can always render the current step
+EVENT_FIELDS = ("status", "step", "progress", "completed", "error")
+
+
+def new_processing_state():
+    """Return the state of a turn that has just been scheduled."""
+    return {
+        "status": "initializing",
+        "step": "starting",
+        "progress": 0,
+        "ner_result": None,
+        "search_call_result": None,
+        "search_result": None,
+        "assistant_response": None,
+        "critic_result": None,
+        "regenerated_response": None,
+        "regenerated_critic": None,
+        "candidates": None,
+        "final_response": None,
+        "degraded": [],
+        "completed": False,
+        "error": None,
+    }
+
+
+def make_event(state, changes):
+    """Build the delta pushed to subscribers for a set of changed fields."""
+    event = {key: state[key] for key in EVENT_FIELDS}
+    event.update(changes)
+    return event
+
+
+class StateStore(ABC):
+    """
+    Interface of a processing state store.
+    Every method must be safe to call from any thread, and a get() that follows an
+    update() of the same chat must see that update (read-your-writes).
+    Methods:
+        init(chat_id):
+            Resets the state of chat_id and returns a snapshot of it.
+        get(chat_id):
+            Returns a snapshot of the state of chat_id, or None if it is unknown or expired.
+        update(chat_id, **kwargs):
+            Applies kwargs to the state (creating it if needed) and returns a snapshot.
+        subscribe(chat_id):
+            Returns an object with get(timeout) that yields a snapshot of the current state
+            followed by one delta per update, and raises queue.Empty on timeout.
+        unsubscribe(chat_id, subscriber):
+            Releases a subscriber returned by subscribe().
+    """
+
+    @abstractmethod
+    def init(self, chat_id):
+        pass
+
+    @abstractmethod
+    def get(self, chat_id):
+        pass
+
+    @abstractmethod
+    def update(self, chat_id, **kwargs):
+        pass
+
+    @abstractmethod
+    def subscribe(self, chat_id):
+        pass
+
+    @abstractmethod
+    def unsubscribe(self, chat_id, subscriber):
+        pass
+
+
+class MemoryStateStore(StateStore):
+    """
+    In-process processing state store with a size cap, a TTL after completion and locking.
+    Attributes:
+        max_entries (int): Maximum number of states kept. The least recently updated completed
+                           states are evicted first, then the least recently updated ones.
+        ttl (float): Seconds a completed state is kept after its last update.
+    Methods:
+        init(chat_id):
+            Resets the state of chat_id and returns a snapshot of it.
+        get(chat_id):
+            Returns a snapshot of the state of chat_id, or None if it is unknown or expired.
+        update(chat_id, **kwargs):
+            Applies kwargs to the state (creating it if needed), notifies subscribers of the
+            changed fields and returns a snapshot.
+        subscribe(chat_id) / unsubscribe(chat_id, subscriber):
+            Manage queues that receive a snapshot followed by one delta per update.
+    """
+
+    def __init__(self, max_entries=1000, ttl=600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.states = OrderedDict()  # chat_id -> (updated_at, state)
+        self.subscribers = {}
+        self.lock = threading.Lock()
+        self.last_sweep = 0.0
+
+    def _evict(self):
+        # Expired states are swept at most once per SWEEP_INTERVAL, _get drops them lazily otherwise
+        now = time.time()
+        if now - self.last_sweep > SWEEP_INTERVAL:
+            self.last_sweep = now
+            expired = [
+                chat_id
+                for chat_id, (updated_at, state) in self.states.items()
+                if state["completed"] and now - updated_at > self.ttl
+            ]
+            for chat_id in expired:
+                del self.states[chat_id]
+
+        if len(self.states) > self.max_entries:
+            completed = [chat_id for chat_id, (_, state) in self.states.items() if state["completed"]]
+            for chat_id in completed[: len(self.states) - self.max_entries]:
+                del self.states[chat_id]
+        while len(self.states) > self.max_entries:
+            self.states.popitem(last=False)
+
+    def _get(self, chat_id):
+        entry = self.states.get(chat_id)
+        if entry is None:
+            return None
+        updated_at, state = entry
+        if state["completed"] and time.time() - updated_at > self.ttl:
+            del self.states[chat_id]
+            return None
+        return state
+
+    def _put(self, chat_id, state):
+        self.states[chat_id] = (time.time(), state)
+        self.states.move_to_end(chat_id)
+        self._evict()
+
+    def _publish(self, chat_id, event):
+        for subscriber in self.subscribers.get(chat_id, []):
+            subscriber.put(event)
+
+    def init(self, chat_id):
+        with self.lock:
+            state = new_processing_state()
+            self._put(chat_id, state)
+            self._publish(chat_id, dict(state))
+            return dict(state)
+
+    def get(self, chat_id):
+        with self.lock:
+            state = self._get(chat_id)
+            return dict(state) if state is not None else None
+
+    def update(self, chat_id, **kwargs):
+        with self.lock:
+            state = self._get(chat_id)
+            if state is None:
+                state = new_processing_state()
+            changes = {key: value for key, value in kwargs.items() if state.get(key) != value}
+            # Never mutate a state in place, snapshots handed out earlier stay consistent
+            state = {**state, **kwargs}
+            self._put(chat_id, state)
+
+            # Every stage transition is pushed to stream subscribers as a delta
+            if changes:
+                self._publish(chat_id, make_event(state, changes))
+            return dict(state)
+
+    def subscribe(self, chat_id):
+        subscriber = queue.Queue()
+        with self.lock:
+            self.subscribers.setdefault(chat_id, []).append(subscriber)
+            state = self._get(chat_id)
+            if state is not None:
+                subscriber.put(dict(state))
+        return subscriber
+
+    def unsubscribe(self, chat_id, subscriber):
+        with self.lock:
+            subscribers = self.subscribers.get(chat_id, [])
+            if subscriber in subscribers:
+                subscribers.remove(subscriber)
+            if not subscribers:
+                self.subscribers.pop(chat_id, None)
+
+
+class SQLiteSubscriber:
+    """
+    Follows one state of a SQLiteStateStore.
+    Updates made in this process wake it up immediately, updates made by other
+    processes are picked up every POLL_INTERVAL seconds.
+    """
+
+    def __init__(self, store, chat_id):
+        self.store = store
+        self.chat_id = chat_id
+        self.version = 0
+        self.state = None
+
+    def get(self, timeout=None):
+        deadline = time.monotonic() + (timeout if timeout is not None else float("inf"))
+        while True:
+            row = self.store._read(self.chat_id)
+            if row is not None and row[0] != self.version:
+                version, state = row
+                if self.state is None or version < self.version:
+                    event = dict(state)
+                else:
+                    changes = {key: value for key, value in state.items() if self.state.get(key) != value}
+                    event = make_event(state, changes)
+                self.version, self.state = version, state
+                return event
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise queue.Empty
+            with self.store.changed:
+                self.store.changed.wait(min(POLL_INTERVAL, remaining))
+
+
+class SQLiteStateStore(StateStore):
+    """
+    Processing state store backed by a SQLite table in WAL mode.
+    Every worker process opens the same file, so a poll that lands on another worker
+    sees the state written by the worker running the pipeline.
+    Updates are made by the pipeline on the shared asyncio loop, so they never wait for the
+    SQLite write lock: update() merges the change into the pending state of the chat, queues
+    it and returns. A writer thread commits the queued changes in batches, one transaction
+    per batch. Reads in this process see pending states (read-your-writes), other processes
+    see them once the batch is committed.
+    Attributes:
+        db_path (str): SQLite file holding the processing_states table.
+        max_entries (int): Maximum number of states kept.
+        ttl (float): Seconds a completed state is kept after its last update.
+    Methods:
+        flush(timeout=None):
+            Waits until every queued change is committed. Returns False on timeout.
+    """
+
+    def __init__(self, db_path, max_entries=1000, ttl=600):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.local = threading.local()
+        self.changed = threading.Condition()
+        self.last_sweep = 0.0
+        self.lock = threading.Lock()
+        self.pending = {}  # chat_id -> [updated_at, state, queued writes]
+        self.writes = queue.Queue()
+        self.writer = None
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS processing_states ("
+            "chat_id TEXT PRIMARY KEY, state TEXT NOT NULL, version INTEGER NOT NULL, "
+            "completed INTEGER NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_processing_states_updated_at ON processing_states (updated_at)"
+        )
+
+    def _connect(self):
+        # One connection per thread, in autocommit mode with explicit transactions
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def _read(self, chat_id):
+        row = self._connect().execute(
+            "SELECT version, state, completed, updated_at FROM processing_states WHERE chat_id = ?",
+            (chat_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        version, state, completed, updated_at = row
+        if completed and time.time() - updated_at > self.ttl:
+            return None
+        return version, json.loads(state)
+
+    def _get_pending(self, chat_id):
+        # Must be called with self.lock held
+        entry = self.pending.get(chat_id)
+        if entry is None:
+            return None
+        updated_at, state, _ = entry
+        if state["completed"] and time.time() - updated_at > self.ttl:
+            return None
+        return state
+
+    def _queue(self, chat_id, kwargs=None):
+        with self.lock:
+            if kwargs is None:
+                base = None
+            elif chat_id in self.pending:
+                base = self._get_pending(chat_id)
+            else:
+                # WAL readers never wait for the writer
+                row = self._read(chat_id)
+                base = row[1] if row is not None else None
+            state = {**(base or new_processing_state()), **(kwargs or {})}
+            queued = self.pending[chat_id][2] if chat_id in self.pending else 0
+            now = time.time()
+            self.pending[chat_id] = [now, state, queued + 1]
+            self.writes.put((chat_id, kwargs, now))
+            if self.writer is None:
+                self.writer = threading.Thread(target=self._run_writer, daemon=True)
+                self.writer.start()
+        return dict(state)
+
+    def _run_writer(self):
+        while True:
+            batch = [self.writes.get()]
+            while True:
+                try:
+                    batch.append(self.writes.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                print(f"[STATE][ERROR] Could not write {len(batch)} processing state updates: {e}")
+            with self.lock:
+                for chat_id, _, _ in batch:
+                    entry = self.pending.get(chat_id)
+                    if entry is not None:
+                        entry[2] -= 1
+                        if entry[2] <= 0:
+                            del self.pending[chat_id]
+            with self.changed:
+                self.changed.notify_all()
+            for _ in batch:
+                self.writes.task_done()
+
+    def _write_batch(self, batch):
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Rows keep the time of their update, not of the batch, so eviction order is kept
+            for chat_id, kwargs, updated_at in batch:
+                row = conn.execute(
+                    "SELECT version, state, completed, updated_at FROM processing_states WHERE chat_id = ?",
+                    (chat_id,),
+                ).fetchone()
+                version = row[0] if row else 0
+                expired = row is not None and row[2] and updated_at - row[3] > self.ttl
+                if kwargs is None or row is None or expired:
+                    state = new_processing_state()
+                else:
+                    state = json.loads(row[1])
+                state.update(kwargs or {})
+                conn.execute(
+                    "INSERT OR REPLACE INTO processing_states (chat_id, state, version, completed, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (chat_id, json.dumps(state, ensure_ascii=False), version + 1, int(state["completed"]), updated_at),
+                )
+            if now - self.last_sweep >= SWEEP_INTERVAL:
+                self.last_sweep = now
+                conn.execute(
+                    "DELETE FROM processing_states WHERE completed = 1 AND updated_at < ?",
+                    (now - self.ttl,),
+                )
+                conn.execute(
+                    "DELETE FROM processing_states WHERE chat_id IN ("
+                    "SELECT chat_id FROM processing_states ORDER BY completed DESC, updated_at ASC "
+                    "LIMIT max(0, (SELECT count(*) FROM processing_states) - ?))",
+                    (self.max_entries,),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def flush(self, timeout=None):
+        deadline = time.monotonic() + (timeout if timeout is not None else float("inf"))
+        while self.writes.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            with self.changed:
+                self.changed.wait(min(POLL_INTERVAL, max(deadline - time.monotonic(), 0)))
+        return True
+
+    def init(self, chat_id):
+        return self._queue(chat_id)
+
+    def get(self, chat_id):
+        with self.lock:
+            if chat_id in self.pending:
+                state = self._get_pending(chat_id)
+                return dict(state) if state is not None else None
+        row = self._read(chat_id)
+        return row[1] if row is not None else None
+
+    def update(self, chat_id, **kwargs):
+        return self._queue(chat_id, kwargs)
+
+    def subscribe(self, chat_id):
+        return SQLiteSubscriber(self, chat_id)
+
+    def unsubscribe(self, chat_id, subscriber):
+        pass
+
+
+def create_state_store():
+    """
+    Create the processing state store selected by PROCESSING_STATE_BACKEND.
+    Raises:
+        ValueError: If the backend is unknown. Falling back to memory would silently break
+                    multi-process deployments that rely on the shared sqlite store.
+    """
+    backend = os.getenv("PROCESSING_STATE_BACKEND", "memory")
+    max_entries = int(os.getenv("PROCESSING_STATE_MAX_ENTRIES", "1000"))
+    ttl = float(os.getenv("PROCESSING_STATE_TTL", "600"))
+    if backend == "sqlite":
+        db_path = os.getenv("PROCESSING_STATE_DB", "processing_state.sqlite3")
+        return SQLiteStateStore(db_path, max_entries=max_entries, ttl=ttl)
+    if backend != "memory":
+        raise ValueError(f"Unknown processing state backend {backend!r}, expected 'memory' or 'sqlite'")
+    return MemoryStateStore(max_entries=max_entries, ttl=ttl)
+
+
+PROCESSING_STATE_STORE = create_state_store()
@@ -0,0 +1,120 @@
+import os
+import re
+import threading
+
+# ==================================================================================================#
+#                                          ⛔NOTE⛔                                                 #
+# Prompt templates are read from the prompts/ directory once and kept in memory.                    #
+# A template is reloaded as soon as its file changes on disk (mtime or size differ),                #
+# so prompts can still be edited without restarting the app.                                       #
+# ==================================================================================================#
+
+PROMPTS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "prompts",
+)
+# Placeholders look like {conv} or {search_history}; JSON examples in the prompts never match
+PLACEHOLDER_PATTERN = re.compile(r"\{([a-z_]+)\}")
+
+PROMPT_TEMPLATES = {}
+PROMPT_TEMPLATES_LOCK = threading.Lock()
+
+
+class PromptTemplate:
+    """
+    A prompt template split into literal text and placeholder names.
+    Attributes:
+        text (str): The raw template text.
+        version (tuple): The (mtime, size) of the file the template was read from.
+    Methods:
+        render(**values):
+            Substitutes all placeholders in a single pass. Placeholders without a value are kept
+            as they are, and substituted values are never scanned for placeholders again.
+        derive(key, transform):
+            Returns a template built from transform(text). It is computed once per loaded version.
+    """
+
+    def __init__(self, text, version=None):
+        self.text = text
+        self.version = version
+        # Even indexes are literal text, odd indexes are placeholder names
+        self.parts = PLACEHOLDER_PATTERN.split(text)
+        self.derived = {}
+
+    def render(self, **values):
+        rendered = []
+        for index, part in enumerate(self.parts):
+            if index % 2 == 0:
+                rendered.append(part)
+            elif part in values:
+                rendered.append(str(values[part]))
+            else:
+                rendered.append("{" + part + "}")
+        return "".join(rendered)
+
+    def derive(self, key, transform):
+        if key not in self.derived:
+            self.derived[key] = PromptTemplate(transform(self.text), self.version)
+        return self.derived[key]
+
+    def __repr__(self):
+        return f"<PromptTemplate {len(self.text)} chars>"
+
+
+def get_prompt_template(file_name):
+    """
+    Return the cached PromptTemplate for a file in the prompts directory.
+    The file is only read again when its mtime or size changed.
+    Returns None if the file cannot be read.
+    """
+    path = os.path.join(PROMPTS_DIR, file_name)
+    try:
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        with PROMPT_TEMPLATES_LOCK:
+            template = PROMPT_TEMPLATES.get(file_name)
+            if template is None or template.version != version:
+                with open(path, "r", encoding="utf-8") as f:
+                    template = PromptTemplate(f.read(), version)
+                PROMPT_TEMPLATES[file_name] = template
+            return template
+    except OSError as e:
+        print(f"[PROMPTS][ERROR] Error reading prompt template {file_name}: {e}")
+        return None
+
+
+def render_prompt(file_name, **values):
+    """Render a prompt template in a single pass. Returns None if it cannot be read."""
+    template = get_prompt_template(file_name)
+    if template is None:
+        return None
+    return template.render(**values)
+
+
+def strip_actor_placeholders(text):
+    """The actor prompt as shown to the critic: instructions only, without conversation or search."""
+    return PLACEHOLDER_PATTERN.sub(
+        lambda m: "" if m.group(1) in ("conv", "search", "num_matches") else m.group(0),
+        text,
+    ).strip()
+
+
+def strip_critic_search_block(text):
+    """The critic prompt used when no search results were shown to the actor."""
+    return text.replace("<last_search_output>\n{search_history}\n</last_search_output>", "")
+
+
+def to_pairwise_critic(text):
+    """The critic prompt with the evaluated output replaced by two outputs to compare."""
+    return text.replace(
+        "{last_response}",
+        "<output_1>\n{first_response}\n</output_1>\n\n<output_2>\n{second_response}\n</output_2>",
+    )
+
+
+def get_actor_instructions():
+    """Return the placeholder-free actor prompt, or a default if actor.md cannot be read."""
+    template = get_prompt_template("actor.md")
+    if template is None:
+        return "Default Actor Prompt"
+    return template.derive("instructions", strip_actor_placeholders).text
@@ -0,0 +1,140 @@
+import ast
+import json
+import re
+from datetime import datetime
+
+# ==================================================================================================#
+#                                          ⛔NOTE⛔                                                 #
+# Helpers for the preferences dictionary passed to search_func(...).                                #
+# Two preference dictionaries that only differ in key order, letter case, currency notation or     #
+# date format describe the same search and canonicalize to the same string.                        #
+# ==================================================================================================#
+
+CURRENCY_ALIASES = {
+    "$": "USD",
+    "us$": "USD",
+    "usd": "USD",
+    "dollar": "USD",
+    "dollars": "USD",
+    "€": "EUR",
+    "eur": "EUR",
+    "euro": "EUR",
+    "euros": "EUR",
+    "£": "GBP",
+    "gbp": "GBP",
+    "pound": "GBP",
+    "pounds": "GBP",
+    "₹": "INR",
+    "inr": "INR",
+    "rupee": "INR",
+    "rupees": "INR",
+    "rs": "INR",
+    "¥": "JPY",
+    "jpy": "JPY",
+    "yen": "JPY",
+}
+DATE_FORMATS = (
+    "%Y-%m-%d",
+    "%Y/%m/%d",
+    "%d-%m-%Y",
+    "%d/%m/%Y",
+    "%d.%m.%Y",
+    "%B %d, %Y",
+    "%b %d, %Y",
+    "%d %B %Y",
+    "%d %b %Y",
+)
+NUMBER_PATTERN = re.compile(r"^-?\d{1,3}(,\d{3})+(\.\d+)?$|^-?\d+(\.\d+)?$")
+
+
+def parse_preferences(text):
+    """
+    Parse the Python dictionary literal of a search_func(...) call.
+    Returns None if the text is not a dictionary literal.
+    """
+    try:
+        value = ast.literal_eval(text.strip())
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return None
+    return value if isinstance(value, dict) else None
+
+
+def normalize_value(value, key=""):
+    """Normalize one preference value. Keys hint at currencies and dates."""
+    if isinstance(value, dict):
+        return normalize_preferences(value)
+    if isinstance(value, (list, tuple, set)):
+        items = [normalize_value(item, key) for item in value]
+        items = [item for item in items if item not in (None, "", [], {})]
+        # Lists such as amenities are unordered
+        return sorted(items, key=lambda item: json.dumps(item, sort_keys=True))
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    text = " ".join(str(value).split())
+    if "currency" in key:
+        return CURRENCY_ALIASES.get(text.casefold(), text.upper())
+    if NUMBER_PATTERN.match(text):
+        return float(text.replace(",", ""))
+    if "date" in key or "check" in key:
+        for date_format in DATE_FORMATS:
+            try:
+                return datetime.strptime(text, date_format).strftime("%Y-%m-%d")
+            except ValueError:
+                continue
+    return text.casefold()
+
+
+def normalize_preferences(preferences):
+    """Normalize keys and values of a preferences dictionary and drop empty entries."""
+    normalized = {}
+    for key, value in preferences.items():
+        normalized_key = "_".join(str(key).casefold().split())
+        normalized_value = normalize_value(value, normalized_key)
+        if normalized_value in (None, "", [], {}):
+            continue
+        normalized[normalized_key] = normalized_value
+    return normalized
+
+
+def canonicalize_search_query(search_query):
+    """
+    Return the canonical form of the argument of a search_func(...) call.
+    Dictionary literals are normalized and serialized with sorted keys; anything
+    else falls back to the query with collapsed whitespace and case.
+    """
+    preferences = parse_preferences(search_query)
+    if preferences is None:
+        return " ".join(search_query.split()).casefold()
+    return json.dumps(normalize_preferences(preferences), sort_keys=True, ensure_ascii=False)
+
+
+def clean_preferences(preferences):
+    """Drop empty values (None, blank strings, empty lists and dicts) at every level."""
+    cleaned = {}
+    for key, value in preferences.items():
+        if isinstance(value, dict):
+            value = clean_preferences(value)
+        elif isinstance(value, (list, tuple)):
+            value = [item for item in value if item not in (None, "", [], {})]
+        elif isinstance(value, str):
+            value = value.strip()
+        if value in (None, "", [], {}):
+            continue
+        cleaned[key] = value
+    return cleaned
+
+
+def build_search_call(preferences):
+    """
+    Build the search call for the extracted preferences without a model round trip.
+    This is the mechanical transformation described in prompts/search_call.md:
+    any non-empty preference triggers <function> search_func(user_pref)</function>,
+    otherwise the result is NO_SEARCH_NEEDED.
+    """
+    cleaned = clean_preferences(preferences or {})
+    if not cleaned:
+        return "NO_SEARCH_NEEDED"
+    return f"<function> search_func({cleaned!r})</function>"
@@ -0,0 +1,98 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from models import db
+
+# ==================================================================================================#
+#                                          ⛔NOTE⛔                                                 #
+# Every background job of the chat blueprint is submitted to one of these pools instead of          #
+# starting its own threading.Thread (chat turns themselves run on the shared pipeline loop). Each   #
+# kind of job has its own pool so that slow critic backfills can never hold up the writes of        #
+# finished turns. Pool sizes can be tuned with environment variables.                               #
+# ==================================================================================================#
+
+WORKER_POOL_CONFIG = {
+    "critic": {
+        "max_workers": int(os.getenv("CRITIC_POOL_MAX_WORKERS", "4")),
+        "max_queue": int(os.getenv("CRITIC_POOL_MAX_QUEUE", "128")),
+    },
+    # Pipeline results are written by a single worker, SQLite only has one writer anyway
+    "db": {
+        "max_workers": int(os.getenv("DB_POOL_MAX_WORKERS", "1")),
+        "max_queue": int(os.getenv("DB_POOL_MAX_QUEUE", "256")),
+    },
+}
+# Seconds a caller waits for a queue slot before the submission is rejected
+SUBMIT_TIMEOUT = float(os.getenv("WORKER_SUBMIT_TIMEOUT", "5"))
+
+WORKER_POOLS = {}
+WORKER_POOLS_LOCK = threading.Lock()
+
+
+class WorkerPoolFull(RuntimeError):
+    """Raised when a pool has no free worker or queue slot within SUBMIT_TIMEOUT."""
+
+
+class BoundedExecutor:
+    """
+    A ThreadPoolExecutor with a bounded queue.
+    At most max_workers tasks run at once and at most max_queue more wait for a worker.
+    Every task runs inside the Flask app context and removes its scoped database session
+    when it finishes, so pooled threads never leak connections.
+    """
+
+    def __init__(self, kind, max_workers, max_queue):
+        self.kind = kind
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"{kind}-worker"
+        )
+        self.slots = threading.BoundedSemaphore(max_workers + max_queue)
+
+    def submit(self, app, fn, *args, **kwargs):
+        if not self.slots.acquire(timeout=SUBMIT_TIMEOUT):
+            raise WorkerPoolFull(f"The {self.kind} worker pool is full")
+
+        def run():
+            try:
+                with app.app_context():
+                    try:
+                        return fn(*args, **kwargs)
+                    finally:
+                        db.session.remove()
+            except Exception as e:
+                print(f"[WORKER][ERROR] {self.kind} task {fn.__name__} failed: {e}")
+            finally:
+                self.slots.release()
+
+        try:
+            return self.executor.submit(run)
+        except Exception:
+            self.slots.release()
+            raise
+
+
+def get_worker_pool(kind):
+    """Get or create the worker pool for the given kind of job."""
+    with WORKER_POOLS_LOCK:
+        if kind not in WORKER_POOLS:
+            config = WORKER_POOL_CONFIG[kind]
+            WORKER_POOLS[kind] = BoundedExecutor(
+                kind, config["max_workers"], config["max_queue"]
+            )
+        return WORKER_POOLS[kind]
+
+
+def submit_task(kind, fn, *args, **kwargs):
+    """
+    Submit fn(*args, **kwargs) to the worker pool of the given kind.
+    Must be called from within an app or request context.
+
+    Raises:
+        WorkerPoolFull: If the pool stays full for SUBMIT_TIMEOUT seconds.
+
+    Returns:
+        concurrent.futures.Future: The future of the submitted task.
+    """
+    app = current_app._get_current_object()
+    return get_worker_pool(kind).submit(app, fn, *args, **kwargs)
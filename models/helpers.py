@@ -1,16 +1,97 @@
 from .models import User, AssistantMessage, UserMessage, Simulation, Chat, Message
+import os
 from . import db
 from flask import Flask
+from sqlalchemy import event
+from .migrations import run_migrations
+
+# ==================================================================================================#
+#                                          ⛔NOTE⛔                                                 #
+# The database URI can be overridden with DATABASE_URI. For SQLite, every new connection gets the   #
+# profile below: WAL lets polling reads run while a background thread writes, busy_timeout makes    #
+# a writer wait for the lock instead of failing with "database is locked", and the cache/mmap/temp  #
+# settings keep hot pages in memory. Every value can be tuned with an environment variable.         #
+# ==================================================================================================#
+
+DEFAULT_DATABASE_URI = "sqlite:///db.sqlite3"
+SQLITE_SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+SQLITE_TEMP_STORE_LEVELS = ("DEFAULT", "FILE", "MEMORY")
+
+
+def get_sqlite_profile():
+    """Read the SQLite pragmas applied on connect from the environment."""
+    synchronous = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+    if synchronous not in SQLITE_SYNCHRONOUS_LEVELS:
+        print(f"[MODEL][ERROR] Invalid SQLITE_SYNCHRONOUS {synchronous}, using NORMAL")
+        synchronous = "NORMAL"
+    temp_store = os.getenv("SQLITE_TEMP_STORE", "MEMORY").upper()
+    if temp_store not in SQLITE_TEMP_STORE_LEVELS:
+        print(f"[MODEL][ERROR] Invalid SQLITE_TEMP_STORE {temp_store}, using MEMORY")
+        temp_store = "MEMORY"
+    return {
+        "journal_mode": "WAL",
+        "synchronous": synchronous,
+        "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "10000")),
+        "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # negative = KiB, i.e. 64 MiB
+        "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+        "temp_store": temp_store,
+    }
+
+
+def apply_sqlite_profile(engine, profile):
+    """Apply the pragmas of profile to every new connection of engine."""
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in profile.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def get_engine_options(uri):
+    """
+    Engine options for the configured database.
+    The SQLite pool is sized for the background worker pools plus the request threads,
+    so a worker never waits for a connection that another worker holds. Every configured
+    worker pool touches the database (critic backfill writes and turn results), the
+    pipeline loop itself never does.
+    """
+    if not uri.startswith("sqlite"):
+        return {"pool_pre_ping": True}
+
+    # Imported lazily, the blueprints import the models
+    from blueprints.chat.workers import WORKER_POOL_CONFIG
+
+    workers = sum(config["max_workers"] for config in WORKER_POOL_CONFIG.values())  # critic + db
+    request_threads = int(os.getenv("SQLITE_POOL_REQUEST_THREADS", "8"))
+    return {
+        "pool_size": int(os.getenv("SQLITE_POOL_SIZE", str(workers + request_threads))),
+        "max_overflow": int(os.getenv("SQLITE_POOL_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.getenv("SQLITE_POOL_TIMEOUT", "30")),
+        "connect_args": {
+            # Seconds the driver waits for a lock, kept in line with busy_timeout
+            "timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "10000")) / 1000,
+            "check_same_thread": False,
+        },
+    }
 
 
 def init_db(app: Flask):
 
-    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///db.sqlite3"
+    uri = os.getenv("DATABASE_URI", DEFAULT_DATABASE_URI)
+    app.config["SQLALCHEMY_DATABASE_URI"] = uri
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = get_engine_options(uri)
 
     db.init_app(app)
     with app.app_context():
+        if uri.startswith("sqlite"):
+            apply_sqlite_profile(db.engine, get_sqlite_profile())
         db.create_all()
+        run_migrations()
         if not User.query.all():
             # create 3 default users
             try:
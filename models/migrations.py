@@ -0,0 +1,164 @@
+from datetime import datetime
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from . import db
+
+# ==================================================================================================#
+#                                          ⛔NOTE⛔                                                 #
+# db.create_all() creates missing tables (with their indexes) but never alters existing ones.       #
+# Every schema change to an existing table is a numbered migration registered below. Applied        #
+# versions are recorded in the schema_migrations table and the pending migrations run once, in      #
+# order, in one transaction. On SQLite that transaction takes the write lock first, so worker       #
+# processes starting together apply them one after the other and the later ones find nothing to     #
+# do. Migrations must be idempotent, because on a fresh database create_all() has already built     #
+# the final schema before they run.                                                                 #
+# To change the schema: update the model, then append a migration with the next version number.     #
+# ==================================================================================================#
+
+MIGRATIONS = []
+
+
+def migration(version, name):
+    """Register fn(conn) as migration number version."""
+
+    def register(fn):
+        MIGRATIONS.append((version, name, fn))
+        return fn
+
+    return register
+
+
+def add_column(conn, table_name, column_name):
+    """
+    Add a model column to an existing table, unless it is already there.
+    Only nullable columns and columns with a server default can be added this way.
+    """
+    if column_name in get_column_names(conn, table_name):
+        return
+    column = db.metadata.tables[table_name].columns[column_name]
+    column_type = column.type.compile(dialect=conn.dialect)
+    ddl = f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}"
+    if column.server_default is not None:
+        ddl += f" NOT NULL DEFAULT {column.server_default.arg}"
+    try:
+        with conn.begin_nested():
+            conn.execute(text(ddl))
+    except DBAPIError:
+        # Databases without a migration lock: another process added it after the check
+        if column_name in get_column_names(conn, table_name):
+            return
+        raise
+    print(f"[MODEL][INFO] Added column {table_name}.{column_name}")
+
+
+def create_index(conn, table_name, index_name):
+    """Create an index declared on a model, unless it already exists."""
+    table = db.metadata.tables[table_name]
+    index = next(index for index in table.indexes if index.name == index_name)
+    try:
+        with conn.begin_nested():
+            index.create(conn, checkfirst=True)
+    except DBAPIError:
+        # Databases without a migration lock: another process created it after the check
+        if index_name in {ix["name"] for ix in inspect(conn).get_indexes(table_name)}:
+            return
+        raise
+
+
+def get_column_names(conn, table_name):
+    # A fresh inspector every time, inspectors cache what they have read
+    return {col["name"] for col in inspect(conn).get_columns(table_name)}
+
+
+@migration(1, "Add the preferences column to chats")
+def add_chat_preferences(conn):
+    add_column(conn, "chats", "preferences")
+
+
+@migration(2, "Add indexes for chat and message lookups")
+def add_lookup_indexes(conn):
+    create_index(conn, "chats", "ix_chats_user_id_timestamp")
+    create_index(conn, "messages", "ix_messages_chat_id_timestamp")
+    create_index(conn, "messages", "ix_messages_timestamp")
+    create_index(conn, "assistant_messages", "ix_assistant_messages_message_id_output_number")
+    create_index(conn, "user_messages", "ix_user_messages_message_id")
+
+
+@migration(3, "Add per-chat message sequence numbers")
+def add_message_seqs(conn):
+    add_column(conn, "chats", "seq")
+    add_column(conn, "messages", "seq")
+    add_column(conn, "messages", "updated_seq")
+    # Number existing messages in timestamp order, the id breaks ties (rowid is SQLite only)
+    conn.execute(
+        text(
+            "UPDATE messages SET seq = (SELECT numbered.position FROM ("
+            "SELECT id, ROW_NUMBER() OVER (PARTITION BY chat_id ORDER BY timestamp, id) AS position "
+            "FROM messages WHERE chat_id IS NOT NULL) AS numbered WHERE numbered.id = messages.id) "
+            "WHERE chat_id IS NOT NULL AND seq IS NULL"
+        )
+    )
+    conn.execute(text("UPDATE messages SET updated_seq = seq WHERE updated_seq IS NULL"))
+    conn.execute(
+        text(
+            "UPDATE chats SET seq = (SELECT COALESCE(MAX(seq), 0) FROM messages "
+            "WHERE messages.chat_id = chats.id)"
+        )
+    )
+    create_index(conn, "messages", "ix_messages_chat_id_seq")
+    create_index(conn, "messages", "ix_messages_chat_id_updated_seq")
+
+
+@migration(4, "Add the chat version counter")
+def add_chat_version(conn):
+    add_column(conn, "chats", "version")
+
+
+@migration(5, "Key the extracted preferences on the message seq")
+def add_chat_preferences_seq(conn):
+    # 0 for existing chats: their next turn extracts preferences from the whole conversation
+    add_column(conn, "chats", "preferences_seq")
+
+
+def lock_for_migrations(conn):
+    """
+    Start the migration transaction. On SQLite it takes the write lock right away
+    (BEGIN IMMEDIATE), so a second process waits here, up to the busy timeout, until
+    the first one has committed.
+    """
+    if conn.dialect.name == "sqlite":
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def run_migrations():
+    """Apply every migration that is not recorded in schema_migrations yet."""
+    applied_now = []
+    try:
+        with db.engine.connect() as conn:
+            lock_for_migrations(conn)
+            conn.execute(
+                text(
+                    "CREATE TABLE IF NOT EXISTS schema_migrations "
+                    "(version INTEGER PRIMARY KEY, name TEXT NOT NULL, applied_at DATETIME NOT NULL)"
+                )
+            )
+            # Read under the lock: everything another process applied is visible now
+            applied = set(conn.execute(text("SELECT version FROM schema_migrations")).scalars())
+            for version, name, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+                if version in applied:
+                    continue
+                fn(conn)
+                conn.execute(
+                    text(
+                        "INSERT INTO schema_migrations (version, name, applied_at) "
+                        "VALUES (:version, :name, :applied_at)"
+                    ),
+                    {"version": version, "name": name, "applied_at": datetime.utcnow()},
+                )
+                applied_now.append((version, name))
+            conn.commit()
+    except IntegrityError:
+        # Databases without a migration lock: another worker process applied them at the same time
+        return
+    for version, name in applied_now:
+        print(f"[MODEL][INFO] Applied migration {version}: {name}")
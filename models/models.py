@@ -1,9 +1,11 @@
 from . import db
-import threading
-from flask import current_app
 from simulation.critic import get_score
+from sqlalchemy import case, event, select, true, update
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm.attributes import set_committed_value
 import uuid
 import json
+import threading
 
 # ==============================================================================================#
 #                                           ⛔NOTE⛔                                            #
@@ -25,65 +27,131 @@ def generate_short_uuid():
 
     return uuid.uuid4().int.to_bytes(16, "big").hex()[:16]
 
-def run_update_critic_score(app, assistant_msg_id, conversation_history, search_history):
+# Contents of outputs that are not an answer (placeholders of a turn in flight, failed turns):
+# the critic backfill never scores them
+UNSCORED_CONTENT_PREFIXES = ("[Processing", "[Error", "[No response generated]")
+
+
+def critic_json_from_score(score, error=None):
+    """Format a critic score as the JSON stored in AssistantMessage.critic_score."""
+    if error is None and isinstance(score, (int, float)) and score >= 0:
+        return json.dumps({
+            "total_score": score,
+            "summary": f"Automatically generated score: {score}"
+        })
+    return json.dumps({
+        "total_score": 5.0,  # Default middle score
+        "summary": f"Error generating score: {error}" if error else "Could not generate a valid critic score"
+    })
+
+
+class CriticBackfill:
     """
-    Update the critic score for an assistant message.
-    This function computes a new critic score using the provided conversation
-    and search history, retrieves the specified assistant message from the database,
-    and updates its critic score. The function operates within the Flask
-    application context to ensure proper access to the application's resources.
-    Parameters:
-        app (Flask): The Flask application instance containing the application context
-                     and the database session.
-        assistant_msg_id (int): Unique identifier for the AssistantMessage to be updated.
-        conversation_history (Any): Data representing the conversation history, used in scoring.
-        search_history (Any): Data representing the search history, also used in scoring.
-    Raises:
-        Exception: If the database commit fails, the exception is caught, the transaction is
-                   rolled back, and an error message is printed.
-    Returns:
-        None: This function performs an in-place update of the AssistantMessage record.
+    One critic backfill run of a chat.
+    Every claimed assistant message is scored by its own task on the bounded critic worker pool.
+    The task that delivers the last score writes all scores back in a single transaction, so a
+    backfill of N messages costs N critic calls but only one database write.
+    Attributes:
+        chat_id (str): The chat being backfilled.
+        remaining (int): Number of scores still expected.
+        scores (dict): AssistantMessage id -> critic_score JSON collected so far.
+    Methods:
+        score(assistant_msg_id, conversation_history, search_history, search_record=None):
+            Scores one message. Runs on the critic worker pool.
+        score_pair(first_id, second_id, conversation_history, first_response, second_response, search_record=None):
+            Scores both outputs of a message in one pairwise critic call. Runs on the critic worker pool.
+        cancel(assistant_msg_ids):
+            Gives up on messages that could not be scheduled; they are unclaimed by the final write.
+        write():
+            Stores every collected score and unclaims all messages in one commit, or only unclaims them if that fails.
+        release(scores):
+            Stores the scores of messages that still have none and unclaims every message of the backfill.
     """
 
-    print(f"[MODEL] Updating critic score for AssistantMessage {assistant_msg_id}")
-    with app.app_context():
+    def __init__(self, chat_id, assistant_msg_ids):
+        self.chat_id = chat_id
+        self.remaining = len(assistant_msg_ids)
+        self.scores = {}
+        self.cancelled = set()
+        self.lock = threading.Lock()
+
+    def _done(self, count=1):
+        with self.lock:
+            self.remaining -= count
+            return self.remaining == 0
+
+    def score(self, assistant_msg_id, conversation_history, search_history, search_record=None):
+        print(f"[MODEL] Updating critic score for AssistantMessage {assistant_msg_id}")
         try:
-            from simulation.critic import get_score
-            score = get_score(conversation_history, search_history)
-            
-            assistant_msg = db.session.get(AssistantMessage, assistant_msg_id)
-            if assistant_msg:
-                if isinstance(score, (int, float)) and score >= 0:
-                    # Format as a simple critic score object for backward compatibility
-                    critic_json = {
-                        "total_score": score,
-                        "summary": f"Automatically generated score: {score}"
-                    }
-                    assistant_msg.critic_score = json.dumps(critic_json)
-                else:
-                    # Score is -1 or otherwise invalid
-                    assistant_msg.critic_score = json.dumps({
-                        "total_score": 5.0,  # Default middle score
-                        "summary": "Could not generate a valid critic score"
-                    })
-                    
-                assistant_msg.is_updating = False
-                db.session.commit()
+            critic_score = critic_json_from_score(
+                get_score(conversation_history, search_history, search_record=search_record)
+            )
+        except Exception as e:
+            print(f"[MODEL][ERROR] Failed to compute critic score: {e}")
+            critic_score = critic_json_from_score(None, str(e))
+        with self.lock:
+            self.scores[assistant_msg_id] = critic_score
+        if self._done():
+            self.write()
+
+    def score_pair(self, first_id, second_id, conversation_history, first_response, second_response, search_record=None):
+        print(f"[MODEL] Updating critic scores for AssistantMessages {first_id} and {second_id}")
+        from blueprints.chat.llm_processing import critique_pair_sync
+
+        try:
+            if isinstance(search_record, str):
+                search_record = json.loads(search_record)
+            critiques = critique_pair_sync(conversation_history, first_response, second_response, search_record)
+            critic_scores = [json.dumps(critique, ensure_ascii=False) for critique in critiques]
+        except Exception as e:
+            print(f"[MODEL][ERROR] Failed to compute pairwise critic scores: {e}")
+            critic_scores = [critic_json_from_score(None, str(e))] * 2
+        with self.lock:
+            self.scores[first_id], self.scores[second_id] = critic_scores
+        if self._done(2):
+            self.write()
+
+    def cancel(self, assistant_msg_ids):
+        with self.lock:
+            self.cancelled.update(assistant_msg_ids)
+        if assistant_msg_ids and self._done(len(assistant_msg_ids)):
+            self.write()
+
+    def write(self):
+        try:
+            self.release(self.scores)
+            print(f"[MODEL] Stored {len(self.scores)} critic scores for chat {self.chat_id}")
         except Exception as e:
             db.session.rollback()
-            print(f"[MODEL][ERROR] Failed to update critic score: {e}")
+            print(f"[MODEL][ERROR] Failed to store critic scores: {e}")
             try:
-                # One more attempt with default values
-                assistant_msg = db.session.get(AssistantMessage, assistant_msg_id)
-                if assistant_msg:
-                    assistant_msg.critic_score = json.dumps({
-                        "total_score": 5.0,
-                        "summary": f"Error generating score: {str(e)}"
-                    })
-                    assistant_msg.is_updating = False
-                    db.session.commit()
-            except:
-                pass
+                # Unclaim the messages so that a later backfill retries them
+                self.release({})
+            except Exception:
+                db.session.rollback()
+
+    def release(self, scores):
+        """
+        Store the given scores and unclaim every message of this backfill in one statement.
+        A score is only stored where critic_score is still empty, so a score written by the
+        pipeline in the meantime is never replaced by a backfilled one.
+        """
+        ids = list(self.scores) + list(self.cancelled)
+        assistant_table = AssistantMessage.__table__
+        values = {"is_updating": False}
+        if scores:
+            values["critic_score"] = db.func.coalesce(
+                assistant_table.c.critic_score,
+                case(scores, value=assistant_table.c.id),
+            )
+        message_ids = db.session.execute(
+            update(assistant_table)
+            .where(assistant_table.c.id.in_(ids))
+            .values(**values)
+            .returning(assistant_table.c.message_id)
+        ).scalars().all()
+        touch_messages(db.session.connection(), self.chat_id, message_ids)
+        db.session.commit()
 
 class User(db.Model):
     """
@@ -172,35 +240,55 @@ class Chat(db.Model):
         messages (List[Message]): Relationship of Message objects associated with this chat.
         allow_second_assistant (bool): Flag indicating if the chat permits a second assistant output.
         timestamp (datetime): Timestamp indicating when the chat was created.
+        preferences (str): JSON string of the hotel preferences extracted by the NER stage so far.
+        preferences_seq (int): Seq of the message whose turn extracted those preferences. They cover every
+                               earlier message and the user message of that one, 0 if there are none.
+        seq (int): Last sequence number handed out in this chat. It grows by one for every message
+                   created and for every write to a message, its user message or its assistant messages.
+        version (int): Grows on every flush that writes the chat or any of its messages. Used as the ETag
+                       of the chat and of the session list.
 
     Methods:
-        get_messages():
-            Returns the messages associated with the chat sorted by their timestamp.
+        get_messages(since=None):
+            Returns the messages associated with the chat in sequence order. The messages and
+            their user and assistant messages are loaded in a single query. With since, only the
+            messages created or changed after that sequence number are returned.
 
-        get_critic_scores():
-            Iterates through the chat's messages, collecting and returning all critic scores.
+        get_score_summary(since=None):
+            Returns the critic scores of the chat (only those changed after since, if given) together
+            with the number of outputs still waiting for a score, in a single query.
 
-        get_conversation_history():
+        get_conversation_history(messages=None):
             Constructs and returns a list representing the conversation history.
             Includes user messages and their corresponding preferred assistant messages.
 
+        get_critic_contexts(messages):
+            Yields every assistant output with the conversation and search history it was generated from.
+
         update_missing_critic_scores():
-            Identifies assistant messages lacking a critic score and not already in an updating state.
-            Initiates an asynchronous update for each missing critic score, using the current conversation
-            history and search history for context.
+            Claims assistant messages lacking a critic score and not already in an updating state, and
+            schedules one batched, concurrency-limited backfill that scores each of them against its own
+            history prefix.
 
         jsonify():
             Serializes the chat object into a JSON-friendly dictionary format,
             including the chat's id, user_id, second assistant flag, and serialized messages.
 
-        dump():
+        dump(since=None):
             Provides a detailed dictionary representation of the chat,
-            including messages ordered by their timestamp.
+            including messages in sequence order (only those changed after since, if given)
+            and the current seq to pass as since next time.
 
         is_empty():
             Checks whether the chat contains any messages.
 
-        get_search_history():
+        summary():
+            Returns the fields shown in the session list, without loading any message.
+
+        get_preferences():
+            Returns the stored preferences as a dictionary (empty if none were extracted yet).
+
+        get_search_history(messages=None):
             Retrieves up to the last 10 messages that have a corresponding search output in their preferred assistant message,
             returning a dictionary mapping message IDs to their search outputs.
 
@@ -211,6 +299,10 @@ class Chat(db.Model):
     """
 
     __tablename__ = "chats"
+    __table_args__ = (
+        # "Last chat of a user" and the sessions list
+        db.Index("ix_chats_user_id_timestamp", "user_id", "timestamp"),
+    )
     id = db.Column(
         db.String(16),
         primary_key=True,
@@ -225,28 +317,87 @@ class Chat(db.Model):
     allow_second_assistant = db.Column(db.Boolean, default=False, nullable=False)
     timestamp = db.Column(db.DateTime, nullable=False, default=db.func.now())
 
-    def get_messages(self):
-        return sorted(self.messages, key=lambda x: x.timestamp)
+    # Preferences extracted so far, so that the NER stage only has to look at new messages.
+    preferences = db.Column(db.Text, nullable=True)  # Store as JSON string
+    preferences_seq = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # Maintained by assign_message_seqs, never set them by hand
+    seq = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    def get_messages(self, since=None):
+        # ORDER BY in SQL and LEFT JOINs for the one-to-one children: one statement per history
+        query = Message.query.filter_by(chat_id=self.id)
+        if since is not None:
+            query = query.filter(Message.updated_seq > since)
+        return (
+            query.options(
+                joinedload(Message.user_message),
+                joinedload(Message.assistant_message),
+                joinedload(Message.assistant_message2),
+            )
+            .order_by(Message.seq, Message.timestamp)
+            .all()
+        )
 
-    def get_critic_scores(self):
-        critic_scores = []
-        for msg in self.get_messages():
-            critic_scores.extend(msg.get_critic_score())
-        return critic_scores
+    def get_preferences(self):
+        if not self.preferences:
+            return {}
+        try:
+            return json.loads(self.preferences)
+        except (TypeError, ValueError):
+            return {}
 
-    def get_conversation_history(self):
+    def get_score_summary(self, since=None):
+        """
+        Summarize the critic scores of this chat in a single query over its assistant messages,
+        without loading the messages or their contents.
+        Parameters:
+            since (int, optional): Only return the scores of messages created or changed after this
+                                   sequence number. The counters always cover the whole chat.
+        Returns:
+            dict: scores ([{"id", "critic_score"}] of the scored outputs), pending (outputs without a
+                  score), updating (outputs being scored right now) and seq (to pass as since next time).
+        """
+
+        changed = Message.updated_seq > since if since is not None else true()
+        rows = db.session.execute(
+            select(
+                AssistantMessage.id,
+                AssistantMessage.is_updating,
+                case((changed, AssistantMessage.critic_score)),
+                AssistantMessage.critic_score.is_(None),
+            )
+            .join(Message, AssistantMessage.message_id == Message.id)
+            .where(Message.chat_id == self.id)
+            .order_by(Message.seq, AssistantMessage.output_number)
+        ).all()
+        return {
+            "scores": [
+                {"id": assistant_msg_id, "critic_score": critic_score}
+                for assistant_msg_id, _, critic_score, _ in rows
+                if critic_score is not None
+            ],
+            "pending": sum(1 for row in rows if row[3]),
+            "updating": sum(1 for row in rows if row[3] and row[1]),
+            "seq": self.seq or 0,
+        }
+
+    def get_conversation_history(self, messages=None):
         """
         Retrieve the conversation history for the current object.
         This method gathers a list of JSON-formatted messages from the conversation history.
-        It iterates through all messages returned by self.get_messages(). For each message:
+        It iterates through messages, or all messages returned by self.get_messages() if none are
+        given, so that callers that need several views of the history load it only once. For each message:
           - If a user message is present, its JSON representation (using jsonify()) is added.
           - If an assistant message (determined by get_preferred_assistant_message()) is available, its JSON representation is also added.
         Returns:
             list: A list of JSON-formatted messages representing the conversation history.
         """
 
+        if messages is None:
+            messages = self.get_messages()
         conversation_history = []
-        for msg in self.get_messages():
+        for msg in messages:
             if msg.user_message:
                 conversation_history.append(msg.user_message.jsonify())
             preferred = msg.get_preferred_assistant_message()
@@ -254,75 +405,146 @@ class Chat(db.Model):
                 conversation_history.append(preferred.jsonify())
         return conversation_history
 
+    def get_critic_contexts(self, messages):
+        """
+        Yield (assistant_message, conversation_history, search_history) for every assistant output.
+        conversation_history is the history as it was when that output was generated (the earlier
+        turns with their preferred outputs, then the user message) followed by the output itself,
+        and search_history covers the same window as get_search_history. The histories are built in
+        a single pass over messages.
+        """
+        conversation_history = []
+        searches = []  # (message id, search output of the preferred output or None)
+        for msg in messages:
+            if msg.user_message:
+                conversation_history.append(msg.user_message.jsonify())
+            for assistant_msg in (msg.assistant_message, msg.assistant_message2):
+                if assistant_msg is None:
+                    continue
+                window = (searches + [(msg.id, assistant_msg.search_output)])[-10:]
+                search_history = {
+                    message_id: search_output
+                    for message_id, search_output in window
+                    if search_output
+                }
+                yield assistant_msg, conversation_history + [assistant_msg.jsonify()], search_history
+            preferred = msg.get_preferred_assistant_message()
+            if preferred:
+                conversation_history.append(preferred.jsonify())
+            searches.append((msg.id, preferred.search_output if preferred else None))
+
     def update_missing_critic_scores(self):
         """
-        Update missing critic scores for assistant messages in the current chat.
-        This method queries the database for assistant messages associated with the current chat
-        (i.e., messages with Message.chat_id equal to self.id) that have:
-            - A missing critic_score (i.e., is None)
-            - Not currently being updated (i.e., is_updating is False)
-        If any such messages are found, the method retrieves the full conversation history and search history,
-        marks each selected assistant message as updating, and launches a new thread to compute the critic
-        score via the function run_update_critic_score. This asynchronous handling ensures that
-        the potentially long-running update process does not block the main thread.
+        Schedule a critic backfill for the assistant messages of this chat that have no score.
+        Assistant messages with a missing critic_score that are not already being updated are
+        claimed with a single UPDATE ... RETURNING, so concurrent calls (from any thread or worker
+        process) never queue the same message twice. Outputs of a turn still in flight are created
+        with is_updating set and are never claimed, nor are placeholders and errors
+        (UNSCORED_CONTENT_PREFIXES). Each claimed message is scored against the
+        conversation up to that message on the bounded critic worker pool, and all scores are
+        written back together by a CriticBackfill. With CRITIC_MODE=pairwise, a message whose two
+        outputs are both claimed is scored with a single pairwise critic call.
         Returns:
-                None
+                int: Number of messages scheduled.
         """
 
-        # Query the assistant_messages table joined with Message.
-        missing_scores = (
-            db.session.query(AssistantMessage)
-            .join(Message)
-            .filter(
-                Message.chat_id == self.id,
-                # Message.preferred_assistant == AssistantMessage.output_number,
-                AssistantMessage.critic_score.is_(None),
-                AssistantMessage.is_updating.is_(False),
+        messages = self.get_messages()
+        contexts = {
+            assistant_msg.id: (conversation_history, search_history, assistant_msg.search_output)
+            for assistant_msg, conversation_history, search_history in self.get_critic_contexts(messages)
+            if assistant_msg.critic_score is None
+            and not assistant_msg.is_updating
+            and not (assistant_msg.content or "").startswith(UNSCORED_CONTENT_PREFIXES)
+        }
+        if not contexts:
+            return 0
+
+        assistant_table = AssistantMessage.__table__
+        claimed = db.session.execute(
+            update(assistant_table)
+            .where(
+                assistant_table.c.id.in_(contexts),
+                assistant_table.c.critic_score.is_(None),
+                assistant_table.c.is_updating.is_(False),
             )
-            .all()
-        )
-
-        if not missing_scores:
-            return
-        conversation_history = self.get_conversation_history()
-
-        for assistant_msg in missing_scores:
-            assistant_msg.mark_as_updating()
-            history_copy = conversation_history.copy()
-            search_history = self.get_search_history()
-            threading.Thread(
-                target=run_update_critic_score,
-                args=(
-                    current_app._get_current_object(),
-                    assistant_msg.id,
-                    history_copy,
-                    search_history,
-                ),
-            ).start()
+            .values(is_updating=True)
+            .returning(assistant_table.c.id, assistant_table.c.message_id)
+        ).all()
+        # is_updating is part of the dump: clients waiting on the chat's seq must see the claim
+        touch_messages(db.session.connection(), self.id, [message_id for _, message_id in claimed])
+        db.session.commit()
+        claimed = [assistant_msg_id for assistant_msg_id, _ in claimed]
+        if not claimed:
+            return 0
+
+        from blueprints.chat.workers import submit_task, WorkerPoolFull
+        from blueprints.chat.llm_processing import CRITIC_MODE
+
+        backfill = CriticBackfill(self.id, claimed)
+        tasks = []  # (claimed ids, task, arguments)
+        pending = list(claimed)
+        if CRITIC_MODE == "pairwise":
+            # Both outputs of a message are scored against each other in a single call
+            paired = set()
+            for msg in messages:
+                first, second = msg.assistant_message, msg.assistant_message2
+                if first and second and {first.id, second.id} <= set(claimed):
+                    conversation_history, _, search_record = contexts[first.id]
+                    tasks.append((
+                        [first.id, second.id],
+                        backfill.score_pair,
+                        (first.id, second.id, conversation_history[:-1], first.content, second.content, search_record),
+                    ))
+                    paired.update((first.id, second.id))
+            pending = [assistant_msg_id for assistant_msg_id in claimed if assistant_msg_id not in paired]
+        for assistant_msg_id in pending:
+            tasks.append(([assistant_msg_id], backfill.score, (assistant_msg_id, *contexts[assistant_msg_id])))
+
+        scheduled = 0
+        for index, (assistant_msg_ids, task, args) in enumerate(tasks):
+            try:
+                submit_task("critic", task, *args)
+            except WorkerPoolFull as e:
+                # The rest is unclaimed by the final write so a later call picks it up again
+                print(f"[MODEL][ERROR] Could not schedule critic score: {e}")
+                backfill.cancel([i for ids, _, _ in tasks[index:] for i in ids])
+                return scheduled
+            scheduled += len(assistant_msg_ids)
+        return scheduled
 
     def jsonify(self):
         return {
             "id": self.id,
             "user_id": self.user_id,
             "allow_second_assistant": self.allow_second_assistant,
-            "messages": [msg.jsonify() for msg in self.messages],
+            "messages": [msg.jsonify() for msg in self.get_messages()],
         }
 
-    def dump(self):
+    def dump(self, since=None):
         return {
             "id": self.id,
             "user_id": self.user_id,
             "allow_second_assistant": self.allow_second_assistant,
-            "messages": [msg.dump() for msg in self.get_messages()],
+            "seq": self.seq,
+            "since": since,
+            "messages": [msg.dump() for msg in self.get_messages(since)],
         }
 
     def is_empty(self):
-        return len(self.messages) == 0
+        return Message.query.filter_by(chat_id=self.id).first() is None
 
-    def get_search_history(self):
+    def summary(self):
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "timestamp": Message.process_timestamp(self.timestamp),
+            "allow_second_assistant": self.allow_second_assistant,
+        }
+
+    def get_search_history(self, messages=None):
         """
         Retrieves the search history from the most recent 10 messages.
-        This method iterates over the last 10 messages obtained from self.get_messages(),
+        This method iterates over the last 10 of messages (or of self.get_messages() if none are given),
         checks each for a preferred assistant message via get_preferred_assistant_message(), and if
         the preferred message exists and contains a valid search_output, it records the message
         ID alongside its search output.
@@ -330,8 +552,10 @@ class Chat(db.Model):
             dict: A dictionary mapping message IDs to their corresponding search outputs.
         """
 
+        if messages is None:
+            messages = self.get_messages()
         search_history = {}
-        for msg in self.get_messages()[-10:]:
+        for msg in messages[-10:]:
             preferred = msg.get_preferred_assistant_message()
             if preferred and preferred.search_output:
                 search_history[msg.id] = preferred.search_output
@@ -351,6 +575,8 @@ class Message(db.Model):
         simulation_id (str): Identifier for the related simulation (foreign key to "simulations.id"). Can be None.
         preferred_assistant (int): Indicates which assistant output is preferred. A value of 1 represents the primary assistant message,
                                    while 2 represents the secondary assistant message.
+        seq (int): Position of the message in its chat, assigned from Chat.seq when the message is created.
+        updated_seq (int): Chat.seq at the last write to the message or to one of its user/assistant messages.
     Relationships:
         assistant_message: The primary assistant message associated with this message (output_number == 1).
         assistant_message2: The secondary assistant message associated with this message (output_number == 2).
@@ -372,6 +598,12 @@ class Message(db.Model):
     """
 
     __tablename__ = "messages"
+    __table_args__ = (
+        # Messages of a chat in order; also serves lookups by chat_id alone
+        db.Index("ix_messages_chat_id_timestamp", "chat_id", "timestamp"),
+        db.Index("ix_messages_chat_id_seq", "chat_id", "seq"),
+        db.Index("ix_messages_chat_id_updated_seq", "chat_id", "updated_seq"),
+    )
     id = db.Column(
         db.String(16),
         primary_key=True,
@@ -380,7 +612,7 @@ class Message(db.Model):
         nullable=False,
     )
     chat_id = db.Column(db.String(16), db.ForeignKey("chats.id"), nullable=True)
-    timestamp = db.Column(db.DateTime, nullable=False, default=db.func.now())
+    timestamp = db.Column(db.DateTime, nullable=False, default=db.func.now(), index=True)
     simulation_id = db.Column(
         db.String(16), db.ForeignKey("simulations.id"), nullable=True
     )
@@ -406,6 +638,10 @@ class Message(db.Model):
     # Indicates which assistant output is preferred: 1 for primary, 2 for secondary.
     preferred_assistant = db.Column(db.Integer, nullable=False, default=1)
 
+    # Maintained by assign_message_seqs; None for messages that do not belong to a chat
+    seq = db.Column(db.Integer, nullable=True)
+    updated_seq = db.Column(db.Integer, nullable=True)
+
     def get_preferred_assistant_message(self):
         if self.preferred_assistant == 1:
             return self.assistant_message
@@ -433,6 +669,8 @@ class Message(db.Model):
             "timestamp": self.process_timestamp(self.timestamp),
             "simulation_id": self.simulation_id,
             "preferred_assistant": self.preferred_assistant,
+            "seq": self.seq,
+            "updated_seq": self.updated_seq,
             "assistant_message": (
                 self.assistant_message.dump() if self.assistant_message else None
             ),
@@ -496,6 +734,9 @@ class AssistantMessage(db.Model):
     """
 
     __tablename__ = "assistant_messages"
+    __table_args__ = (
+        db.Index("ix_assistant_messages_message_id_output_number", "message_id", "output_number"),
+    )
     id = db.Column(
         db.String(16),
         primary_key=True,
@@ -601,7 +842,9 @@ class UserMessage(db.Model):
         unique=True,
         nullable=False,
     )
-    message_id = db.Column(db.String(16), db.ForeignKey("messages.id"), nullable=False)
+    message_id = db.Column(
+        db.String(16), db.ForeignKey("messages.id"), nullable=False, index=True
+    )
     content = db.Column(db.Text, nullable=False)
     message = db.relationship("Message", back_populates="user_message", uselist=False)
 
@@ -618,3 +861,143 @@ class UserMessage(db.Model):
             "content": self.content,
             "role": "user",
         }
+
+
+def bump_chat_versions(session):
+    """Bump Chat.version of every chat whose own columns are written by this flush."""
+    for obj in session.dirty:
+        if isinstance(obj, Chat) and session.is_modified(obj, include_collections=False):
+            # A SQL expression, so concurrent bumps are never lost
+            obj.version = Chat.version + 1
+
+
+def reserve_chat_seqs(connection, chat_id, count, chat=None):
+    """
+    Take the next count sequence numbers of a chat and bump its version, in SQL.
+    The loaded Chat, if given and not being changed itself, is updated to match.
+    Returns:
+        int: The last reserved number; the first one is last - count + 1.
+    """
+    chats_table = Chat.__table__
+    connection.execute(
+        update(chats_table)
+        .where(chats_table.c.id == chat_id)
+        .values(seq=chats_table.c.seq + count, version=chats_table.c.version + 1)
+    )
+    last, version = connection.execute(
+        select(chats_table.c.seq, chats_table.c.version).where(chats_table.c.id == chat_id)
+    ).one()
+    if chat is not None and chat not in Session.object_session(chat).dirty:
+        set_committed_value(chat, "seq", last)
+        set_committed_value(chat, "version", version)
+    return last
+
+
+def mark_messages_updated(connection, message_ids, first_seq, loaded_messages=None):
+    """Give the messages consecutive updated_seq values starting at first_seq."""
+    messages_table = Message.__table__
+    loaded_messages = loaded_messages or {}
+    for next_seq, message_id in enumerate(message_ids, first_seq):
+        connection.execute(
+            update(messages_table)
+            .where(messages_table.c.id == message_id)
+            .values(updated_seq=next_seq)
+        )
+        if message_id in loaded_messages:
+            set_committed_value(loaded_messages[message_id], "updated_seq", next_seq)
+
+
+def touch_messages(connection, chat_id, message_ids):
+    """
+    Record a change made with a Core UPDATE, which the before_flush listener never sees:
+    the messages get new updated_seq values and the chat a new seq and version, so that
+    readers waiting on the chat's seq or comparing its ETag notice the change.
+    """
+    message_ids = list(dict.fromkeys(message_ids))
+    if not message_ids:
+        return
+    last = reserve_chat_seqs(connection, chat_id, len(message_ids))
+    mark_messages_updated(connection, message_ids, last - len(message_ids) + 1)
+
+
+# Notified after every commit of this process, see wait_for_chat_update in the chat blueprint
+CHAT_COMMITTED = threading.Condition()
+
+
+@event.listens_for(Session, "after_commit")
+def notify_chat_committed(session):
+    """Wake up the requests waiting for a chat to change."""
+    with CHAT_COMMITTED:
+        CHAT_COMMITTED.notify_all()
+
+
+@event.listens_for(Session, "before_flush")
+def assign_message_seqs(session, flush_context, instances):
+    """
+    Hand out per-chat sequence numbers for every flush that writes chat messages.
+
+    A new Message gets seq = updated_seq = the next number of its chat. A Message whose
+    columns changed, or whose user or assistant message was created or changed, gets a
+    new updated_seq. Chat.seq is incremented in SQL within the flush's transaction, so
+    concurrent writers (threads or processes) never hand out the same number twice.
+    Chat.version is incremented by the same statement.
+    """
+    bump_chat_versions(session)
+
+    new_messages = [
+        obj for obj in session.new if isinstance(obj, Message) and obj.chat_id
+    ]
+    new_message_ids = {msg.id for msg in new_messages}
+    changed_ids = set()
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Message):
+            if obj.id not in new_message_ids and session.is_modified(obj):
+                changed_ids.add(obj.id)
+        elif isinstance(obj, (UserMessage, AssistantMessage)):
+            if obj in session.new or session.is_modified(obj):
+                changed_ids.add(obj.message_id)
+    changed_ids -= new_message_ids
+    changed_ids.discard(None)
+    if not new_messages and not changed_ids:
+        return
+
+    connection = session.connection()
+    messages_table = Message.__table__
+
+    # Group the work by chat
+    by_chat = {}
+    for msg in new_messages:
+        by_chat.setdefault(msg.chat_id, ([], []))[0].append(msg)
+    if changed_ids:
+        rows = connection.execute(
+            select(messages_table.c.id, messages_table.c.chat_id).where(
+                messages_table.c.id.in_(changed_ids)
+            )
+        )
+        for message_id, chat_id in rows:
+            if chat_id:
+                by_chat.setdefault(chat_id, ([], []))[1].append(message_id)
+
+    pending_chats = {obj.id: obj for obj in session.new if isinstance(obj, Chat)}
+    loaded_chats = {
+        obj.id: obj for obj in session.identity_map.values() if isinstance(obj, Chat)
+    }
+    loaded_messages = {
+        obj.id: obj for obj in session.identity_map.values() if isinstance(obj, Message)
+    }
+    for chat_id, (created, changed) in by_chat.items():
+        count = len(created) + len(changed)
+        if chat_id in pending_chats:
+            # The chat is inserted by this very flush
+            chat = pending_chats[chat_id]
+            chat.seq = (chat.seq or 0) + count
+            chat.version = (chat.version or 0) + 1
+            last = chat.seq
+        else:
+            last = reserve_chat_seqs(connection, chat_id, count, loaded_chats.get(chat_id))
+
+        next_seq = last - count + 1
+        for msg in created:
+            msg.seq = msg.updated_seq = next_seq
+            next_seq += 1
+        mark_messages_updated(connection, changed, next_seq, loaded_messages)
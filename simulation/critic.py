@@ -1,4 +1,6 @@
+import os
 import json
+import time
 from openai import OpenAI
 from dotenv import load_dotenv
 from together import Together
@@ -6,23 +8,58 @@ import re
 
 load_dotenv()  # Load environment variables from .env file if present
 
+# Seconds before a critic request is abandoned, the same setting as the chat pipeline's clients
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "120"))
+# Low temperature for consistent evaluation, part of the critic cache key
+CRITIC_TEMPERATURE = 0.2
+
 # Initialize the Together client for DeepSeek
 try:
     with open("together.key", "r", encoding="utf-8") as f:
         together_key = f.read().strip()
-    together_client = Together(api_key=together_key)
+    together_client = Together(api_key=together_key, timeout=LLM_REQUEST_TIMEOUT)
 except Exception as e:
     print(f"[CRITIC] Error initializing Together client: {e}")
     together_client = None
 
 # Fallback to OpenAI client
 try:
-    client = OpenAI()
+    client = OpenAI(timeout=LLM_REQUEST_TIMEOUT)
 except Exception as e:
     print(f"[CRITIC] Error initializing OpenAI client: {e}")
     client = None
 
-def get_score(conversation_history: list, search_history: list = []) -> int:
+def score_from_critique(parsed_json: dict) -> float:
+    """
+    Extract the total score from a parsed critic JSON.
+    Falls back to the sum of the category scores if total_score is missing.
+    Returns -1.0 if no score can be found.
+    """
+    # Check for total_score directly
+    if "total_score" in parsed_json:
+        return parsed_json["total_score"]
+
+    # If no total_score, try to calculate from component scores
+    total = 0
+    if "adherence_to_search" in parsed_json and "score" in parsed_json["adherence_to_search"]:
+        total += float(parsed_json["adherence_to_search"]["score"])
+    if "question_format" in parsed_json and "score" in parsed_json["question_format"]:
+        total += float(parsed_json["question_format"]["score"]) 
+    if "conversational_quality" in parsed_json and "score" in parsed_json["conversational_quality"]:
+        total += float(parsed_json["conversational_quality"]["score"])
+    if "contextual_intelligence" in parsed_json and "score" in parsed_json["contextual_intelligence"]:
+        total += float(parsed_json["contextual_intelligence"]["score"])
+    if "overall_effectiveness" in parsed_json and "score" in parsed_json["overall_effectiveness"]:
+        total += float(parsed_json["overall_effectiveness"]["score"])
+
+    if total > 0:
+        return total
+
+    print("[CRITIC] JSON found but no scores detected")
+    return -1.0
+
+
+def get_score(conversation_history: list, search_history: list = [], search_record=None) -> int:
     """
     Calculate and return a rating based on the conversation and search histories.
     This function constructs a critic prompt by replacing placeholders with relevant data from the conversation history,
@@ -33,23 +70,39 @@ def get_score(conversation_history: list, search_history: list = []) -> int:
         conversation_history (list): List containing the conversation history. The final element is considered the
                                      last response, while the remaining elements form the conversation context.
         search_history (list, optional): Optional list of search-related inputs. Defaults to an empty list.
+        search_record (dict or str, optional): The search record of the last response. Together with the
+                                               histories it keys the critic cache, in a key space of its own:
+                                               this prompt is rendered differently from the chat pipeline's.
     Returns:
         int: The extracted rating if the process is successful. In case of an error during prompt preparation,
              API call, JSON decoding, or if the expected score data is missing, the function returns -1.0.
     """
 
-    # Open the file using the resolved absolute path
-    try:
-        with open("prompts/actor.md", "r") as file:
-            agent_prompt = file.read()
-    except FileNotFoundError:
+    # Templates come from the in-process prompt registry, which only re-reads changed files
+    from blueprints.chat.prompt_registry import get_prompt_template
+    from blueprints.chat.llm_cache import CRITIC_RESULT_CACHE, make_critic_cache_key
+
+    cache_key = make_critic_cache_key(
+        conversation_history[:-1],
+        conversation_history[-1],
+        search_record,
+        variant="simulation",
+        context={"search_history": search_history, "temperature": CRITIC_TEMPERATURE},
+    )
+    cached_critique = CRITIC_RESULT_CACHE.get(cache_key)
+    if cached_critique is not None:
+        print("[CRITIC] Using cached critique")
+        return score_from_critique(cached_critique)
+
+    agent_template = get_prompt_template("actor.md")
+    if agent_template is None:
         print("[CRITIC] Error: actor.md not found, using default prompt")
         agent_prompt = "Default Actor Prompt"
-        
-    try:
-        with open("prompts/critic.md", "r") as file:
-            critic_prompt = file.read()
-    except FileNotFoundError:
+    else:
+        agent_prompt = agent_template.text
+
+    critic_template = get_prompt_template("critic.md")
+    if critic_template is None:
         print("[CRITIC] Error: critic.md not found")
         return -1.0
 
@@ -59,11 +112,11 @@ def get_score(conversation_history: list, search_history: list = []) -> int:
     last_response = conversation_history[-1]
     conversation_history = conversation_history[:-1]
     try:
-        critic_prompt = (
-            critic_prompt.replace("{conversation}", str(conversation_history))
-            .replace("{original_prompt}", str(agent_prompt))
-            .replace("{search_history}", str(search_history))
-            .replace("{last_response}", str(last_response))
+        critic_prompt = critic_template.render(
+            conversation=str(conversation_history),
+            original_prompt=str(agent_prompt),
+            search_history=str(search_history),
+            last_response=str(last_response),
         )
         # dump the critic prompt to a file
         with open("logs/critic.md", "a") as file:
@@ -76,13 +129,14 @@ def get_score(conversation_history: list, search_history: list = []) -> int:
         return -1.0
 
     # Try to get response from DeepSeek via Together API
+    started = time.monotonic()
     response = None
     if together_client:
         try:
             completion = together_client.chat.completions.create(
                 model="deepseek-ai/DeepSeek-R1",
                 messages=[{"role": "user", "content": critic_prompt}],
-                temperature=0.2  # Low temperature for consistent evaluation
+                temperature=CRITIC_TEMPERATURE
             )
             response = completion.choices[0].message.content
             print(f"[CRITIC] Using Together DeepSeek-R1")
@@ -124,29 +178,10 @@ def get_score(conversation_history: list, search_history: list = []) -> int:
         if json_match:
             try:
                 parsed_json = json.loads(json_match.group(1))
-                
-                # Check for total_score directly
-                if "total_score" in parsed_json:
-                    return parsed_json["total_score"]
-                
-                # If no total_score, try to calculate from component scores
-                total = 0
-                if "adherence_to_search" in parsed_json and "score" in parsed_json["adherence_to_search"]:
-                    total += float(parsed_json["adherence_to_search"]["score"])
-                if "question_format" in parsed_json and "score" in parsed_json["question_format"]:
-                    total += float(parsed_json["question_format"]["score"]) 
-                if "conversational_quality" in parsed_json and "score" in parsed_json["conversational_quality"]:
-                    total += float(parsed_json["conversational_quality"]["score"])
-                if "contextual_intelligence" in parsed_json and "score" in parsed_json["contextual_intelligence"]:
-                    total += float(parsed_json["contextual_intelligence"]["score"])
-                if "overall_effectiveness" in parsed_json and "score" in parsed_json["overall_effectiveness"]:
-                    total += float(parsed_json["overall_effectiveness"]["score"])
-                
-                if total > 0:
-                    return total
-                    
-                print("[CRITIC] JSON found but no scores detected")
-                return -1.0
+                score = score_from_critique(parsed_json)
+                if score != -1.0:
+                    CRITIC_RESULT_CACHE.set(cache_key, parsed_json, time.monotonic() - started)
+                return score
                 
             except json.JSONDecodeError:
                 print("[CRITIC] Failed to parse JSON from match")
@@ -1,8 +1,9 @@
 // Global variable to keep track of the current chat ID.
 let currentChatId = null;
 
-// Track processing status
-let processingInterval = null;
+// Track processing status, keyed by message ID
+let processingStreams = {};
+let processingIntervals = {};
 let processingData = {};
 
 /**
@@ -453,25 +454,168 @@ function formatCriticResult(criticData) {
     return html;
 }
 
+/**
+ * Renders the processing state of a message into its bubble.
+ * Returns true once processing has completed or failed.
+ */
+function renderProcessingState(messageId, data, context) {
+    // Update processingData
+    processingData[messageId] = data;
+    
+    // Get the message element
+    const messageElement = document.querySelector(`[data-message-id='${messageId}']`);
+    if (!messageElement) {
+        console.warn(`Message element not found: ${messageId}`);
+        return false;
+    }
+    
+    // Get the message text element
+    const textSpan = messageElement.querySelector('.message-text');
+    if (!textSpan) return false;
+    
+    // If we haven't saved the original content yet and this isn't the initial processing message
+    if (context.originalContent === null && !textSpan.textContent.includes('[Processing')) {
+        context.originalContent = textSpan.textContent;
+    }
+    
+    // Create or update the processing status overlay
+    let processingOverlay = messageElement.querySelector('.processing-overlay');
+    
+    if (data.status === 'processing') {
+        // Show processing status as an overlay instead of replacing content
+        if (!processingOverlay) {
+            processingOverlay = document.createElement('div');
+            processingOverlay.className = 'processing-overlay absolute top-0 left-0 w-full bg-black bg-opacity-70 text-white p-2 rounded-t-lg z-10';
+            messageElement.appendChild(processingOverlay);
+            
+            // Make sure the message element has relative positioning for proper overlay
+            if (!messageElement.style.position) {
+                messageElement.style.position = 'relative';
+            }
+        }
+        
+        // Check if we're in the regeneration phase
+        const isRegenerating = data.step && (data.step.includes('regenerat') || data.step === 'evaluating_response');
+        
+        if (isRegenerating) {
+            processingOverlay.innerHTML = `
+                <div class="flex items-center justify-between">
+                    <span>${data.step}: ${data.progress}%</span>
+                    ${context.originalContent ? '<span class="text-xs">Original response preserved</span>' : ''}
+                </div>
+            `;
+            
+            // If we have original content and we're regenerating, make sure it's still shown
+            if (context.originalContent && textSpan.textContent.includes('[')) {
+                textSpan.textContent = context.originalContent;
+            }
+        } else {
+            processingOverlay.innerHTML = `<span>${data.step}: ${data.progress}%</span>`;
+            
+            // For initial processing, we can show the status in the message
+            if (!context.originalContent) {
+                textSpan.textContent = `[${data.step}: ${data.progress}%]`;
+            }
+        }
+        
+        // Update expandable sections with any data we have so far
+        // This ensures sections appear as soon as their data is available
+        updateAllExpandableSections(messageElement, data);
+        return false;
+    }
+    
+    // Remove the processing overlay if processing is complete
+    if (processingOverlay) {
+        processingOverlay.remove();
+    }
+    
+    if (!data.completed && data.status !== 'error') {
+        return false;
+    }
+    
+    // Handle error case
+    if (data.error) {
+        textSpan.textContent = `[Error: ${data.error}]`;
+        return true;
+    }
+    
+    // Handle regeneration case - show comparison UI
+    if (data.regenerated_response && data.final_response) {
+        // Create regeneration comparison UI
+        createRegenerationUI(messageElement, data, context.originalContent || data.final_response);
+    } 
+    // Handle normal completion without regeneration
+    else if (data.final_response) {
+        textSpan.textContent = data.final_response;
+        // Update all expandable sections
+        updateAllExpandableSections(messageElement, data);
+    }
+    
+    // Add critic score if available
+    updateCriticScore(messageElement, data);
+    return true;
+}
+
+/**
+ * Subscribes to processing updates for a message.
+ * Uses the Server-Sent Events stream and falls back to polling when it is unavailable.
+ */
+function startProcessingStream(messageId, outputNumber) {
+    if (!currentChatId) return;
+    
+    const chatIdForRequest = outputNumber === 2 ? `${currentChatId}_second` : currentChatId;
+    if (!window.EventSource) {
+        startProcessingPolling(messageId, chatIdForRequest);
+        return;
+    }
+    
+    // Close any stream still open for this message
+    if (processingStreams[messageId]) {
+        processingStreams[messageId].close();
+    }
+    
+    const context = { originalContent: null };
+    let state = {};
+    let finished = false;
+    const source = new EventSource(`/assistant/chat/processing/${chatIdForRequest}/stream`);
+    processingStreams[messageId] = source;
+    
+    source.onmessage = (event) => {
+        try {
+            // The first event is a full snapshot, the following ones are deltas
+            state = Object.assign({}, state, JSON.parse(event.data));
+            finished = renderProcessingState(messageId, state, context);
+        } catch (err) {
+            console.error('Error handling processing event:', err);
+        }
+        if (finished) {
+            source.close();
+            delete processingStreams[messageId];
+            watchCriticScores();
+        }
+    };
+    
+    source.onerror = () => {
+        if (finished || source.readyState !== EventSource.CLOSED) return;
+        // The stream could not be (re)established, fall back to polling
+        delete processingStreams[messageId];
+        startProcessingPolling(messageId, chatIdForRequest);
+    };
+}
+
 /**
  * Polls the server for processing status updates for a message.
  */
-// Modified startProcessingPolling to preserve all sections
-function startProcessingPolling(messageId, outputNumber) {
-    // Clear any existing interval
-    if (processingInterval) {
-        clearInterval(processingInterval);
+function startProcessingPolling(messageId, chatIdForRequest) {
+    // Clear any existing interval for this message
+    if (processingIntervals[messageId]) {
+        clearInterval(processingIntervals[messageId]);
     }
     
-    // Keep track of original content to prevent losing it during regeneration
-    let originalContent = null;
-    let isProcessingStatusShown = false;
+    const context = { originalContent: null };
     
     const pollingFunc = async () => {
-        if (!currentChatId) return;
-        
         try {
-            const chatIdForRequest = outputNumber === 2 ? `${currentChatId}_second` : currentChatId;
             const response = await fetch(`/assistant/chat/processing/${chatIdForRequest}`, {
                 method: 'GET',
                 headers: { 'Content-Type': 'application/json' }
@@ -484,101 +628,11 @@ function startProcessingPolling(messageId, outputNumber) {
             
             const data = await response.json();
             
-            // Update processingData
-            processingData[messageId] = data;
-            
-            // Get the message element
-            const messageElement = document.querySelector(`[data-message-id='${messageId}']`);
-            if (!messageElement) {
-                console.warn(`Message element not found: ${messageId}`);
-                return;
-            }
-            
-            // Get the message text element
-            const textSpan = messageElement.querySelector('.message-text');
-            if (!textSpan) return;
-            
-            // If we haven't saved the original content yet and this isn't the initial processing message
-            if (originalContent === null && !textSpan.textContent.includes('[Processing')) {
-                originalContent = textSpan.textContent;
-            }
-            
-            // Create or update the processing status overlay
-            let processingOverlay = messageElement.querySelector('.processing-overlay');
-            
-            if (data.status === 'processing') {
-                // Show processing status as an overlay instead of replacing content
-                if (!processingOverlay) {
-                    processingOverlay = document.createElement('div');
-                    processingOverlay.className = 'processing-overlay absolute top-0 left-0 w-full bg-black bg-opacity-70 text-white p-2 rounded-t-lg z-10';
-                    messageElement.appendChild(processingOverlay);
-                    
-                    // Make sure the message element has relative positioning for proper overlay
-                    if (!messageElement.style.position) {
-                        messageElement.style.position = 'relative';
-                    }
-                }
-                
-                // Check if we're in the regeneration phase
-                const isRegenerating = data.step && (data.step.includes('regenerat') || data.step === 'evaluating_response');
-                
-                if (isRegenerating) {
-                    processingOverlay.innerHTML = `
-                        <div class="flex items-center justify-between">
-                            <span>${data.step}: ${data.progress}%</span>
-                            ${originalContent ? '<span class="text-xs">Original response preserved</span>' : ''}
-                        </div>
-                    `;
-                    
-                    // If we have original content and we're regenerating, make sure it's still shown
-                    if (originalContent && textSpan.textContent.includes('[')) {
-                        textSpan.textContent = originalContent;
-                    }
-                } else {
-                    processingOverlay.innerHTML = `<span>${data.step}: ${data.progress}%</span>`;
-                    
-                    // For initial processing, we can show the status in the message
-                    if (!originalContent) {
-                        textSpan.textContent = `[${data.step}: ${data.progress}%]`;
-                        isProcessingStatusShown = true;
-                    }
-                }
-                
-                // Update expandable sections with any data we have so far
-                // This ensures sections appear as soon as their data is available
-                updateAllExpandableSections(messageElement, data);
-            } else {
-                // Remove the processing overlay if processing is complete
-                if (processingOverlay) {
-                    processingOverlay.remove();
-                }
-                
-                // If completed or error, stop polling and update the message
-                if (data.completed || data.status === 'error') {
-                    clearInterval(processingInterval);
-                    processingInterval = null;
-                    
-                    // Handle error case
-                    if (data.error) {
-                        textSpan.textContent = `[Error: ${data.error}]`;
-                        return;
-                    }
-                    
-                    // Handle regeneration case - show comparison UI
-                    if (data.regenerated_response && data.final_response) {
-                        // Create regeneration comparison UI
-                        createRegenerationUI(messageElement, data, originalContent || data.final_response);
-                    } 
-                    // Handle normal completion without regeneration
-                    else if (data.final_response) {
-                        textSpan.textContent = data.final_response;
-                        // Update all expandable sections
-                        updateAllExpandableSections(messageElement, data);
-                    }
-                    
-                    // Add critic score if available
-                    updateCriticScore(messageElement, data);
-                }
+            // If completed or error, stop polling
+            if (renderProcessingState(messageId, data, context)) {
+                clearInterval(processingIntervals[messageId]);
+                delete processingIntervals[messageId];
+                watchCriticScores();
             }
         } catch (err) {
             console.error('Error polling for processing status:', err);
@@ -587,7 +641,7 @@ function startProcessingPolling(messageId, outputNumber) {
     
     // Call immediately and then set interval
     pollingFunc();
-    processingInterval = setInterval(pollingFunc, 1000);
+    processingIntervals[messageId] = setInterval(pollingFunc, 1000);
 }
 
 
@@ -629,59 +683,100 @@ function addRegenerationStyles() {
 // Add the styles when the document loads
 document.addEventListener('DOMContentLoaded', addRegenerationStyles);
 /**
- * Polls the server every 5 seconds to update critic scores.
+ * Shows a critic score from the score endpoint on its message bubble.
  */
-async function pollCriticScores() {
-    if (!currentChatId) return;
+function applyCriticScore(scoreObj) {
+    // Update existing messages without modifying text
+    let existingMessage = document.querySelector(`[data-message-id='${scoreObj.id}']`);
+    if (!existingMessage) return;
+
+    let criticCircle = existingMessage.querySelector('.critic-score');
+    if (!criticCircle) {
+        criticCircle = document.createElement('div');
+        criticCircle.className = 'critic-score absolute top-0 right-0 mt-1 mr-1 text-xs text-white bg-red-500 rounded-full w-5 h-5 flex items-center justify-center';
+        existingMessage.appendChild(criticCircle);
+    }
 
+    // Parse critic score from the data
+    let criticScore = null;
     try {
-        const response = await fetch(`/assistant/chat/score/${currentChatId}`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' }
-        });
-        const data = await response.json();
+        if (scoreObj.critic_score) {
+            const criticData = typeof scoreObj.critic_score === 'string' 
+                ? JSON.parse(scoreObj.critic_score) 
+                : scoreObj.critic_score;
+                
+            criticScore = criticData.total_score;
+        }
+    } catch (e) {
+        console.error('Error parsing critic score:', e);
+    }
 
-        if (data.scores) {
-            data.scores.forEach(scoreObj => {
-                // Update existing messages without modifying text
-                let existingMessage = document.querySelector(`[data-message-id='${scoreObj.id}']`);
-                if (existingMessage) {
-                    let criticCircle = existingMessage.querySelector('.critic-score');
-                    if (!criticCircle) {
-                        criticCircle = document.createElement('div');
-                        criticCircle.className = 'critic-score absolute top-0 right-0 mt-1 mr-1 text-xs text-white bg-red-500 rounded-full w-5 h-5 flex items-center justify-center';
-                        existingMessage.appendChild(criticCircle);
-                    }
-                    
-                    // Parse critic score from the data
-                    let criticScore = null;
-                    try {
-                        if (scoreObj.critic_score) {
-                            const criticData = typeof scoreObj.critic_score === 'string' 
-                                ? JSON.parse(scoreObj.critic_score) 
-                                : scoreObj.critic_score;
-                                
-                            criticScore = criticData.total_score;
-                        }
-                    } catch (e) {
-                        console.error('Error parsing critic score:', e);
-                    }
-                    
-                    // Check if the score has changed
-                    if (criticScore !== null && criticCircle.textContent !== criticScore.toString()) {
-                        criticCircle.textContent = criticScore;
-
-                        // Force a DOM update by toggling opacity
-                        existingMessage.style.opacity = '0.99';
-                        setTimeout(() => {
-                            existingMessage.style.opacity = '1';
-                        }, 10);
-                    }
-                }
-            });
+    // Check if the score has changed
+    if (criticScore !== null && criticCircle.textContent !== criticScore.toString()) {
+        criticCircle.textContent = criticScore;
+
+        // Force a DOM update by toggling opacity
+        existingMessage.style.opacity = '0.99';
+        setTimeout(() => {
+            existingMessage.style.opacity = '1';
+        }, 10);
+    }
+}
+
+// Chat whose critic scores are being watched, and whether a turn finished meanwhile
+let criticScoreWatch = null;
+let criticScoreWatchAgain = false;
+// Chats whose critic backfill was requested by this page
+const criticBackfillRequested = new Set();
+// Pause before asking again when the server answered without waiting (SCORE_WAIT_MAX=0)
+const CRITIC_SCORE_RETRY_DELAY = 5000;
+
+/**
+ * Long-polls the critic scores of the current chat until no output is waiting for one.
+ * Called when a turn finishes processing. The first call for a chat also asks the server
+ * to score outputs left unscored earlier. The server answers as soon as a score is
+ * written (or after at most 25 seconds), so idle tabs send no requests at all.
+ */
+async function watchCriticScores() {
+    const chatId = currentChatId;
+    if (!chatId) return;
+    if (criticScoreWatch === chatId) {
+        criticScoreWatchAgain = true;
+        return;
+    }
+    criticScoreWatch = chatId;
+    criticScoreWatchAgain = false;
+
+    let since = 0;
+    try {
+        if (!criticBackfillRequested.has(chatId)) {
+            criticBackfillRequested.add(chatId);
+            await fetch(`/assistant/chat/score/${chatId}`, { method: 'POST' });
+        }
+        while (currentChatId === chatId) {
+            const started = Date.now();
+            const response = await fetch(`/assistant/chat/score/${chatId}?since=${since}&wait=25`);
+            if (!response.ok) {
+                console.error('Error fetching critic scores:', response.statusText);
+                break;
+            }
+            const data = await response.json();
+            (data.scores || []).forEach(applyCriticScore);
+
+            const changed = data.seq > since;
+            since = data.seq;
+            // Stop once every output is scored, or when nothing changed and nothing is being scored
+            if (!data.pending || (!changed && !data.updating)) {
+                if (!criticScoreWatchAgain) break;
+                criticScoreWatchAgain = false;
+            } else if (!changed && Date.now() - started < CRITIC_SCORE_RETRY_DELAY) {
+                await new Promise((resolve) => setTimeout(resolve, CRITIC_SCORE_RETRY_DELAY));
+            }
         }
     } catch (err) {
         console.error('Error fetching critic scores:', err);
+    } finally {
+        if (criticScoreWatch === chatId) criticScoreWatch = null;
     }
 }
 
@@ -764,8 +859,8 @@ async function sendToServer(userInput) {
                     data.assistant_message.output_number // might be 1
                 );
                 
-                // Start polling for processing status
-                startProcessingPolling(data.assistant_message.id, 1);
+                // Subscribe to processing status updates
+                startProcessingStream(data.assistant_message.id, 1);
             }
 
             // assistant_message2 (secondary)
@@ -780,8 +875,8 @@ async function sendToServer(userInput) {
                     data.assistant_message2.output_number // might be 2
                 );
                 
-                // Start polling for processing status for second assistant
-                startProcessingPolling(data.assistant_message2.id, 2);
+                // Subscribe to processing status updates for second assistant
+                startProcessingStream(data.assistant_message2.id, 2);
             }
         }, 1000);
 
@@ -894,9 +989,6 @@ secondAssistantToggle.addEventListener('change', (e) => {
     toggleSecondAssistant(e.target.checked);
 });
 
-// Start polling for critic scores every 5 seconds
-setInterval(pollCriticScores, 5000);
-
 document.addEventListener("DOMContentLoaded", startNewChat);
 updateChatIdDisplay();
 
@@ -55,14 +55,39 @@ function clearAllMessages() {
     messagesContainer.innerHTML = '';
 }
 
+// Messages of the chats opened in this page, so that reopening a chat only fetches what changed
+const chatHistoryCache = {};
+
+/**
+ * Fetches the messages of a chat, ordered by seq.
+ * A chat opened before is fetched with ?since=<seq>, which only returns the messages created or
+ * changed since then, and merged into the cached messages. The browser revalidates the response
+ * with its ETag, so an unchanged chat costs a 304.
+ * @param {string} chatId - The ID of the chat session.
+ * @returns {Promise<Object>} The chat dump with every message, or {error}.
+ */
+async function fetchChatMessages(chatId) {
+    const cached = chatHistoryCache[chatId];
+    const url = cached ? `/assistant/chat/${chatId}?since=${cached.seq}` : `/assistant/chat/${chatId}`;
+    const response = await fetch(url);
+    const data = await response.json();
+    if (data.error) {
+        return data;
+    }
+
+    const messages = cached ? cached.messages : new Map();
+    data.messages.forEach((msg) => messages.set(msg.id, msg));
+    chatHistoryCache[chatId] = { seq: data.seq, messages };
+    return { ...data, messages: [...messages.values()].sort((a, b) => a.seq - b.seq) };
+}
+
 /**
  * Fetches and loads chat history for a specific session.
  * @param {number} chatId - The ID of the chat session to load.
  */
 async function loadChatHistory(chatId) {
     try {
-        const response = await fetch(`/assistant/chat/${chatId}`);
-        const data = await response.json();
+        const data = await fetchChatMessages(chatId);
         console.log(data);
 
         if (data.error) {
@@ -85,20 +110,82 @@ async function loadChatHistory(chatId) {
                 addMessageToChat(msg.user_message.content, 'user');
             }
         });
+
+        // Score the outputs that were left without a critic score
+        fetch(`/assistant/chat/score/${chatId}`, { method: 'POST' }).catch((err) => {
+            console.error("Error scheduling critic scores:", err);
+        });
     } catch (err) {
         console.error("Error loading chat history:", err);
     }
 }
 
-// Attach click event listeners to session buttons
-document.addEventListener("DOMContentLoaded", () => {
-    const sessionButtons = document.querySelectorAll(".top-right-pannel .button");
-    sessionButtons.forEach((button) => {
-        button.addEventListener("click", () => {
-            const chatId = button.textContent.match(/\d+/)[0]; // Extract chat ID from button text
-            console.log("Loading chat history for session:", chatId);
-            
-            loadChatHistory(chatId);
+/**
+ * Creates the button of one chat session.
+ * @param {string} chatId - The ID of the chat session.
+ */
+function createSessionButton(chatId) {
+    const button = document.createElement('button');
+    button.className = 'button session-button';
+    button.dataset.chatId = chatId;
+    button.textContent = `Session ${chatId}`;
+    return button;
+}
+
+/**
+ * Fetches the next page of chat sessions and appends it before the "Load more" button.
+ * @param {HTMLElement} loadMoreButton - The button holding the cursor of the next page.
+ */
+async function loadMoreSessions(loadMoreButton) {
+    const panel = loadMoreButton.parentElement;
+    const params = new URLSearchParams({ cursor: loadMoreButton.dataset.nextCursor });
+    if (panel.dataset.scope === 'all') {
+        params.set('scope', 'all');
+    }
+
+    try {
+        loadMoreButton.disabled = true;
+        const response = await fetch(`/assistant/sessions/page?${params}`);
+        const data = await response.json();
+
+        if (data.error) {
+            console.error("Error fetching sessions:", data.error);
+            loadMoreButton.disabled = false;
+            return;
+        }
+
+        data.sessions.forEach((chatSession) => {
+            panel.insertBefore(createSessionButton(chatSession.id), loadMoreButton);
         });
+
+        if (data.next_cursor) {
+            loadMoreButton.dataset.nextCursor = data.next_cursor;
+            loadMoreButton.disabled = false;
+        } else {
+            loadMoreButton.remove();
+        }
+    } catch (err) {
+        console.error("Error loading sessions:", err);
+        loadMoreButton.disabled = false;
+    }
+}
+
+// One click listener on the panel handles the session buttons of every page
+document.addEventListener("DOMContentLoaded", () => {
+    const panel = document.querySelector(".top-right-pannel");
+    panel.addEventListener("click", (event) => {
+        const button = event.target.closest(".button");
+        if (!button) {
+            return;
+        }
+        if (button.id === 'load-more-sessions') {
+            loadMoreSessions(button);
+            return;
+        }
+
+        const chatId = button.dataset.chatId;
+        console.log("Loading chat history for session:", chatId);
+
+        loadChatHistory(chatId);
     });
-});
\ No newline at end of file
+});
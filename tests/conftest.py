@@ -0,0 +1,51 @@
+import os
+import sys
+
+import pytest
+
+# The chat blueprint creates its provider clients at import time
+os.environ.setdefault("OPENAI_API_KEY", "test")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True)
+def work_dir(tmp_path, monkeypatch):
+    """Run every test in its own directory: the pipeline writes prompt logs under logs/."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "logs").mkdir()  # Created by app.py at startup
+    return tmp_path
+
+
+@pytest.fixture
+def app(tmp_path):
+    """A Flask app on a fresh SQLite database, migrated like init_db() does it."""
+    from flask import Flask
+    import models.models  # Registers the tables
+    from models import db
+    from models.helpers import get_engine_options
+    from models.migrations import run_migrations
+
+    uri = f"sqlite:///{tmp_path / 'test.sqlite3'}"
+    app = Flask(__name__, instance_path=str(tmp_path / "instance"))
+    app.config["SQLALCHEMY_DATABASE_URI"] = uri
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = get_engine_options(uri)
+    app.config["TESTING"] = True
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        run_migrations()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def user(app):
+    from models import db
+    from models.models import User
+
+    user = User(name="tester", password="secret")
+    db.session.add(user)
+    db.session.commit()
+    return user
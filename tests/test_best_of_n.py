@@ -0,0 +1,88 @@
+import asyncio
+import itertools
+
+from blueprints.chat import llm_processing
+
+
+HISTORY = [{"role": "user", "content": "A hotel in Lisbon"}]
+CHAT_IDS = itertools.count()
+
+
+def stub_pipeline(monkeypatch, candidates, scores):
+    """
+    Stub the actor with one outcome per candidate (a response or an exception to raise) and
+    the critic with one outcome per response (a score, None for an unscored critique, or an exception).
+    """
+    outcomes = iter(candidates)
+
+    async def fake_actor(conversation_history, search_record=None, chat_id=None):
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return {"final_response": outcome, "thinking": None}
+
+    async def fake_critic(conversation_history, assistant_response, search_record=None, chat_id=None):
+        outcome = scores[assistant_response]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return {"total_score": outcome} if outcome is not None else {"error": "unparsable"}
+
+    monkeypatch.setattr(llm_processing, "generate_actor_candidate", fake_actor)
+    monkeypatch.setattr(llm_processing, "critique_response", fake_critic)
+
+
+def best_of_n(candidates):
+    chat_id = f"best-of-n-{next(CHAT_IDS)}"
+    llm_processing.init_processing_state(chat_id)
+    result, critique = asyncio.run(
+        llm_processing.generate_best_of_n(HISTORY, chat_id=chat_id, candidates=candidates)
+    )
+    return result, critique, llm_processing.get_processing_state(chat_id)
+
+
+def test_the_highest_scored_candidate_wins(monkeypatch):
+    stub_pipeline(monkeypatch, ["A", "B", "C"], {"A": 6, "B": 9, "C": 7})
+    result, critique, state = best_of_n(3)
+    assert result["final_response"] == "B"
+    assert critique == {"total_score": 9}
+    assert state["assistant_response"] == result and state["critic_result"] == critique
+    assert state["candidates"] == [
+        {"final_response": "A", "total_score": 6},
+        {"final_response": "B", "total_score": 9},
+        {"final_response": "C", "total_score": 7},
+    ]
+
+
+def test_ties_go_to_the_first_candidate(monkeypatch):
+    stub_pipeline(monkeypatch, ["A", "B"], {"A": 8, "B": 8})
+    result, _, _ = best_of_n(2)
+    assert result["final_response"] == "A"
+
+
+def test_a_failing_candidate_is_left_out(monkeypatch):
+    stub_pipeline(monkeypatch, [RuntimeError("timeout"), "B"], {"B": 5})
+    result, critique, state = best_of_n(2)
+    assert result["final_response"] == "B"
+    assert critique == {"total_score": 5}
+    assert state["candidates"] == [{"final_response": "B", "total_score": 5}]
+
+
+def test_a_failing_critique_never_wins_over_a_scored_candidate(monkeypatch):
+    stub_pipeline(monkeypatch, ["A", "B", "C"], {"A": RuntimeError("critic down"), "B": None, "C": 3})
+    result, critique, state = best_of_n(3)
+    assert result["final_response"] == "C"
+    assert [candidate["total_score"] for candidate in state["candidates"]] == [None, None, 3]
+
+
+def test_unscored_candidates_are_kept_if_nothing_was_scored(monkeypatch):
+    stub_pipeline(monkeypatch, ["A", "B"], {"A": RuntimeError("critic down"), "B": None})
+    result, critique, _ = best_of_n(2)
+    assert result["final_response"] == "A"
+    assert critique is None
+
+
+def test_no_candidate_at_all_is_an_error(monkeypatch):
+    stub_pipeline(monkeypatch, [RuntimeError("down"), RuntimeError("down")], {})
+    result, critique, state = best_of_n(2)
+    assert (result, critique) == (None, None)
+    assert state["error"] == "No assistant response generated"
@@ -0,0 +1,85 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from blueprints.chat.helpers import create_turn, retrieve_or_create_chat
+from models import db
+from models.models import Chat, Message
+
+
+@pytest.fixture
+def selects(app):
+    """Count the SELECT statements sent to the database."""
+    count = [0]
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            count[0] += 1
+
+    event.listen(db.engine, "before_cursor_execute", on_execute)
+    yield count
+    event.remove(db.engine, "before_cursor_execute", on_execute)
+
+
+@pytest.fixture
+def chat(user):
+    """A chat with three turns, the second one with two scored outputs and a search."""
+    chat, _ = retrieve_or_create_chat(user)
+    chat.allow_second_assistant = True
+    for text in ("Rome", "For two", "In June"):
+        message = create_turn(chat, text)
+        message.assistant_message.content = f"answer to {text}"
+        message.assistant_message.is_updating = False
+        if text == "For two":
+            message.assistant_message.search_output = json.dumps({"results": "Hotel A"})
+            message.assistant_message.critic_score = json.dumps({"total_score": 7})
+            message.assistant_message2.content = "other answer"
+            message.assistant_message2.is_updating = False
+        db.session.commit()
+    # The seq decides the order, not the timestamp
+    first = Message.query.filter_by(chat_id=chat.id, seq=1).one()
+    first.timestamp = datetime.utcnow() + timedelta(days=1)
+    db.session.commit()
+    chat_id = chat.id
+    db.session.expire_all()
+    return db.session.get(Chat, chat_id)
+
+
+def test_messages_are_loaded_in_seq_order_by_one_query(chat, selects):
+    messages = chat.get_messages()
+    assert selects[0] == 1
+    assert [message.user_message.content for message in messages] == ["Rome", "For two", "In June"]
+    # Every output and the user message come with it
+    assert messages[1].assistant_message2.content == "other answer"
+    assert selects[0] == 1
+
+
+def test_every_view_of_the_history_costs_one_query(chat, selects):
+    for view in (chat.dump, chat.jsonify, chat.get_conversation_history, chat.get_search_history):
+        db.session.expire_all()
+        chat = db.session.get(Chat, chat.id)
+        before = selects[0]
+        view()
+        assert selects[0] - before == 1, view.__name__
+
+
+def test_loaded_messages_are_shared_between_views(chat, selects):
+    messages = chat.get_messages()
+    history = chat.get_conversation_history(messages)
+    search_history = chat.get_search_history(messages)
+    assert selects[0] == 1
+    assert [entry["content"] for entry in history if entry["role"] == "user"] == ["Rome", "For two", "In June"]
+    assert list(search_history.values()) == [json.dumps({"results": "Hotel A"})]
+
+
+def test_is_empty_is_one_limited_query(user, chat, selects):
+    new_chat, _ = retrieve_or_create_chat(user)
+    db.session.commit()
+    chat, new_chat = db.session.get(Chat, chat.id), db.session.get(Chat, new_chat.id)
+    before = selects[0]
+    assert chat.is_empty() is False
+    assert new_chat.is_empty() is True
+    assert selects[0] - before == 2
+    assert "messages" not in chat.__dict__  # The relationship is never loaded
@@ -0,0 +1,104 @@
+import pytest
+
+from blueprints.chat.helpers import (
+    count_covered_entries,
+    create_turn,
+    process_conversation_history,
+    retrieve_or_create_chat,
+)
+from models import db
+from models.models import Chat, Message
+
+
+@pytest.fixture
+def chat(user):
+    chat, _ = retrieve_or_create_chat(user)
+    db.session.commit()
+    return chat
+
+
+def add_turn(chat, text):
+    message = create_turn(chat, text)
+    db.session.commit()
+    return message
+
+
+def test_new_messages_get_consecutive_seqs(chat):
+    first = add_turn(chat, "one")
+    second = add_turn(chat, "two")
+    assert (first.seq, first.updated_seq) == (1, 1)
+    assert (second.seq, second.updated_seq) == (2, 2)
+    assert db.session.get(Chat, chat.id).seq == 2
+
+
+def test_a_changed_output_moves_updated_seq_only(chat):
+    first = add_turn(chat, "one")
+    add_turn(chat, "two")
+    first.assistant_message.content = "answer"
+    db.session.commit()
+
+    message = db.session.get(Message, first.id)
+    assert (message.seq, message.updated_seq) == (1, 3)
+    assert db.session.get(Chat, chat.id).seq == 3
+
+
+def test_get_messages_since_returns_created_and_changed_messages(chat):
+    first = add_turn(chat, "one")
+    second = add_turn(chat, "two")
+    assert chat.get_messages(since=2) == []
+    first.user_message.content = "edited"
+    third = add_turn(chat, "three")
+    assert [msg.id for msg in chat.get_messages(since=2)] == [first.id, third.id]
+    assert [msg.id for msg in chat.get_messages()] == [first.id, second.id, third.id]
+
+
+def test_seqs_are_per_chat(user):
+    chats = []
+    for _ in range(2):
+        chat, _ = retrieve_or_create_chat(user)
+        chats.append(chat)
+    db.session.commit()
+    add_turn(chats[0], "one")
+    add_turn(chats[0], "two")
+    message = add_turn(chats[1], "other")
+    assert message.seq == 1
+
+
+def chat_version(chat):
+    return db.session.scalar(db.select(Chat.version).where(Chat.id == chat.id))
+
+
+def test_version_grows_on_every_write_to_the_chat_or_its_messages(chat):
+    message = add_turn(chat, "one")
+    version = chat_version(chat)
+    message.assistant_message.critic_score = '{"total_score": 7}'
+    db.session.commit()
+    assert chat_version(chat) == version + 1
+    chat.allow_second_assistant = True
+    db.session.commit()
+    assert chat_version(chat) == version + 2
+
+
+def test_version_is_unchanged_by_reads_and_empty_commits(chat):
+    add_turn(chat, "one")
+    version = chat_version(chat)
+    chat.get_messages()
+    chat.get_score_summary()
+    db.session.commit()
+    assert chat_version(chat) == version
+
+
+def test_covered_entries_index_the_history_sent_to_the_pipeline(chat):
+    first = add_turn(chat, "Paris please")
+    first.assistant_message.content = "For which dates?"
+    second = add_turn(chat, "June")
+    second.assistant_message.content = ""  # Dropped from the processed history
+    add_turn(chat, "Two adults")
+    db.session.commit()
+
+    messages = chat.get_messages()
+    history = process_conversation_history(chat.get_conversation_history(messages))
+    # Preferences extracted by the second turn cover the first turn and the second user message
+    count = count_covered_entries(messages, second.seq)
+    assert [entry["content"] for entry in history[count:]] == ["Two adults", "[Processing your request...]"]
+    assert count_covered_entries(messages, 0) == 0
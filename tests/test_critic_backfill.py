@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from blueprints.chat import workers
+from blueprints.chat.helpers import create_turn, persist_assistant_result, retrieve_or_create_chat
+from models import db
+from models.models import AssistantMessage, Chat, CriticBackfill, Message
+
+
+@pytest.fixture
+def submitted(monkeypatch):
+    """Record critic tasks instead of running them on the worker pool."""
+    tasks = []
+    monkeypatch.setattr(workers, "submit_task", lambda kind, fn, *args: tasks.append((fn, args)))
+    return tasks
+
+
+@pytest.fixture
+def chat(user):
+    chat, _ = retrieve_or_create_chat(user)
+    db.session.commit()
+    return chat
+
+
+def finished_turn(chat, text, state=None):
+    message = create_turn(chat, text)
+    db.session.commit()
+    state = state or {"status": "completed", "error": None, "final_response": f"answer to {text}"}
+    persist_assistant_result(chat.id, message.id, 1, state)
+    return message
+
+
+def test_outputs_of_a_turn_in_flight_are_never_claimed(chat, submitted):
+    create_turn(chat, "pending")
+    db.session.commit()
+    assert chat.update_missing_critic_scores() == 0
+    assert submitted == []
+
+
+def test_failed_outputs_are_never_claimed(chat, submitted):
+    finished_turn(chat, "broken", {"status": "error", "error": "boom", "final_response": None})
+    assert chat.update_missing_critic_scores() == 0
+
+
+def test_a_claim_is_visible_to_readers_waiting_on_the_seq(chat, submitted):
+    message = finished_turn(chat, "hello")
+    seq = db.session.get(Chat, chat.id).seq
+    assert chat.update_missing_critic_scores() == 1
+    assert db.session.get(Chat, chat.id).seq == seq + 1
+    assert db.session.get(Message, message.id).updated_seq == seq + 1
+    assert chat.get_score_summary(since=seq)["updating"] == 1
+    # Claimed once only
+    assert chat.update_missing_critic_scores() == 0
+
+
+def test_the_backfill_never_replaces_a_written_score(chat, submitted):
+    message = finished_turn(chat, "hello")
+    chat.update_missing_critic_scores()
+    assistant_msg_id = message.assistant_message.id
+    backfill = CriticBackfill(chat.id, [assistant_msg_id])
+    db.session.execute(
+        db.update(AssistantMessage)
+        .where(AssistantMessage.id == assistant_msg_id)
+        .values(critic_score=json.dumps({"total_score": 9}))
+    )
+    db.session.commit()
+
+    backfill.scores[assistant_msg_id] = json.dumps({"total_score": 1})
+    backfill.write()
+    assistant_msg = db.session.get(AssistantMessage, assistant_msg_id)
+    db.session.refresh(assistant_msg)
+    assert json.loads(assistant_msg.critic_score)["total_score"] == 9
+    assert assistant_msg.is_updating is False
@@ -0,0 +1,53 @@
+from sqlalchemy import create_engine, text
+
+from blueprints.chat import workers
+from models.helpers import apply_sqlite_profile, get_engine_options, get_sqlite_profile
+
+
+def read_pragmas(engine, *names):
+    with engine.connect() as conn:
+        return {name: conn.execute(text(f"PRAGMA {name}")).scalar() for name in names}
+
+
+def test_the_profile_is_applied_to_every_new_connection(tmp_path, monkeypatch):
+    monkeypatch.setenv("SQLITE_BUSY_TIMEOUT_MS", "2500")
+    monkeypatch.setenv("SQLITE_SYNCHRONOUS", "full")
+    engine = create_engine(f"sqlite:///{tmp_path / 'profile.sqlite3'}")
+    apply_sqlite_profile(engine, get_sqlite_profile())
+
+    for _ in range(2):
+        pragmas = read_pragmas(engine, "journal_mode", "synchronous", "busy_timeout", "cache_size", "temp_store")
+        assert pragmas == {
+            "journal_mode": "wal",
+            "synchronous": 2,  # FULL
+            "busy_timeout": 2500,
+            "cache_size": -65536,
+            "temp_store": 2,  # MEMORY
+        }
+        engine.dispose()  # The next round opens a new connection
+
+
+def test_invalid_levels_fall_back_to_the_defaults(monkeypatch):
+    monkeypatch.setenv("SQLITE_SYNCHRONOUS", "sometimes")
+    monkeypatch.setenv("SQLITE_TEMP_STORE", "cloud")
+    profile = get_sqlite_profile()
+    assert (profile["synchronous"], profile["temp_store"]) == ("NORMAL", "MEMORY")
+
+
+def test_the_pool_covers_every_worker_and_the_request_threads(monkeypatch):
+    monkeypatch.setitem(workers.WORKER_POOL_CONFIG, "critic", {"max_workers": 6, "max_queue": 1})
+    monkeypatch.setitem(workers.WORKER_POOL_CONFIG, "db", {"max_workers": 1, "max_queue": 1})
+    monkeypatch.setenv("SQLITE_POOL_REQUEST_THREADS", "4")
+    monkeypatch.setenv("SQLITE_BUSY_TIMEOUT_MS", "2500")
+    options = get_engine_options("sqlite:///db.sqlite3")
+    assert options["pool_size"] == 11
+    assert options["connect_args"] == {"timeout": 2.5, "check_same_thread": False}
+
+
+def test_the_pool_size_can_be_set_directly(monkeypatch):
+    monkeypatch.setenv("SQLITE_POOL_SIZE", "3")
+    assert get_engine_options("sqlite:///db.sqlite3")["pool_size"] == 3
+
+
+def test_other_databases_only_get_pre_ping():
+    assert get_engine_options("postgresql://localhost/app") == {"pool_pre_ping": True}
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from blueprints.chat import deadlines, llm_processing
+from blueprints.chat.deadlines import TurnDeadline
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Drive time.monotonic() of the turn deadlines by hand."""
+    now = [100.0]
+    monkeypatch.setattr(deadlines.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def timeouts(monkeypatch):
+    """Small stage timeouts, so that a stage can time out within the test."""
+    for stage, timeout in {"ner": 0.05, "search_call": 1, "search": 2, "actor": 3}.items():
+        monkeypatch.setitem(deadlines.STAGE_TIMEOUTS, stage, timeout)
+
+
+def test_remaining_never_goes_negative(clock):
+    deadline = TurnDeadline(budget=10)
+    clock[0] += 4
+    assert deadline.remaining() == 6
+    clock[0] += 20
+    assert deadline.remaining() == 0
+
+
+def test_allows_needs_room_for_every_stage(clock, timeouts):
+    deadline = TurnDeadline(budget=5)
+    assert deadline.allows("search", "actor")
+    assert not deadline.allows("search_call", "search", "actor", "ner")
+    clock[0] += 1
+    assert not deadline.allows("search", "actor")
+
+
+def test_timeout_is_capped_by_the_remaining_budget(clock, timeouts):
+    deadline = TurnDeadline(budget=4)
+    assert deadline.timeout("search") == 2
+    assert deadline.timeout("search", "actor") == 4
+    clock[0] += 3
+    assert deadline.timeout("search") == 1
+
+
+def test_degradations_accumulate_in_the_processing_state(clock):
+    llm_processing.init_processing_state("deadline-record")
+    deadline = TurnDeadline(budget=30)
+    llm_processing.record_degradation("deadline-record", "search", "budget", deadline)
+    clock[0] += 10
+    llm_processing.record_degradation("deadline-record", "critic", "timeout", deadline)
+    assert llm_processing.get_processing_state("deadline-record")["degraded"] == [
+        {"stage": "search", "reason": "budget", "remaining": 30.0},
+        {"stage": "critic", "reason": "timeout", "remaining": 20.0},
+    ]
+
+
+def test_a_stage_that_times_out_yields_the_default(timeouts):
+    llm_processing.init_processing_state("deadline-timeout")
+    result = asyncio.run(llm_processing.run_stage(
+        "deadline-timeout", TurnDeadline(budget=60), "ner", asyncio.sleep(5, "late"), default={}
+    ))
+    assert result == {}
+    degraded = llm_processing.get_processing_state("deadline-timeout")["degraded"]
+    assert [(entry["stage"], entry["reason"]) for entry in degraded] == [("ner", "timeout")]
+
+
+def test_a_stage_without_budget_never_starts(clock, timeouts):
+    started = []
+
+    async def stage():
+        started.append(True)
+        return "done"
+
+    llm_processing.init_processing_state("deadline-budget")
+    deadline = TurnDeadline(budget=1)
+    clock[0] += 1
+    result = asyncio.run(llm_processing.run_stage("deadline-budget", deadline, ("search", "actor"), stage()))
+    assert result is None and started == []
+    degraded = llm_processing.get_processing_state("deadline-budget")["degraded"]
+    assert [(entry["stage"], entry["reason"]) for entry in degraded] == [("search", "budget")]
+
+
+def test_a_stage_within_its_timeout_returns_its_result(timeouts):
+    result = asyncio.run(llm_processing.run_stage(
+        "deadline-ok", TurnDeadline(budget=60), "search", asyncio.sleep(0, "found")
+    ))
+    assert result == "found"
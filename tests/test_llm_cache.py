@@ -0,0 +1,116 @@
+import asyncio
+import json
+import sqlite3
+import time
+
+import pytest
+
+from blueprints.chat import llm_cache, llm_processing
+from blueprints.chat.llm_cache import CRITIC_RESULT_CACHE, ResponseCache, make_critic_cache_key
+
+
+HISTORY = [{"role": "user", "content": "A hotel in Paris"}]
+SEARCH = {"show_results_to_actor": True, "results": "Hotel A, Hotel B"}
+
+
+def test_equivalent_inputs_share_a_key():
+    noisy_history = HISTORY + [{"role": "assistant", "content": ""}]
+    assert make_critic_cache_key(HISTORY, "Hotel A?", SEARCH) == make_critic_cache_key(
+        noisy_history, {"role": "assistant", "content": "Hotel A?"}, json.dumps(SEARCH)
+    )
+
+
+def test_search_results_hidden_from_the_actor_do_not_count():
+    hidden = dict(SEARCH, show_results_to_actor=False)
+    assert make_critic_cache_key(HISTORY, "Hotel A?", hidden) == make_critic_cache_key(HISTORY, "Hotel A?")
+
+
+def test_variants_never_share_keys():
+    keys = {
+        make_critic_cache_key(HISTORY, "Hotel A?", SEARCH, variant=variant)
+        for variant in ("single", "simulation", "pairwise")
+    }
+    assert len(keys) == 3
+
+
+def test_context_is_part_of_the_key():
+    first = make_critic_cache_key(HISTORY, "Hotel A?", variant="pairwise", context={"second_response": "B"})
+    second = make_critic_cache_key(HISTORY, "Hotel A?", variant="pairwise", context={"second_response": "C"})
+    assert first != second
+
+
+def test_pairwise_critiques_never_fill_single_critique_keys(monkeypatch):
+    calls = []
+
+    async def fake_completion(prompt, **kwargs):
+        calls.append(prompt)
+        return json.dumps({"output_1": {"total_score": 4}, "output_2": {"total_score": 8}, "preferred": 2})
+
+    monkeypatch.setattr(llm_processing, "get_together_completion", fake_completion)
+    history = [{"role": "user", "content": "A quiet hotel near the pairwise test"}]
+    first = asyncio.run(llm_processing.critique_pair(history, "Hotel A?", "Hotel B?"))
+    again = asyncio.run(llm_processing.critique_pair(history, "Hotel A?", "Hotel B?"))
+    assert first == again == ({"total_score": 4}, {"total_score": 8})
+    assert len(calls) == 1
+    for response in ("Hotel A?", "Hotel B?"):
+        assert CRITIC_RESULT_CACHE.get(make_critic_cache_key(history, response)) is None
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Drive time.time() of the caches by hand."""
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResponseCache("lru", max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # b is now the least recently used
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["entries"] == 2
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = ResponseCache("ttl", ttl=60)
+    cache.set("a", 1, latency=2.5)
+    clock[0] += 59
+    assert cache.get("a") == 1
+    clock[0] += 2
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["saved_seconds"], stats["entries"]) == (1, 1, 2.5, 0)
+
+
+def test_entries_are_reloaded_from_the_persistence_file(tmp_path, clock):
+    db_path = str(tmp_path / "cache.sqlite3")
+    cache = ResponseCache("persisted", ttl=60, db_path=db_path)
+    cache.set("a", {"hotels": ["A"]}, latency=1.5)
+    cache.flush()
+
+    restarted = ResponseCache("persisted", ttl=60, db_path=db_path)
+    assert restarted.get("a") == {"hotels": ["A"]}
+    assert restarted.stats()["saved_seconds"] == 1.5
+    assert asyncio.run(ResponseCache("persisted", ttl=60, db_path=db_path).get_async("a")) == {"hotels": ["A"]}
+    # Persisted entries expire like in-memory ones
+    clock[0] += 61
+    assert ResponseCache("persisted", ttl=60, db_path=db_path).get("a") is None
+
+
+def test_set_never_waits_for_the_persistence_file(tmp_path):
+    db_path = str(tmp_path / "cache.sqlite3")
+    cache = ResponseCache("locked", db_path=db_path)
+    # Another process holds the write lock
+    blocker = sqlite3.connect(db_path, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    started = time.monotonic()
+    cache.set("a", 1)
+    assert time.monotonic() - started < 1
+    assert cache.get("a") == 1
+    blocker.execute("COMMIT")
+    cache.flush()
+    assert ResponseCache("locked", db_path=db_path).get("a") == 1
@@ -0,0 +1,85 @@
+import threading
+
+from sqlalchemy import inspect, text
+
+from models import db, migrations
+from models.migrations import MIGRATIONS, add_column, lock_for_migrations, run_migrations
+
+
+def applied_versions():
+    with db.engine.connect() as conn:
+        return sorted(conn.execute(text("SELECT version FROM schema_migrations")).scalars())
+
+
+def make_old_database():
+    """Roll the schema back to before migrations 4 and 5."""
+    with db.engine.begin() as conn:
+        conn.execute(text("ALTER TABLE chats DROP COLUMN version"))
+        conn.execute(text("ALTER TABLE chats DROP COLUMN preferences_seq"))
+        conn.execute(text("DELETE FROM schema_migrations WHERE version >= 4"))
+
+
+def chat_columns():
+    return {col["name"] for col in inspect(db.engine).get_columns("chats")}
+
+
+def test_every_migration_is_recorded_once(app):
+    assert applied_versions() == sorted(version for version, _, _ in MIGRATIONS)
+    run_migrations()
+    run_migrations()
+    assert applied_versions() == sorted(version for version, _, _ in MIGRATIONS)
+
+
+def test_pending_migrations_alter_an_old_database(app):
+    make_old_database()
+    assert "version" not in chat_columns()
+    run_migrations()
+    assert {"version", "preferences_seq"} <= chat_columns()
+    assert applied_versions() == sorted(version for version, _, _ in MIGRATIONS)
+
+
+def test_concurrent_runs_apply_each_migration_once(app):
+    make_old_database()
+    db.engine.dispose()
+    errors = []
+
+    def migrate():
+        with app.app_context():
+            try:
+                run_migrations()
+            except Exception as e:  # Collected, a failing thread would otherwise go unnoticed
+                errors.append(e)
+
+    threads = [threading.Thread(target=migrate) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert {"version", "preferences_seq"} <= chat_columns()
+    assert applied_versions() == sorted(version for version, _, _ in MIGRATIONS)
+
+
+def test_a_second_run_waits_for_the_migration_lock(app):
+    def migrate():
+        with app.app_context():
+            run_migrations()
+
+    with db.engine.connect() as conn:
+        lock_for_migrations(conn)
+        thread = threading.Thread(target=migrate)
+        thread.start()
+        thread.join(0.5)
+        assert thread.is_alive()
+        conn.rollback()
+    thread.join(5)
+    assert not thread.is_alive()
+
+
+def test_add_column_tolerates_a_column_added_after_its_check(app, monkeypatch):
+    # Another process adds the column between the check and the ALTER TABLE
+    seen = iter([set(), {"version"}])
+    monkeypatch.setattr(migrations, "get_column_names", lambda conn, table_name: next(seen))
+    with db.engine.begin() as conn:
+        add_column(conn, "chats", "version")
+    assert "version" in chat_columns()
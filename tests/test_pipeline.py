@@ -0,0 +1,82 @@
+import asyncio
+import itertools
+import json
+
+import pytest
+
+from blueprints.chat import llm_processing
+
+
+HISTORY = [{"role": "user", "content": "A hotel in Rome for two"}]
+CHAT_IDS = itertools.count()
+
+
+@pytest.fixture
+def chat_id():
+    """A processing state id no other test uses."""
+    return f"pipeline-{next(CHAT_IDS)}"
+
+
+@pytest.fixture
+def actor(monkeypatch):
+    """Stub the actor: every call answers with the next numbered response."""
+    answers = itertools.count(1)
+
+    async def fake_actor(conversation_history, search_record=None, chat_id=None):
+        return {"final_response": f"Answer {next(answers)}", "thinking": None}
+
+    monkeypatch.setattr(llm_processing, "generate_actor_candidate", fake_actor)
+
+
+@pytest.fixture
+def together(monkeypatch):
+    """Stub DeepSeek: pairwise critiques score 5 and 6, any other prompt is recorded and scores 8."""
+    calls = []
+
+    async def fake_completion(prompt, **kwargs):
+        if "output_1" in prompt:
+            calls.append("pairwise")
+            return json.dumps({"output_1": {"total_score": 5}, "output_2": {"total_score": 6}, "preferred": 2})
+        calls.append("other")
+        return json.dumps({"total_score": 8})
+
+    monkeypatch.setattr(llm_processing, "get_together_completion", fake_completion)
+    return calls
+
+
+def run_turn(chat_id, **options):
+    """Run a turn (without search unless enabled) and return the final state of every output."""
+    results = {}
+    options.setdefault("enable_search", False)
+    asyncio.run(llm_processing.process_chat_async(
+        chat_id,
+        [dict(HISTORY[0], content=f"{HISTORY[0]['content']} ({chat_id})")],
+        on_complete=lambda output_chat_id, state: results.update({output_chat_id: state}),
+        **options
+    ))
+    return results
+
+
+def test_pairwise_scores_both_outputs_with_one_critique(monkeypatch, chat_id, actor, together):
+    monkeypatch.setattr(llm_processing, "CRITIC_MODE", "pairwise")
+    results = run_turn(chat_id, second_chat_id=f"{chat_id}_second")
+
+    first, second = results[chat_id], results[f"{chat_id}_second"]
+    assert together == ["pairwise"]  # No regeneration and no single critique
+    assert first["critic_result"] == {"total_score": 5}
+    assert second["critic_result"] == {"total_score": 6}
+    assert first["regenerated_critic"] is None and second["regenerated_critic"] is None
+    assert {first["final_response"], second["final_response"]} == {"Answer 1", "Answer 2"}
+
+
+def test_search_skipped_for_the_budget_is_recorded_for_both_outputs(chat_id, actor, together):
+    deadline = llm_processing.TurnDeadline(budget=1)
+    results = run_turn(
+        chat_id, second_chat_id=f"{chat_id}_second", enable_search=True, evaluate_response=False, deadline=deadline
+    )
+
+    assert together == []  # No NER and no search call
+    assert len(results) == 2
+    for state in results.values():
+        assert ("search", "budget") in [(entry["stage"], entry["reason"]) for entry in state["degraded"]]
+        assert state["final_response"]
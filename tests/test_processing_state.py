@@ -0,0 +1,152 @@
+import queue
+import sqlite3
+import time
+
+import pytest
+
+from blueprints.chat import processing_state
+from blueprints.chat.processing_state import MemoryStateStore, SQLiteStateStore, create_state_store
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Drive time.time() of the state stores by hand."""
+    now = [1000.0]
+    monkeypatch.setattr(processing_state.time, "time", lambda: now[0])
+    monkeypatch.setattr(processing_state, "SWEEP_INTERVAL", 0)
+    return now
+
+
+def test_update_merges_into_a_fresh_state():
+    store = MemoryStateStore()
+    assert store.get("a") is None
+    state = store.update("a", step="extracting_ner", progress=10)
+    assert state["step"] == "extracting_ner"
+    assert state["status"] == "initializing"
+    assert store.get("a") == state
+
+
+def test_snapshots_are_not_changed_by_later_updates():
+    store = MemoryStateStore()
+    snapshot = store.update("a", progress=10)
+    store.update("a", progress=50)
+    assert snapshot["progress"] == 10
+
+
+def test_completed_states_expire_after_the_ttl(clock):
+    store = MemoryStateStore(ttl=60)
+    store.update("running", progress=10)
+    store.update("done", completed=True)
+    clock[0] += 61
+    assert store.get("done") is None
+    # Running turns never expire
+    assert store.get("running")["progress"] == 10
+
+
+def test_completed_states_are_evicted_first(clock):
+    store = MemoryStateStore(max_entries=2)
+    store.update("running", progress=10)
+    clock[0] += 1
+    store.update("done", completed=True)
+    clock[0] += 1
+    store.update("new", progress=5)
+    assert store.get("done") is None
+    assert store.get("running") is not None
+    assert store.get("new") is not None
+
+
+def test_without_completed_states_the_least_recently_updated_is_evicted(clock):
+    store = MemoryStateStore(max_entries=2)
+    store.update("a", progress=1)
+    store.update("b", progress=1)
+    store.update("a", progress=2)
+    store.update("c", progress=1)
+    assert store.get("b") is None
+    assert store.get("a")["progress"] == 2
+
+
+def test_subscribers_get_a_snapshot_then_deltas():
+    store = MemoryStateStore()
+    store.update("a", progress=10)
+    subscriber = store.subscribe("a")
+    assert subscriber.get(timeout=1)["progress"] == 10
+    store.update("a", progress=20, step="searching")
+    event = subscriber.get(timeout=1)
+    assert event["progress"] == 20 and event["step"] == "searching"
+    assert set(event) == set(processing_state.EVENT_FIELDS)
+    store.unsubscribe("a", subscriber)
+    store.update("a", progress=30)
+    with pytest.raises(queue.Empty):
+        subscriber.get(timeout=0.01)
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    db_path = str(tmp_path / "states.sqlite3")
+    writer, reader = SQLiteStateStore(db_path), SQLiteStateStore(db_path)
+    writer.update("a", progress=40)
+    assert writer.flush(timeout=5)
+    assert reader.get("a")["progress"] == 40
+    reader.update("a", step="searching")
+    assert reader.flush(timeout=5)
+    assert writer.get("a") == {**reader.get("a"), "progress": 40, "step": "searching"}
+
+
+def test_sqlite_completed_states_expire_after_the_ttl(tmp_path, clock):
+    store = SQLiteStateStore(str(tmp_path / "states.sqlite3"), ttl=60)
+    store.update("running", progress=10)
+    store.update("done", completed=True)
+    assert store.flush(timeout=5)
+    clock[0] += 61
+    assert store.get("done") is None
+    assert store.get("running")["progress"] == 10
+    # An update after expiry starts from a fresh state
+    assert store.update("done", progress=5)["completed"] is False
+
+
+def test_sqlite_completed_states_are_evicted_first(tmp_path, clock):
+    store = SQLiteStateStore(str(tmp_path / "states.sqlite3"), max_entries=2)
+    store.update("running", progress=10)
+    clock[0] += 1
+    store.update("done", completed=True)
+    clock[0] += 1
+    store.update("new", progress=5)
+    assert store.flush(timeout=5)
+    assert store.get("done") is None
+    assert store.get("running") is not None
+    assert store.get("new") is not None
+
+
+def test_sqlite_updates_never_wait_for_the_write_lock(tmp_path):
+    db_path = str(tmp_path / "states.sqlite3")
+    store = SQLiteStateStore(db_path)
+    # Another process holds the write lock
+    blocker = sqlite3.connect(db_path, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    started = time.monotonic()
+    store.update("a", progress=10)
+    assert store.update("a", step="searching")["progress"] == 10
+    assert time.monotonic() - started < 1
+    # Read-your-writes in this process while the changes are queued
+    assert store.get("a")["step"] == "searching"
+    assert store.flush(timeout=0.1) is False
+
+    blocker.execute("COMMIT")
+    assert store.flush(timeout=5)
+    assert SQLiteStateStore(db_path).get("a")["step"] == "searching"
+
+
+def test_sqlite_subscriber_gets_a_snapshot_then_deltas(tmp_path):
+    store = SQLiteStateStore(str(tmp_path / "states.sqlite3"))
+    store.update("a", progress=10)
+    subscriber = store.subscribe("a")
+    assert subscriber.get(timeout=1)["progress"] == 10
+    store.update("a", progress=20)
+    assert subscriber.get(timeout=5)["progress"] == 20
+    with pytest.raises(queue.Empty):
+        subscriber.get(timeout=0.01)
+
+
+def test_unknown_backend_is_rejected(monkeypatch):
+    monkeypatch.setenv("PROCESSING_STATE_BACKEND", "redis")
+    with pytest.raises(ValueError):
+        create_state_store()
@@ -0,0 +1,48 @@
+import json
+import time
+
+import pytest
+
+import blueprints.chat as chat_routes
+from blueprints import chat_blueprint
+from blueprints.chat import llm_processing
+
+
+@pytest.fixture
+def client(app, user):
+    """A test client logged in as the test user."""
+    app.secret_key = "test"
+    app.register_blueprint(chat_blueprint, url_prefix="/assistant")
+    client = app.test_client()
+    with client.session_transaction() as flask_session:
+        flask_session["username"] = user.name
+    return client
+
+
+def read_events(response):
+    return [
+        json.loads(line[len("data: "):])
+        for line in response.get_data(as_text=True).splitlines()
+        if line.startswith("data: ")
+    ]
+
+
+def test_the_stream_is_closed_by_the_server_after_its_max_duration(client, monkeypatch):
+    monkeypatch.setattr(chat_routes, "STREAM_MAX_DURATION", 0.2)
+    llm_processing.update_processing_state("stream-running", step="searching", progress=40)
+
+    started = time.monotonic()
+    response = client.get("/assistant/chat/processing/stream-running/stream")
+    body = response.get_data(as_text=True)
+    assert time.monotonic() - started < 5
+    # The browser reconnects quickly and starts again from a snapshot
+    assert body.startswith(f"retry: {chat_routes.STREAM_RETRY_MS}\n\n")
+    assert [event["progress"] for event in read_events(response)] == [40]
+
+
+def test_the_stream_ends_once_processing_completes(client):
+    llm_processing.update_processing_state("stream-done", completed=True, status="completed")
+    started = time.monotonic()
+    response = client.get("/assistant/chat/processing/stream-done/stream")
+    assert [event["status"] for event in read_events(response)] == ["completed"]
+    assert time.monotonic() - started < 5
@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+from blueprints.chat import prompt_registry
+from blueprints.chat.prompt_registry import PromptTemplate, get_prompt_template, render_prompt
+
+
+@pytest.fixture
+def prompts_dir(tmp_path, monkeypatch):
+    """Read templates from an empty prompts directory with an empty template cache."""
+    directory = tmp_path / "prompts"
+    directory.mkdir()
+    monkeypatch.setattr(prompt_registry, "PROMPTS_DIR", str(directory))
+    monkeypatch.setattr(prompt_registry, "PROMPT_TEMPLATES", {})
+    return directory
+
+
+def test_values_are_never_substituted_again():
+    template = PromptTemplate("<conv>\n{conv}\n</conv>\n<search>\n{search}\n</search>")
+    rendered = template.render(conv="Do you have {search} results?", search="Hotel A")
+    assert rendered == "<conv>\nDo you have {search} results?\n</conv>\n<search>\nHotel A\n</search>"
+
+
+def test_placeholders_without_a_value_and_json_examples_are_kept():
+    template = PromptTemplate('{conv} {missing} {"total_score": 8}')
+    assert template.render(conv="hi") == 'hi {missing} {"total_score": 8}'
+
+
+def test_templates_are_read_once(prompts_dir, monkeypatch):
+    (prompts_dir / "actor.md").write_text("Answer {conv}", encoding="utf-8")
+    assert render_prompt("actor.md", conv="me") == "Answer me"
+    monkeypatch.setattr("builtins.open", lambda *args, **kwargs: pytest.fail("Read again"))
+    assert get_prompt_template("actor.md").text == "Answer {conv}"
+
+
+def test_a_changed_mtime_reloads_the_template(prompts_dir):
+    path = prompts_dir / "actor.md"
+    path.write_text("Answer {conv}", encoding="utf-8")
+    first = get_prompt_template("actor.md")
+    # Same size, so only the mtime tells the versions apart
+    path.write_text("Reply {conv}", encoding="utf-8")
+    os.utime(path, ns=(first.version[0] + 10**9, first.version[0] + 10**9))
+    second = get_prompt_template("actor.md")
+    assert second.text == "Reply {conv}"
+    assert second.version != first.version
+
+
+def test_a_changed_size_reloads_the_template(prompts_dir):
+    path = prompts_dir / "actor.md"
+    path.write_text("Answer {conv}", encoding="utf-8")
+    first = get_prompt_template("actor.md")
+    # Same mtime, so only the size tells the versions apart
+    path.write_text("Answer briefly {conv}", encoding="utf-8")
+    os.utime(path, ns=(first.version[0], first.version[0]))
+    assert get_prompt_template("actor.md").text == "Answer briefly {conv}"
+
+
+def test_derived_templates_follow_their_source(prompts_dir):
+    path = prompts_dir / "actor.md"
+    path.write_text("Be helpful.\n{conv}", encoding="utf-8")
+    assert prompt_registry.get_actor_instructions() == "Be helpful."
+    path.write_text("Be concise.\n{conv}", encoding="utf-8")
+    os.utime(path, ns=(10**18, 10**18))
+    assert prompt_registry.get_actor_instructions() == "Be concise."
+
+
+def test_missing_templates_render_as_none(prompts_dir):
+    assert render_prompt("missing.md") is None
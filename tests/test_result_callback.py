@@ -0,0 +1,40 @@
+import threading
+
+import pytest
+
+from blueprints.chat import workers
+from blueprints.chat.helpers import create_turn, make_result_callback, retrieve_or_create_chat
+from blueprints.chat.workers import BoundedExecutor
+from models import db
+from models.models import AssistantMessage
+
+
+@pytest.fixture
+def full_db_pool(app, monkeypatch):
+    """Replace the db pool with one whose only worker is busy and whose queue has no slot."""
+    monkeypatch.setattr(workers, "SUBMIT_TIMEOUT", 0.01)
+    pool = BoundedExecutor("db", max_workers=1, max_queue=0)
+    monkeypatch.setitem(workers.WORKER_POOLS, "db", pool)
+    release = threading.Event()
+    pool.submit(app, release.wait)
+    yield pool
+    release.set()
+    pool.executor.shutdown(wait=True)
+
+
+def test_results_are_written_when_the_db_pool_is_full(app, user, full_db_pool, monkeypatch):
+    monkeypatch.setattr(workers, "submit_task", lambda kind, fn, *args: pytest.fail("Nothing to backfill"))
+    chat, _ = retrieve_or_create_chat(user)
+    db.session.commit()
+    message = create_turn(chat, "A hotel in Rome")
+    db.session.commit()
+    chat_id, message_id = chat.id, message.id
+
+    on_complete = make_result_callback(chat_id, message_id)
+    state = {"status": "completed", "error": None, "final_response": "Hotel A", "critic_result": {"total_score": 9}}
+    on_complete(chat_id, state)
+
+    db.session.expire_all()
+    assistant_msg = AssistantMessage.query.filter_by(message_id=message_id, output_number=1).one()
+    assert assistant_msg.content == "Hotel A"
+    assert assistant_msg.is_updating is False
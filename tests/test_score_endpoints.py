@@ -0,0 +1,115 @@
+import json
+import threading
+import time
+
+import pytest
+
+import blueprints.chat as chat_routes
+from blueprints import chat_blueprint
+from blueprints.chat import workers
+from blueprints.chat.helpers import create_turn, persist_assistant_result, retrieve_or_create_chat
+from models import db
+from models.models import AssistantMessage, Chat
+
+
+@pytest.fixture
+def routes(app):
+    """The test app with the chat blueprint registered like app.py does it."""
+    app.secret_key = "test"
+    app.register_blueprint(chat_blueprint, url_prefix="/assistant")
+    return app
+
+
+@pytest.fixture
+def client(routes, user):
+    """A test client logged in as the test user."""
+    client = routes.test_client()
+    with client.session_transaction() as flask_session:
+        flask_session["username"] = user.name
+    return client
+
+
+@pytest.fixture
+def submitted(monkeypatch):
+    """Record critic tasks instead of running them on the worker pool."""
+    tasks = []
+    monkeypatch.setattr(workers, "submit_task", lambda kind, fn, *args: tasks.append((fn, args)))
+    return tasks
+
+
+@pytest.fixture
+def chat(user):
+    """A chat with one finished turn whose output has no critic score yet."""
+    chat, _ = retrieve_or_create_chat(user)
+    message = create_turn(chat, "A hotel in Rome")
+    db.session.commit()
+    state = {"status": "completed", "error": None, "final_response": "Hotel A"}
+    persist_assistant_result(chat.id, message.id, 1, state)
+    return chat
+
+
+def write_score(app, assistant_msg_id, score, delay):
+    """Commit a critic score from another thread after delay seconds."""
+    def run():
+        time.sleep(delay)
+        with app.app_context():
+            assistant_msg = db.session.get(AssistantMessage, assistant_msg_id)
+            assistant_msg.critic_score = json.dumps({"total_score": score})
+            db.session.commit()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def chat_version(chat_id):
+    return db.session.scalar(db.select(Chat.version).where(Chat.id == chat_id))
+
+
+def test_scores_need_a_login(routes, chat):
+    assert routes.test_client().get(f"/assistant/chat/score/{chat.id}").status_code == 401
+
+
+def test_reading_scores_never_writes(client, chat, submitted):
+    version = chat_version(chat.id)
+    response = client.get(f"/assistant/chat/score/{chat.id}")
+    assert response.status_code == 200
+    assert (response.json["scores"], response.json["pending"]) == ([], 1)
+    assert chat_version(chat.id) == version
+    assert submitted == []
+
+
+def test_scheduling_the_backfill_is_idempotent(client, chat, submitted):
+    first = client.post(f"/assistant/chat/score/{chat.id}").json
+    second = client.post(f"/assistant/chat/score/{chat.id}").json
+    assert (first["scheduled"], second["scheduled"]) == (1, 0)
+    assert len(submitted) == 1
+    assert second["updating"] == 1
+
+
+def test_the_long_poll_answers_as_soon_as_a_score_is_written(app, client, chat):
+    seq = client.get(f"/assistant/chat/score/{chat.id}").json["seq"]
+    assistant_msg_id = AssistantMessage.query.filter_by(output_number=1).one().id
+    writer = write_score(app, assistant_msg_id, 8, delay=0.2)
+
+    started = time.monotonic()
+    response = client.get(f"/assistant/chat/score/{chat.id}?since={seq}&wait=10")
+    writer.join()
+    assert time.monotonic() - started < 5
+    assert [json.loads(score["critic_score"])["total_score"] for score in response.json["scores"]] == [8]
+    assert response.json["pending"] == 0
+    assert response.json["seq"] > seq
+
+
+def test_the_long_poll_is_capped_by_score_wait_max(client, chat, monkeypatch):
+    monkeypatch.setattr(chat_routes, "SCORE_WAIT_MAX", 0.1)
+    seq = client.get(f"/assistant/chat/score/{chat.id}").json["seq"]
+    started = time.monotonic()
+    response = client.get(f"/assistant/chat/score/{chat.id}?since={seq}&wait=30")
+    assert time.monotonic() - started < 5
+    assert (response.json["scores"], response.json["pending"], response.json["seq"]) == ([], 1, seq)
+
+
+def test_unknown_chats_are_not_found(client):
+    assert client.get("/assistant/chat/score/missing").status_code == 404
+    assert client.post("/assistant/chat/score/missing").status_code == 404
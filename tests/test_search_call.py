@@ -0,0 +1,12 @@
+from blueprints.chat.search_preferences import build_search_call
+
+
+def test_build_search_call_drops_empty_preferences():
+    call = build_search_call({"city": "Paris", "stars": ""})
+    assert call == "<function> search_func({'city': 'Paris'})</function>"
+    assert build_search_call({"city": " "}) == "NO_SEARCH_NEEDED"
+
+
+def test_no_preferences_need_no_search():
+    assert build_search_call({}) == "NO_SEARCH_NEEDED"
+    assert build_search_call(None) == "NO_SEARCH_NEEDED"
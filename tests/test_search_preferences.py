@@ -0,0 +1,21 @@
+from blueprints.chat.search_preferences import canonicalize_search_query
+
+
+def test_equivalent_preferences_share_a_canonical_form():
+    first = "{'City': 'Paris', 'currency': '$', 'budget': '1,200', 'check_in': '2025-06-01', 'amenities': ['Pool', 'wifi']}"
+    second = "{'amenities': ['WiFi', 'pool'], 'budget': 1200, 'check in': '01/06/2025', 'currency': 'usd', 'city': ' paris '}"
+    assert canonicalize_search_query(first) == canonicalize_search_query(second)
+
+
+def test_different_preferences_stay_apart():
+    assert canonicalize_search_query("{'city': 'Paris'}") != canonicalize_search_query("{'city': 'Rome'}")
+
+
+def test_empty_values_are_dropped():
+    assert canonicalize_search_query("{'city': 'Paris', 'stars': None, 'area': '  '}") == (
+        canonicalize_search_query("{'city': 'Paris'}")
+    )
+
+
+def test_non_dictionary_queries_fall_back_to_collapsed_text():
+    assert canonicalize_search_query("  Hotels IN\n Paris ") == "hotels in paris"
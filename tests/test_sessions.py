@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+from blueprints.chat.helpers import (
+    decode_sessions_cursor,
+    encode_sessions_cursor,
+    get_chat_sessions_page,
+)
+from models import db
+from models.models import Chat, User
+
+
+def test_cursor_round_trip():
+    cursor = encode_sessions_cursor("2025-01-02 03:04:05.000006", "abcdef0123456789")
+    assert decode_sessions_cursor(cursor) == ("2025-01-02 03:04:05.000006", "abcdef0123456789")
+
+
+def test_invalid_cursors_decode_to_none():
+    assert decode_sessions_cursor("not a cursor") is None
+    assert decode_sessions_cursor(encode_sessions_cursor(12345, "id")) is None
+
+
+def test_pages_walk_every_chat_once_newest_first(user):
+    start = datetime(2025, 1, 1)
+    # Two chats share a timestamp, the id breaks the tie
+    timestamps = [start + timedelta(minutes=minutes) for minutes in (0, 1, 1, 2, 3)]
+    for timestamp in timestamps:
+        db.session.add(Chat(user_id=user.id, timestamp=timestamp))
+    db.session.commit()
+
+    seen, cursor = [], None
+    while True:
+        chats, cursor, error = get_chat_sessions_page(user, cursor=cursor, limit=2)
+        assert error is None
+        seen.extend(chats)
+        if cursor is None:
+            break
+    assert len(seen) == len(timestamps)
+    assert len({chat.id for chat in seen}) == len(timestamps)
+    keys = [(chat.timestamp, chat.id) for chat in seen]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_pages_only_list_the_users_chats(user):
+    other = User(name="other", password="secret")
+    db.session.add(other)
+    db.session.commit()
+    db.session.add_all([Chat(user_id=user.id), Chat(user_id=other.id)])
+    db.session.commit()
+
+    chats, cursor, _ = get_chat_sessions_page(user)
+    assert [chat.user_id for chat in chats] == [user.id]
+    assert cursor is None
+    chats, _, _ = get_chat_sessions_page(user, all_users=True)
+    assert len(chats) == 2
+
+
+def test_an_invalid_cursor_is_reported(user):
+    chats, cursor, error = get_chat_sessions_page(user, cursor="garbage")
+    assert (chats, cursor) == ([], None)
+    assert error == "Invalid cursor"
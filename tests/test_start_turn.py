@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy import event
+
+from blueprints.chat import llm_processing
+from blueprints.chat.helpers import retrieve_or_create_chat, start_turn
+from models import db
+from models.models import AssistantMessage, Chat, Message, UserMessage
+
+
+@pytest.fixture
+def scheduled(monkeypatch):
+    """Record the pipelines start_turn schedules instead of running them."""
+    calls = []
+    monkeypatch.setattr(llm_processing, "start_processing", lambda **kwargs: calls.append(kwargs))
+    return calls
+
+
+@pytest.fixture
+def statements(app):
+    """Record every commit and SQL statement sent to the database, in order."""
+    log = []
+    engine = db.engine
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        log.append(statement.split()[0].upper())
+
+    def on_commit(conn):
+        log.append("COMMIT")
+
+    event.listen(engine, "before_cursor_execute", on_execute)
+    event.listen(engine, "commit", on_commit)
+    yield log
+    event.remove(engine, "before_cursor_execute", on_execute)
+    event.remove(engine, "commit", on_commit)
+
+
+def test_a_new_chat_and_its_first_turn_are_committed_once(user, scheduled, statements):
+    chat, _ = retrieve_or_create_chat(user)
+    data = start_turn(chat, "A hotel in Rome")
+
+    assert statements.count("COMMIT") == 1
+    # Nothing is loaded back after the commit
+    assert statements[-1] == "COMMIT"
+    assert "UPDATE" not in statements[statements.index("INSERT"):]
+
+    message = db.session.get(Message, data["id"])
+    assert message.chat_id == chat.id and message.seq == 1
+    assert UserMessage.query.filter_by(message_id=message.id).one().content == "A hotel in Rome"
+    placeholder = AssistantMessage.query.filter_by(message_id=message.id).one()
+    assert placeholder.is_updating is True and placeholder.output_number == 1
+    assert db.session.get(Chat, chat.id).seq == 1
+
+
+def test_the_pipeline_gets_the_history_and_every_output(user, scheduled):
+    chat, _ = retrieve_or_create_chat(user)
+    chat.allow_second_assistant = True
+    start_turn(chat, "A hotel in Rome")
+    data = start_turn(chat, "For two")
+
+    assert [entry["content"] for entry in scheduled[-1]["conversation_history"] if entry["role"] == "user"] == [
+        "A hotel in Rome", "For two"
+    ]
+    assert scheduled[-1]["chat_id"] == chat.id
+    assert scheduled[-1]["second_chat_id"] == f"{chat.id}_second"
+    assert AssistantMessage.query.filter_by(message_id=data["id"]).count() == 2
+
+
+def test_the_dump_matches_the_committed_rows(user, scheduled):
+    chat, _ = retrieve_or_create_chat(user)
+    data = start_turn(chat, "A hotel in Rome")
+    db.session.expire_all()
+    assert db.session.get(Message, data["id"]).dump() == data
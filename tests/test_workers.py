@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+
+from blueprints.chat import workers
+from blueprints.chat.workers import BoundedExecutor, WorkerPoolFull
+from models import db
+
+
+@pytest.fixture
+def fast_rejection(monkeypatch):
+    monkeypatch.setattr(workers, "SUBMIT_TIMEOUT", 0.01)
+
+
+def test_submissions_beyond_workers_and_queue_are_rejected(app, fast_rejection):
+    pool = BoundedExecutor("test", max_workers=1, max_queue=1)
+    release = threading.Event()
+    running = pool.submit(app, release.wait)
+    queued = pool.submit(app, lambda: "queued")
+    with pytest.raises(WorkerPoolFull):
+        pool.submit(app, lambda: "rejected")
+
+    release.set()
+    assert running.result(timeout=5) is True
+    assert queued.result(timeout=5) == "queued"
+    # The slots are released once the tasks are done
+    assert pool.submit(app, lambda: "accepted").result(timeout=5) == "accepted"
+
+
+def test_a_failing_task_releases_its_slot(app, fast_rejection):
+    pool = BoundedExecutor("test", max_workers=1, max_queue=0)
+
+    def fail():
+        raise RuntimeError("boom")
+
+    assert pool.submit(app, fail).result(timeout=5) is None
+    assert pool.submit(app, lambda: "next").result(timeout=5) == "next"
+
+
+def test_tasks_run_in_the_app_context_and_return_their_connection(app, monkeypatch):
+    removed = []
+    remove = db.session.remove
+    monkeypatch.setattr(db.session, "remove", lambda: removed.append(True) or remove())
+    pool = BoundedExecutor("test", max_workers=2, max_queue=2)
+    checked_out = db.engine.pool.checkedout()
+
+    def task():
+        from flask import current_app
+        return current_app.name, db.session.execute(db.text("SELECT 1")).scalar()
+
+    futures = [pool.submit(app, task) for _ in range(4)]
+    assert [future.result(timeout=5) for future in futures] == [(app.name, 1)] * 4
+    assert len(removed) >= 4
+    assert db.engine.pool.checkedout() == checked_out
+
+
+def test_pools_are_created_once_per_kind(monkeypatch):
+    monkeypatch.setattr(workers, "WORKER_POOLS", {})
+    pool = workers.get_worker_pool("critic")
+    assert workers.get_worker_pool("critic") is pool
+    assert workers.get_worker_pool("db") is not pool
+    with pytest.raises(KeyError):
+        workers.get_worker_pool("unknown")